@@ -1,14 +1,20 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
+import asyncio
+import time
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
 import os
 from dotenv import load_dotenv
 
-from database import get_db
+from cache import TTLCache
+from database import get_async_db
 from models import User
 
 load_dotenv()
@@ -18,8 +24,44 @@ SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Authenticated-user cache; entries never outlive the token they came from
+AUTH_USER_CACHE_SIZE = int(os.getenv("AUTH_USER_CACHE_SIZE", "10000"))
+AUTH_USER_CACHE_TTL = int(os.getenv("AUTH_USER_CACHE_TTL", "60"))
+
+# Password hashing. Hashes made with a different cost are upgraded on the next login.
+BCRYPT_TARGET_MS = float(os.getenv("BCRYPT_TARGET_MS", "0"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+
+def calibrate_bcrypt_rounds(target_ms: float, minimum: int = 10, maximum: int = 16) -> int:
+    """Pick the highest cost whose hash takes no longer than target_ms on this machine"""
+    import bcrypt
+    rounds = minimum
+    start = time.perf_counter()
+    bcrypt.hashpw(b"calibration", bcrypt.gensalt(rounds))
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    # Each extra round doubles the cost
+    while rounds < maximum and elapsed_ms * 2 <= target_ms:
+        rounds += 1
+        elapsed_ms *= 2
+    return rounds
+
+if os.getenv("BCRYPT_ROUNDS"):
+    BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS"))
+elif BCRYPT_TARGET_MS > 0:
+    BCRYPT_ROUNDS = calibrate_bcrypt_rounds(BCRYPT_TARGET_MS)
+else:
+    BCRYPT_ROUNDS = 12
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS
+)
+
+# bcrypt releases the GIL, so a thread pool hashes on every core without blocking the event loop
+_hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
 
 # Security scheme
 security = HTTPBearer()
@@ -30,6 +72,18 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+async def hash_password(password: str) -> str:
+    """Hash a password on the hashing pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_hash_executor, pwd_context.hash, password)
+
+async def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify on the hashing pool; also returns a new hash if the stored one uses an outdated cost"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _hash_executor, pwd_context.verify_and_update, plain_password, hashed_password
+    )
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -40,20 +94,45 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def verify_token(token: str) -> Optional[str]:
+def decode_token(token: str) -> Optional[dict]:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            return None
-        return email
     except JWTError:
         return None
+    if payload.get("sub") is None:
+        return None
+    return payload
+
+def verify_token(token: str) -> Optional[str]:
+    payload = decode_token(token)
+    return payload.get("sub") if payload else None
+
+@dataclass(frozen=True)
+class CachedUser:
+    """Snapshot of the fields request handlers need from the authenticated user"""
+    id: int
+    email: str
+    username: str
+    is_active: bool
+
+    @classmethod
+    def from_user(cls, user: User) -> "CachedUser":
+        return cls(id=user.id, email=user.email, username=user.username, is_active=bool(user.is_active))
+
+_user_cache = TTLCache(maxsize=AUTH_USER_CACHE_SIZE, ttl=AUTH_USER_CACHE_TTL)
+
+def invalidate_user(user_id: int):
+    _user_cache.pop(user_id)
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_changed_user(mapper, connection, target):
+    invalidate_user(target.id)
 
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-) -> User:
+    db: AsyncSession = Depends(get_async_db)
+) -> CachedUser:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -61,12 +140,26 @@ async def get_current_user(
     )
     
     token = credentials.credentials
-    email = verify_token(token)
-    if email is None:
+    payload = decode_token(token)
+    if payload is None:
         raise credentials_exception
-    
-    user = db.query(User).filter(User.email == email).first()
-    if user is None:
+    email = payload["sub"]
+    user_id = payload.get("uid")
+
+    # Tokens carry the user id, so repeat requests are served from the cache
+    if user_id is not None:
+        cached = _user_cache.get(user_id)
+        if cached is not None and cached.email == email:
+            return cached
+        user = await db.get(User, user_id)
+    else:
+        user = (await db.scalars(select(User).where(User.email == email))).first()
+
+    if user is None or user.email != email or not user.is_active:
         raise credentials_exception
-    
-    return user
+
+    snapshot = CachedUser.from_user(user)
+    ttl = min(AUTH_USER_CACHE_TTL, payload.get("exp", 0) - time.time())
+    if ttl > 0:
+        _user_cache.set(user.id, snapshot, ttl=ttl)
+    return snapshot
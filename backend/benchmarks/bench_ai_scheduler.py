@@ -0,0 +1,100 @@
+"""Interactive wait times under bulk load: FIFO semaphore vs FairScheduler.
+
+Simulates provider calls as sleeps of --latency seconds (with jitter) behind
+--slots concurrency slots. A few interactive users send one edit at a time
+with think time between them. Meanwhile one user queues --bulk generations
+at once, as a batch script would. The same workload runs three times:
+
+- without the bulk user, as the baseline
+- through a plain asyncio.Semaphore, where everyone waits in arrival order
+- through the FairScheduler, with the bulk calls in the batch class
+
+The report shows the p50/p95/max time interactive calls wait for a slot,
+and how long the bulk work takes.
+
+    python benchmarks/bench_ai_scheduler.py --slots 20 --bulk 400 --users 5
+
+No provider or network is involved.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from contextlib import asynccontextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from router import percentile
+from scheduler import PRIORITY_BATCH, PRIORITY_INTERACTIVE, FairScheduler
+
+class SemaphoreSlots:
+    """What the provider semaphore alone gives: one FIFO queue for everyone"""
+
+    def __init__(self, slots: int):
+        self._semaphore = asyncio.Semaphore(slots)
+
+    @asynccontextmanager
+    async def slot(self, priority: str, user_id=None):
+        async with self._semaphore:
+            yield
+
+async def call(slots, priority: str, user_id: int, latency: float) -> float:
+    start = time.perf_counter()
+    async with slots.slot(priority, user_id):
+        waited = time.perf_counter() - start
+        await asyncio.sleep(latency * random.uniform(0.5, 1.5))
+    return waited
+
+async def run(slots, args, bulk: int) -> dict:
+    waits = []
+    stop = asyncio.Event()
+
+    async def interactive_user(user_id: int):
+        await asyncio.sleep(random.uniform(0, args.think))
+        while not stop.is_set():
+            waits.append(await call(slots, PRIORITY_INTERACTIVE, user_id, args.latency))
+            await asyncio.sleep(args.think * random.uniform(0.5, 1.5))
+
+    async def bulk_user():
+        await asyncio.gather(*(call(slots, PRIORITY_BATCH, 0, args.latency) for _ in range(bulk)))
+
+    users = [asyncio.ensure_future(interactive_user(i)) for i in range(1, args.users + 1)]
+    start = time.perf_counter()
+    if bulk:
+        await bulk_user()
+    else:
+        await asyncio.sleep(args.latency * args.bulk / args.slots)
+    bulk_seconds = time.perf_counter() - start
+    stop.set()
+    await asyncio.gather(*users)
+    return {"waits": waits, "bulk_seconds": bulk_seconds}
+
+def report(label: str, result: dict, bulk: int):
+    waits = result["waits"]
+    ms = lambda q: f"{(percentile(waits, q) or 0) * 1000:7.1f}"
+    line = f"{label:>16}: {len(waits):4d} interactive calls, wait p50 {ms(0.5)} ms, p95 {ms(0.95)} ms, max {ms(1.0)} ms"
+    if bulk:
+        line += f"; bulk done in {result['bulk_seconds']:.2f}s"
+    print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--slots", type=int, default=20, help="provider calls in flight")
+    parser.add_argument("--bulk", type=int, default=400, help="calls the bulk user queues at once")
+    parser.add_argument("--users", type=int, default=5, help="interactive users")
+    parser.add_argument("--latency", type=float, default=0.05, help="mean seconds per simulated provider call")
+    parser.add_argument("--think", type=float, default=0.1, help="mean seconds between an interactive user's calls")
+    args = parser.parse_args()
+
+    print(
+        f"{args.slots} slots, {args.latency * 1000:.0f} ms calls, {args.users} interactive users, "
+        f"{args.bulk} bulk calls"
+    )
+    report("no bulk load", asyncio.run(run(FairScheduler(args.slots), args, 0)), 0)
+    report("semaphore (FIFO)", asyncio.run(run(SemaphoreSlots(args.slots), args, args.bulk)), args.bulk)
+    report("fair scheduler", asyncio.run(run(FairScheduler(args.slots), args, args.bulk)), args.bulk)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Saving batch-generated games: one transaction per game vs per chunk.
+
+Inserts --games generated games into a fresh SQLite file with the tuned
+profile, first one create_game call (one transaction) per game, as
+/ai/generate-games would without chunking, then create_games calls of
+--chunk games each.
+
+    python benchmarks/bench_batch_insert.py --games 1000 --chunk 25
+
+The database files are created in a temporary directory and removed afterwards.
+"""
+import argparse
+import asyncio
+import os
+import random
+import string
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+import models
+import schemas
+import services
+from database import apply_sqlite_pragmas
+
+def make_engine(path: str):
+    sync_engine = create_engine(f"sqlite:///{path}")
+    event.listen(sync_engine, "connect", apply_sqlite_pragmas)
+    models.Base.metadata.create_all(bind=sync_engine)
+    with sync_engine.begin() as conn:
+        conn.execute(models.User.__table__.insert().values(
+            email="bench@example.com", username="bench", hashed_password="x"
+        ))
+    sync_engine.dispose()
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    event.listen(async_engine.sync_engine, "connect", apply_sqlite_pragmas)
+    return async_engine
+
+def generated_games(count: int):
+    # Distinct code per game, as generations are, so every game stores its own blob
+    body = "x = 1\n" * 600
+    return [
+        schemas.GameCreate(
+            title=f"Game {i}", prompt=f"prompt {i}",
+            code=f"# {''.join(random.choices(string.ascii_letters, k=16))}\n{body}"
+        )
+        for i in range(count)
+    ]
+
+async def insert(path: str, games, chunk: int) -> float:
+    async_engine = make_engine(path)
+    sessions = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+    service = services.AsyncGameService()
+    start = time.perf_counter()
+    async with sessions() as db:
+        if chunk <= 1:
+            for game in games:
+                await service.create_game(db, game, 1)
+        else:
+            for i in range(0, len(games), chunk):
+                await service.create_games(db, games[i:i + chunk], 1)
+    elapsed = time.perf_counter() - start
+    await async_engine.dispose()
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--chunk", type=int, default=25, help="games per transaction for create_games")
+    args = parser.parse_args()
+
+    games = generated_games(args.games)
+    print(f"{args.games} games of {len(games[0].code)} bytes")
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, chunk in (("per game", 1), (f"chunks of {args.chunk}", args.chunk)):
+            elapsed = asyncio.run(insert(os.path.join(tmp, f"{chunk}.db"), games, chunk))
+            print(f"{label:>14}: {elapsed:6.2f}s, {args.games / elapsed:8.1f} games/s")
+
+if __name__ == "__main__":
+    main()
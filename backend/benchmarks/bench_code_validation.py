@@ -0,0 +1,151 @@
+"""Latency validation adds to a generation, and what it costs the event loop.
+
+Builds --programs distinct pygame programs of about --size bytes, half of
+them wrapped in markdown fences as providers sometimes return them, and
+reports:
+
+- the CPU time of codecheck.check_code itself
+- the p50/p95 latency CodeValidator adds per unseen program, on the event
+  loop (workers=0) and through the process pool, and for cache hits
+- the longest event loop stall while --concurrency programs are checked
+  at once, measured by a ticker that should run every millisecond
+
+    python benchmarks/bench_code_validation.py --programs 200 --workers 2
+
+The pool is warmed before timing, as the app does at startup.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from codecheck import check_code
+from router import percentile
+from services import CodeValidator
+
+GAME = '''import pygame
+import random
+
+pygame.init()
+WIDTH, HEIGHT = 800, 600
+screen = pygame.display.set_mode((WIDTH, HEIGHT))
+clock = pygame.time.Clock()
+
+{helpers}
+
+running = True
+while running:
+    for event in pygame.event.get():
+        if event.type == pygame.QUIT:
+            running = False
+    screen.fill((0, 0, 0))
+    pygame.display.flip()
+    clock.tick(60)
+
+pygame.quit()
+'''
+
+HELPER = '''
+class Sprite{n}(pygame.sprite.Sprite):
+    def __init__(self, x, y):
+        super().__init__()
+        self.image = pygame.Surface(({w}, {h}))
+        self.image.fill(({r}, {g}, {b}))
+        self.rect = self.image.get_rect(center=(x, y))
+        self.speed = {speed}
+
+    def update(self, keys):
+        if keys[pygame.K_LEFT]:
+            self.rect.x -= self.speed
+        if keys[pygame.K_RIGHT]:
+            self.rect.x += self.speed
+        self.rect.clamp_ip(screen.get_rect())
+'''
+
+def make_programs(count: int, size: int):
+    programs = []
+    for i in range(count):
+        helpers = []
+        while sum(map(len, helpers)) < size:
+            helpers.append(HELPER.format(
+                n=f"{i}_{len(helpers)}", w=random.randint(8, 64), h=random.randint(8, 64),
+                r=random.randint(0, 255), g=random.randint(0, 255), b=random.randint(0, 255),
+                speed=random.randint(1, 9)
+            ))
+        code = GAME.format(helpers="".join(helpers))
+        programs.append(f"```python\n{code}```\n" if i % 2 else code)
+    return programs
+
+def ms(samples, q: float) -> str:
+    return f"{(percentile(samples, q) or 0) * 1000:7.2f} ms"
+
+async def added_latency(validator: CodeValidator, programs) -> list:
+    latencies = []
+    for program in programs:
+        start = time.perf_counter()
+        check = await validator.check(program)
+        latencies.append(time.perf_counter() - start)
+        assert check.ok, check.problems
+    return latencies
+
+async def loop_stall(validator: CodeValidator, programs, concurrency: int) -> float:
+    stall = 0.0
+    done = False
+
+    async def ticker():
+        nonlocal stall
+        last = time.perf_counter()
+        while not done:
+            await asyncio.sleep(0.001)
+            now = time.perf_counter()
+            stall = max(stall, now - last - 0.001)
+            last = now
+
+    ticking = asyncio.ensure_future(ticker())
+    await asyncio.sleep(0.01)
+    for i in range(0, len(programs), concurrency):
+        await asyncio.gather(*(validator.check(program) for program in programs[i:i + concurrency]))
+    done = True
+    await ticking
+    return stall
+
+async def run(args):
+    programs = make_programs(args.programs * 3, args.size)
+    first, second, third = (programs[i::3] for i in range(3))
+    print(f"{args.programs} programs of ~{sum(map(len, first)) // len(first)} bytes")
+
+    cpu = []
+    for program in first:
+        start = time.perf_counter()
+        check_code(program)
+        cpu.append(time.perf_counter() - start)
+    print(f"{'check_code CPU':>22}: p50 {ms(cpu, 0.5)}, p95 {ms(cpu, 0.95)}")
+
+    for label, workers, batch in (("on the event loop", 0, second), (f"pool ({args.workers} workers)", args.workers, third)):
+        validator = CodeValidator(workers=workers)
+        if workers:
+            validator.warm()
+            await asyncio.sleep(2)
+        latencies = await added_latency(validator, batch[:len(batch) // 2])
+        hits = await added_latency(validator, batch[:len(batch) // 2])
+        stall = await loop_stall(validator, batch[len(batch) // 2:], args.concurrency)
+        print(
+            f"{label:>22}: added p50 {ms(latencies, 0.5)}, p95 {ms(latencies, 0.95)}; "
+            f"cache hit p50 {ms(hits, 0.5)}; loop stall at {args.concurrency} at once {stall * 1000:7.2f} ms"
+        )
+        validator.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--programs", type=int, default=200)
+    parser.add_argument("--size", type=int, default=6000, help="approximate program size in bytes")
+    parser.add_argument("--workers", type=int, default=2, help="validation processes")
+    parser.add_argument("--concurrency", type=int, default=16, help="programs checked at once for the stall test")
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
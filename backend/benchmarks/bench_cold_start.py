@@ -0,0 +1,165 @@
+"""Cold-start cost of the backend: import time and first-request latency.
+
+Each run is a fresh interpreter, as on a newly started Render/Railway
+instance. It imports main under `python -X importtime`, runs the startup
+handlers (table creation), then sends the first /health and the first
+authenticated GET /games through the app. Reports the median over --runs,
+the modules that dominate the import, and what importing the provider
+SDKs would add (deferred until the first AI call) and redis (imported
+only when RATE_LIMIT_REDIS_URL is set).
+
+    python benchmarks/bench_cold_start.py --runs 5 --max-import-ms 1500
+
+Exits non-zero if an eagerly imported module listed in --forbid shows up
+after `import main`, or if the median import exceeds --max-import-ms.
+Every run uses a throwaway SQLite database and placeholder API keys, so no
+provider is contacted.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r"""
+import asyncio, importlib.util, json, sys, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+import httpx, auth, models
+from database import SessionLocal
+
+async def first_requests():
+    timings = {}
+    t = time.perf_counter()
+    await main.app.router.startup()
+    timings["startup_ms"] = (time.perf_counter() - t) * 1000
+    db = SessionLocal()
+    user = models.User(email="cold@example.com", username="cold", hashed_password="x")
+    db.add(user)
+    db.commit()
+    token = auth.create_access_token({"sub": user.email, "uid": user.id})
+    db.close()
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for name, path, headers in (
+            ("health_ms", "/health", {}),
+            ("games_ms", "/games", {"Authorization": f"Bearer {token}"}),
+        ):
+            t = time.perf_counter()
+            response = await client.get(path, headers=headers)
+            assert response.status_code == 200, response.text
+            timings[name] = (time.perf_counter() - t) * 1000
+    await main.app.router.shutdown()
+    return timings
+
+loaded = sorted(name for name in FORBID if name in sys.modules)
+timings = asyncio.run(first_requests())
+t = time.perf_counter()
+for name in FORBID:
+    # Optional packages such as redis may not be installed
+    if importlib.util.find_spec(name) is not None:
+        __import__(name)
+timings["import_ms"] = (imported - start) * 1000
+timings["deferred_sdk_ms"] = (time.perf_counter() - t) * 1000
+timings["eager"] = loaded
+print(json.dumps(timings))
+"""
+
+def child_env(database: str) -> dict:
+    env = dict(os.environ)
+    env.pop("ANTHROPIC_BASE_URL", None)
+    # Without a Redis URL the limiter must not import redis at all
+    env.pop("RATE_LIMIT_REDIS_URL", None)
+    env.update({
+        "DATABASE_URL": f"sqlite:///{database}",
+        "ASYNC_DATABASE_URL": f"sqlite+aiosqlite:///{database}",
+        # Placeholders: providers are configured but never called
+        "ANTHROPIC_API_KEY": "cold-start-bench",
+        "OPENAI_API_KEY": "cold-start-bench",
+    })
+    return env
+
+def main_imports(stderr: str) -> list:
+    """(cumulative us, module) for each import made directly by main, from -X importtime output.
+
+    A module's line comes after the lines of everything it imported, so
+    main's direct imports are the depth-1 lines since the previous depth-0 line.
+    """
+    children = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 0:
+            if name.strip() == "main":
+                return children
+            children = []
+        elif depth == 1:
+            children.append((int(cumulative), name.strip()))
+    return children
+
+def run_once(forbid) -> tuple:
+    with tempfile.TemporaryDirectory() as tmp:
+        code = f"FORBID = {list(forbid)!r}\n{CHILD}"
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            cwd=BACKEND, env=child_env(os.path.join(tmp, "cold.db")),
+            capture_output=True, text=True
+        )
+        wall_ms = (time.perf_counter() - start) * 1000
+    if result.returncode != 0:
+        sys.exit(result.stderr[-3000:])
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    # The child imports the SDKs after its first responses; that is not part of the cold start
+    timings["wall_ms"] = wall_ms - timings["deferred_sdk_ms"]
+    return timings, main_imports(result.stderr)
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=12, help="number of slowest imports made by main to list")
+    parser.add_argument("--forbid", default="anthropic,openai,redis", help="comma-separated modules main must not import")
+    parser.add_argument("--max-import-ms", type=float, default=0, help="fail if the median import exceeds this (0: no limit)")
+    args = parser.parse_args()
+
+    forbid = [name for name in args.forbid.split(",") if name]
+    runs = [run_once(forbid) for _ in range(args.runs)]
+
+    print(f"Cold start, median of {args.runs} fresh processes:")
+    for key, label in (
+        ("import_ms", "import main"),
+        ("startup_ms", "startup handlers"),
+        ("health_ms", "first GET /health"),
+        ("games_ms", "first GET /games"),
+        ("wall_ms", "process start to last response"),
+        ("deferred_sdk_ms", f"deferred: import {', '.join(forbid)}"),
+    ):
+        print(f"  {label:<34} {statistics.median(t[key] for t, _ in runs):8.1f} ms")
+
+    print("Slowest imports made by main (last run, including what they import):")
+    for us, name in sorted(runs[-1][1], reverse=True)[:args.top]:
+        print(f"  {name:<34} {us / 1000:8.1f} ms")
+
+    failed = False
+    eager = sorted({name for timings, _ in runs for name in timings["eager"]})
+    if eager:
+        print(f"❌ Imported eagerly by main: {', '.join(eager)}")
+        failed = True
+    median_import = statistics.median(t["import_ms"] for t, _ in runs)
+    if args.max_import_ms and median_import > args.max_import_ms:
+        print(f"❌ import main took {median_import:.0f} ms, over the {args.max_import_ms:.0f} ms budget")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,61 @@
+"""Login throughput with bcrypt inline on the event loop vs on the hashing pool.
+
+Runs N concurrent password verifications both ways and reports logins/s,
+logins/s per core, and the worst event-loop stall seen by a 10 ms ticker
+(how long every other request would have been frozen).
+
+    python benchmarks/bench_login.py --logins 64
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import auth
+
+async def ticker(stop: asyncio.Event, stalls: list):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.01)
+        stalls.append(time.perf_counter() - start - 0.01)
+
+async def run(logins: int, verify) -> dict:
+    stop = asyncio.Event()
+    stalls = []
+    tick = asyncio.create_task(ticker(stop, stalls))
+    await asyncio.sleep(0.02)
+    start = time.perf_counter()
+    await asyncio.gather(*[verify() for _ in range(logins)])
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await tick
+    return {"elapsed": elapsed, "rate": logins / elapsed, "max_stall_ms": max(stalls) * 1000}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=32)
+    args = parser.parse_args()
+
+    hashed = auth.pwd_context.hash("correct horse battery staple")
+    cores = min(auth.PASSWORD_HASH_WORKERS, os.cpu_count() or 1)
+
+    async def inline():
+        auth.verify_password("correct horse battery staple", hashed)
+
+    async def pooled():
+        await auth.verify_and_update_password("correct horse battery staple", hashed)
+
+    print(f"bcrypt rounds={auth.BCRYPT_ROUNDS} workers={auth.PASSWORD_HASH_WORKERS} cpus={os.cpu_count()}")
+    for name, verify, used_cores in (("inline", inline, 1), ("pool", pooled, cores)):
+        result = asyncio.run(run(args.logins, verify))
+        print(
+            f"{name:>6}: {result['rate']:7.1f} logins/s  "
+            f"{result['rate'] / used_cores:6.1f} /core  "
+            f"max loop stall {result['max_stall_ms']:8.1f} ms"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""Game-type detection in main-minimal.py: first-match substring scans vs the weighted single-pass matcher.
+
+"legacy" is the previous detection: five sequential any(word in prompt)
+scans where the first matching branch wins. "weighted" is
+classify_game_type. Reports accuracy on a labelled prompt set and
+throughput on a corpus of long prompts, and how both styles scale as game
+types and keywords are added. The labelled set was written together with
+the keyword table, so treat its accuracy as a regression check rather than
+a held-out score.
+
+    python benchmarks/bench_minimal_classifier.py --corpus 2000
+
+main-minimal.py has a hyphen in its name, so it is loaded through importlib.
+"""
+import argparse
+import importlib.util
+import os
+import random
+import time
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def load_minimal():
+    spec = importlib.util.spec_from_file_location("main_minimal", os.path.join(BACKEND, "main-minimal.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def legacy_classify(prompt: str) -> str:
+    prompt_lower = prompt.lower()
+    if any(word in prompt_lower for word in ['space', 'shooter', 'alien', 'spaceship', 'asteroid']):
+        return "space_shooter"
+    elif any(word in prompt_lower for word in ['platform', 'jump', 'mario', 'runner']):
+        return "platformer"
+    elif any(word in prompt_lower for word in ['puzzle', 'match', 'connect', 'block']):
+        return "puzzle"
+    elif any(word in prompt_lower for word in ['racing', 'car', 'drive', 'speed']):
+        return "racing"
+    return "adventure"
+
+def first_match(keywords):
+    """The legacy detection generalised to a keyword table"""
+    def classify(prompt: str) -> str:
+        prompt_lower = prompt.lower()
+        for game_type, words in keywords.items():
+            if any(word in prompt_lower for word in words):
+                return game_type
+        return "adventure"
+    return classify
+
+def per_prompt(classify, prompts) -> float:
+    start = time.perf_counter()
+    for prompt in prompts:
+        classify(prompt)
+    return (time.perf_counter() - start) / len(prompts) * 1e6
+
+# (prompt, expected game type)
+LABELLED = [
+    ("a space shooter with asteroids", "space_shooter"),
+    ("shoot down alien invaders", "space_shooter"),
+    ("spaceship dodging lasers in a galaxy", "space_shooter"),
+    ("ufo attack", "space_shooter"),
+    ("a racing game in space", "racing"),
+    ("race cars around a track on the moon in outer space", "racing"),
+    ("go-kart racing", "racing"),
+    ("drive a car down the highway as fast as you can", "racing"),
+    ("lap times and a speed boost", "racing"),
+    ("a platformer where you jump between ledges", "platformer"),
+    ("mario-style side-scroller", "platformer"),
+    ("endless runner in a city", "platformer"),
+    ("jumping over spikes on floating platforms", "platformer"),
+    ("a puzzle game with falling blocks like tetris", "puzzle"),
+    ("match-3 with jewels and gems", "puzzle"),
+    ("connect the tiles on a grid", "puzzle"),
+    ("sudoku", "puzzle"),
+    ("a dungeon adventure with treasure", "adventure"),
+    ("explore a maze and fight monsters with a sword", "adventure"),
+    ("zelda-like quest", "adventure"),
+    ("an rpg about a knight", "adventure"),
+    ("a cozy farming game", "adventure"),
+    ("escape the carnival", "adventure"),
+    ("a scary story in a haunted house", "adventure"),
+    ("a cartoon cat collecting coins", "adventure"),
+    ("blockbuster movie adventure", "adventure"),
+    ("race against aliens across the galaxy in your spaceship", "space_shooter"),
+    ("puzzle platformer where you jump on switches", "platformer"),
+    ("dungeon crawler with a timed speed run", "adventure"),
+    ("matchmaking lobby for a shooter", "space_shooter"),
+]
+
+FILLER = [
+    "The player should have three lives and a score counter in the corner.",
+    "Use bright colors and make the controls feel responsive.",
+    "There should be a title screen, a pause menu and a game over screen.",
+    "Difficulty should ramp up slowly so new players are not overwhelmed.",
+    "Add sound effects for every action and some background music.",
+    "Keep the art style simple, with shapes instead of sprites.",
+]
+
+def corpus(size: int, seed: int):
+    rng = random.Random(seed)
+    prompts = []
+    for _ in range(size):
+        head = rng.choice(LABELLED)[0]
+        body = " ".join(rng.choice(FILLER) for _ in range(rng.randint(5, 15)))
+        prompts.append(f"I want {head}. {body}")
+    return prompts
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", type=int, default=2000, help="number of long prompts to classify")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--verbose", action="store_true", help="list misclassified prompts")
+    args = parser.parse_args()
+
+    minimal = load_minimal()
+    classifiers = [("legacy", legacy_classify), ("weighted", minimal.classify_game_type)]
+
+    print(f"Accuracy on {len(LABELLED)} labelled prompts:")
+    for name, classify in classifiers:
+        wrong = [(prompt, expected, classify(prompt)) for prompt, expected in LABELLED if classify(prompt) != expected]
+        print(f"  {name:>8}: {1 - len(wrong) / len(LABELLED):6.1%}")
+        if args.verbose:
+            for prompt, expected, got in wrong:
+                print(f"             {prompt!r}: {got}, expected {expected}")
+
+    prompts = corpus(args.corpus, args.seed)
+    average = sum(len(p) for p in prompts) / len(prompts)
+    print(f"Throughput on {len(prompts)} prompts of {average:.0f} characters on average:")
+    for name, classify in classifiers:
+        print(f"  {name:>8}: {per_prompt(classify, prompts):7.1f} us/prompt")
+
+    # The same keyword set in both styles, then with synthetic extra game types
+    print("Scaling with the number of game types (first-match scans vs the compiled matcher):")
+    for multiplier in (1, 2, 4, 8):
+        keywords = {
+            f"{game_type}_{i}" if i else game_type: {f"{word}{i or ''}": weight for word, weight in words.items()}
+            for i in range(multiplier) for game_type, words in minimal.GAME_KEYWORDS.items()
+        }
+        compiled = minimal.KeywordClassifier(keywords, minimal.DEFAULT_GAME_TYPE)
+        count = sum(len(words) for words in keywords.values())
+        print(f"  {len(keywords):>3} types, {count:>3} keywords: "
+              f"first-match {per_prompt(first_match(keywords), prompts):7.1f} us, "
+              f"compiled {per_prompt(compiled.classify, prompts):7.1f} us")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Requests/s for main-minimal.py's POST /api/generate-game: rebuilt vs precompiled templates.
+
+"rebuild" formats the whole ~200-line program on every request, as the
+old f-string generators did; "splice" joins the precompiled head and tail
+around the caption; "cached" is the shipped path, splice plus the
+(game type, caption) cache. Prompts are drawn from a small pool, so the
+cached run mostly hits.
+
+    python benchmarks/bench_minimal_templates.py --requests 5000
+
+main-minimal.py has a hyphen in its name, so it is loaded through importlib.
+"""
+import argparse
+import asyncio
+import importlib.util
+import os
+import time
+
+import httpx
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def load_minimal():
+    spec = importlib.util.spec_from_file_location("main_minimal", os.path.join(BACKEND, "main-minimal.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+PROMPTS = [
+    "space shooter with asteroids",
+    "platform jumping game like mario",
+    "match three puzzle",
+    "fast racing game with cars",
+    "dungeon adventure with treasure",
+    "alien invasion shooter",
+    "endless runner",
+    "drive on a highway at high speed",
+]
+
+async def run(minimal, requests: int, concurrency: int) -> float:
+    transport = httpx.ASGITransport(app=minimal.app)
+    semaphore = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one(i: int):
+            async with semaphore:
+                response = await client.post("/api/generate-game", json={"prompt": PROMPTS[i % len(PROMPTS)]})
+                assert response.json()["success"], response.text
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        return requests / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--renders", type=int, default=100000, help="iterations of the render-only timing")
+    args = parser.parse_args()
+
+    minimal = load_minimal()
+    shipped = minimal.render_game
+    templates = {
+        "space_shooter": minimal.SPACE_SHOOTER_TEMPLATE,
+        "platformer": minimal.PLATFORMER_TEMPLATE,
+        "puzzle": minimal.PUZZLE_GAME_TEMPLATE,
+        "racing": minimal.RACING_GAME_TEMPLATE,
+        "adventure": minimal.ADVENTURE_GAME_TEMPLATE,
+    }
+
+    def rebuild(game_type: str, caption: str) -> str:
+        return templates[game_type].replace(minimal.CAPTION_PLACEHOLDER, caption)
+
+    variants = [("rebuild", rebuild), ("splice", shipped.__wrapped__), ("cached", shipped)]
+
+    captions = [minimal._caption(prompt) for prompt in PROMPTS]
+    game_types = list(templates)
+    print(f"Render only ({args.renders} renders):")
+    for name, render in variants:
+        start = time.perf_counter()
+        for i in range(args.renders):
+            render(game_types[i % len(game_types)], captions[i % len(captions)])
+        print(f"  {name:>8}: {(time.perf_counter() - start) / args.renders * 1e6:6.3f} us/render")
+
+    # Alternate the variants over several rounds so warm-up and noise spread evenly
+    rates = {name: [] for name, _ in variants}
+    for _ in range(args.rounds):
+        for name, render in variants:
+            minimal.render_game = render
+            rates[name].append(asyncio.run(run(minimal, args.requests, args.concurrency)))
+    minimal.render_game = shipped
+    print(f"POST /api/generate-game ({args.requests} requests x {args.rounds} rounds, concurrency {args.concurrency}):")
+    for name, _ in variants:
+        print(f"  {name:>8}: {max(rates[name]):8.1f} req/s (best round)")
+
+if __name__ == "__main__":
+    main()
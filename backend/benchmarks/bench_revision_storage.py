@@ -0,0 +1,80 @@
+"""Storage bytes per revision: full copies vs compressed snapshots vs snapshots + deltas.
+
+Simulates a game going through AI iterations that each edit a few lines
+(change a constant, insert a block, delete a line) and stores every version
+the way revisions.new_revision does. Reports bytes per revision and the
+time to rebuild the worst-placed version (the one furthest from a snapshot).
+
+    python benchmarks/bench_revision_storage.py --revisions 200 --snapshot-every 20
+
+No database is used; rows are built in memory.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import revisions
+import services
+
+def edit(code: str, rng: random.Random, step: int) -> str:
+    lines = code.split("\n")
+    at = rng.randrange(1, len(lines))
+    action = rng.random()
+    if action < 0.5:
+        lines[at] = f"{lines[at]}  # tweak {step}"
+    elif action < 0.85:
+        indent = lines[at][:len(lines[at]) - len(lines[at].lstrip())]
+        lines[at:at] = [f"{indent}power_up_{step} = {rng.randint(1, 100)}", f"{indent}score += power_up_{step}"]
+    else:
+        del lines[at]
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--revisions", type=int, default=200)
+    parser.add_argument("--snapshot-every", type=int, default=revisions.GAME_REVISION_SNAPSHOT_EVERY)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    revisions.GAME_REVISION_SNAPSHOT_EVERY = args.snapshot_every
+
+    rng = random.Random(args.seed)
+    code = services.AIService._generate_fallback(None, "space shooter with power ups")
+    versions = [code]
+    for step in range(1, args.revisions):
+        versions.append(edit(versions[-1], rng, step))
+
+    rows, chain_length = [], 0
+    start = time.perf_counter()
+    for version, text in enumerate(versions, start=1):
+        row = revisions.new_revision(1, version, text, versions[version - 2] if version > 1 else None, chain_length)
+        chain_length = 1 if row.kind == revisions.SNAPSHOT else chain_length + 1
+        rows.append(row)
+    encode_ms = (time.perf_counter() - start) * 1000 / len(rows)
+
+    full = sum(len(text.encode("utf-8")) for text in versions)
+    compressed = sum(len(revisions.compress_text(text)) for text in versions)
+    stored = sum(len(row.data) for row in rows)
+    snapshots = sum(1 for row in rows if row.kind == revisions.SNAPSHOT)
+
+    # The version just before a snapshot replays the longest delta chain
+    worst = max(range(len(rows)), key=lambda i: i - max(j for j in range(i + 1) if rows[j].kind == revisions.SNAPSHOT))
+    first = max(j for j in range(worst + 1) if rows[j].kind == revisions.SNAPSHOT)
+    start = time.perf_counter()
+    rebuilt = revisions.rebuild(rows[first:worst + 1])
+    rebuild_ms = (time.perf_counter() - start) * 1000
+    assert rebuilt == versions[worst]
+
+    n = len(versions)
+    print(f"{n} revisions of a {len(code)}-byte game, snapshot every {args.snapshot_every} ({snapshots} snapshots)")
+    print(f"  full copies:          {full / n:8.0f} bytes/revision")
+    print(f"  compressed copies:    {compressed / n:8.0f} bytes/revision")
+    print(f"  snapshots + deltas:   {stored / n:8.0f} bytes/revision ({full / stored:.0f}x smaller than full copies)")
+    print(f"  encode:               {encode_ms:8.2f} ms/revision")
+    print(f"  worst rebuild:        {rebuild_ms:8.2f} ms (version {worst + 1}, {worst - first} deltas)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Serialization time and bytes on the wire for game responses.
+
+Renders GameResponse payloads with realistic code sizes through the stock
+JSONResponse and through ORJSONResponse, then compresses them with gzip and
+brotli at the levels the CompressionMiddleware uses. Finally fetches a
+seeded game and a /games page through the app to show the bytes a client
+actually receives for each Accept-Encoding.
+
+    python benchmarks/bench_serialization.py --iterations 2000
+
+The app part modifies DATABASE_URL: tables are created and a bench user is seeded.
+"""
+import argparse
+import asyncio
+import gzip
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from fastapi.responses import JSONResponse, ORJSONResponse
+
+import auth
+import compression
+import main
+import models
+import schemas
+from database import SessionLocal, engine
+
+def game_code(size: int) -> str:
+    # Games grow by adding entities; rename each copy so it does not compress as a pure repeat
+    base = main.ai_service._generate_fallback("space shooter with power ups")
+    parts, i = [], 0
+    while sum(len(p) for p in parts) < size:
+        parts.append(base.replace("player", f"entity_{i}").replace("255", str(200 + i % 55)))
+        i += 1
+    return "".join(parts)[:size]
+
+def payload(size: int, game_id: int = 1) -> dict:
+    now = datetime.now(timezone.utc)
+    game = schemas.GameResponse(
+        id=game_id, title="Space shooter", description="Dodge and shoot", prompt="space shooter with power ups",
+        code=game_code(size), is_public=False, version=7, metadata={"genre": "shooter"},
+        created_at=now, updated_at=now, owner_id=1
+    )
+    return game.model_dump(mode="json")
+
+def time_render(response_class, content, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        response_class(content)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+def time_compress(fn, body: bytes, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn(body)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+def seed(size: int) -> tuple:
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        user = db.query(models.User).filter(models.User.email == "bench@example.com").first()
+        if user is None:
+            user = models.User(email="bench@example.com", username="bench", hashed_password="x")
+            db.add(user)
+            db.commit()
+        game = models.Game(title="Bench", prompt="bench", code=game_code(size), owner_id=user.id)
+        db.add(game)
+        for i in range(19):
+            db.add(models.Game(title=f"Bench {i}", prompt="bench", code=game_code(size), owner_id=user.id))
+        db.commit()
+        return auth.create_access_token({"sub": user.email, "uid": user.id}), game.id
+    finally:
+        db.close()
+
+async def wire(paths, token: str):
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for path in paths:
+            for encoding in ("identity", "gzip", "br"):
+                response = await client.get(path, headers={"Authorization": f"Bearer {token}", "Accept-Encoding": encoding})
+                sent = response.headers.get("content-encoding", "identity")
+                # httpx decodes the body; num_bytes_downloaded is what came over the wire
+                print(f"  {path:<16} {encoding:>8}: {response.num_bytes_downloaded:>7} bytes ({sent})")
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=1000)
+    parser.add_argument("--sizes", default="2000,8000,32000", help="comma-separated code sizes in bytes")
+    parser.add_argument("--skip-app", action="store_true", help="only run the in-memory measurements")
+    args = parser.parse_args()
+
+    brotli = compression.brotli
+    print(f"{'code size':>10} {'json us':>9} {'orjson us':>10} {'identity B':>11} {'gzip B':>8} {'gzip us':>8} {'br B':>7} {'br us':>7}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        content = payload(size)
+        json_us = time_render(JSONResponse, content, args.iterations)
+        orjson_us = time_render(ORJSONResponse, content, args.iterations)
+        body = ORJSONResponse(content).body
+        gzip_body = gzip.compress(body, compression.GZIP_LEVEL)
+        gzip_us = time_compress(lambda b: gzip.compress(b, compression.GZIP_LEVEL), body, args.iterations // 10 or 1)
+        if brotli is not None:
+            br_bytes = len(brotli.compress(body, quality=compression.BROTLI_QUALITY))
+            br_us = time_compress(lambda b: brotli.compress(b, quality=compression.BROTLI_QUALITY), body, args.iterations // 10 or 1)
+            br = f"{br_bytes:>7} {br_us:>7.0f}"
+        else:
+            br = f"{'n/a':>7} {'n/a':>7}"
+        print(f"{size:>10} {json_us:>9.1f} {orjson_us:>10.1f} {len(body):>11} {len(gzip_body):>8} {gzip_us:>8.0f} {br}")
+
+    if not args.skip_app:
+        token, game_id = seed(8000)
+        print("Through the app (8000-byte games):")
+        asyncio.run(wire([f"/games/{game_id}", "/games?limit=20"], token))
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,129 @@
+"""SQLite write throughput: default settings vs the tuned profile with the batching writer.
+
+Fires concurrent create_game calls at a fresh SQLite file, first with
+SQLAlchemy's defaults (rollback journal, synchronous=FULL, one commit per
+request), then with the profile from database.apply_sqlite_pragmas and
+writes funnelled through a WriteQueue. Each run then measures read
+throughput across threads while a writer keeps committing, which only
+overlaps under WAL.
+
+    python benchmarks/bench_sqlite_writes.py --writes 2000 --concurrency 50
+
+The database files are created in a temporary directory and removed afterwards.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+import models
+import schemas
+import services
+from database import apply_sqlite_pragmas
+from write_queue import WriteQueue
+
+CODE = "x" * 4000
+
+def make_engines(path: str, tuned: bool):
+    sync_engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    async_engine = create_async_engine(
+        f"sqlite+aiosqlite:///{path}", poolclass=AsyncAdaptedQueuePool, pool_size=20, max_overflow=40
+    )
+    if tuned:
+        event.listen(sync_engine, "connect", apply_sqlite_pragmas)
+        event.listen(async_engine.sync_engine, "connect", apply_sqlite_pragmas)
+    models.Base.metadata.create_all(bind=sync_engine)
+    with sync_engine.begin() as conn:
+        conn.execute(models.User.__table__.insert().values(
+            email="bench@example.com", username="bench", hashed_password="x"
+        ))
+        conn.execute(models.CodeBlob.__table__.insert().values(**models.CodeBlob.row(CODE)))
+    return sync_engine, async_engine
+
+async def write(async_engine, writes: int, concurrency: int, queued: bool):
+    sessions = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+    writer = WriteQueue(session_factory=sessions) if queued else None
+    service = services.AsyncGameService(writer=writer)
+    semaphore = asyncio.Semaphore(concurrency)
+    errors = []
+    game = schemas.GameCreate(title="Bench", prompt="bench", code=CODE)
+
+    async def one():
+        async with semaphore:
+            try:
+                async with sessions() as db:
+                    await service.create_game(db, game, 1)
+            except Exception as e:
+                errors.append(e)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(writes)))
+    elapsed = time.perf_counter() - start
+    if writer is not None:
+        await writer.close()
+    await async_engine.dispose()
+    return elapsed, errors, writer
+
+def read(sync_engine, threads: int, seconds: float) -> float:
+    stop = threading.Event()
+    counts = [0] * threads
+
+    def reader(slot: int):
+        with sync_engine.connect() as conn:
+            while not stop.is_set():
+                conn.execute(select(models.Game.id, models.Game.title).where(models.Game.owner_id == 1).limit(20)).fetchall()
+                counts[slot] += 1
+
+    def writer():
+        while not stop.is_set():
+            with sync_engine.begin() as conn:
+                conn.execute(models.Game.__table__.insert().values(
+                    title="w", prompt="w", code_hash=models.CodeBlob.hash_code(CODE), owner_id=1
+                ))
+
+    workers = [threading.Thread(target=reader, args=(i,)) for i in range(threads)]
+    workers.append(threading.Thread(target=writer))
+    for worker in workers:
+        worker.start()
+    time.sleep(seconds)
+    stop.set()
+    for worker in workers:
+        worker.join()
+    return sum(counts) / seconds
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writes", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--threads", type=int, default=4, help="reader threads for the read phase")
+    parser.add_argument("--seconds", type=float, default=3.0, help="duration of each read phase")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{args.writes} create_game writes, concurrency {args.concurrency}")
+        for label, tuned in (("default", False), ("tuned + writer", True)):
+            sync_engine, async_engine = make_engines(os.path.join(tmp, f"{label[:5]}.db"), tuned)
+            elapsed, errors, writer = asyncio.run(write(async_engine, args.writes, args.concurrency, tuned))
+            done = args.writes - len(errors)
+            line = f"{label:>15}: {done / elapsed:8.1f} writes/s, {len(errors)} failed"
+            if writer is not None:
+                line += f", {writer.batches} commits (avg batch {writer.stats()['avg_batch']:.1f})"
+            print(line)
+            if errors:
+                print(f"{'':>17}first error: {str(errors[0]).splitlines()[0]}")
+
+            for threads in (1, args.threads):
+                print(f"{'':>17}reads/s, {threads} thread(s) + 1 writer: {read(sync_engine, threads, args.seconds):8.1f}")
+            sync_engine.dispose()
+
+if __name__ == "__main__":
+    main()
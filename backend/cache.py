@@ -0,0 +1,186 @@
+import asyncio
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+from dotenv import load_dotenv
+
+from database import SessionLocal
+from models import GenerationCacheEntry
+
+load_dotenv()
+
+# Generation cache configuration
+AI_CACHE_SIZE = int(os.getenv("AI_CACHE_SIZE", "1024"))
+AI_CACHE_TTL = int(os.getenv("AI_CACHE_TTL", "86400"))
+AI_CACHE_PERSIST = os.getenv("AI_CACHE_PERSIST", "false").lower() in ("1", "true", "yes")
+
+_WHITESPACE = re.compile(r"\s+")
+
+T = TypeVar("T")
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after a TTL (seconds)"""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Any, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, expires_at = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: Optional[float] = None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._data.pop(key, None)
+        return default if item is None else item[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+def normalize_prompt(prompt: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation"""
+    return _WHITESPACE.sub(" ", prompt.lower()).strip().rstrip(".!?").strip()
+
+def cache_key(prompt: str, model: str, system: str) -> str:
+    raw = "\x1f".join((normalize_prompt(prompt), model, system))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+class GenerationCache:
+    """In-memory LRU+TTL cache of generated code with an optional database tier"""
+
+    def __init__(self, maxsize: int = AI_CACHE_SIZE, ttl: int = AI_CACHE_TTL, persist: bool = AI_CACHE_PERSIST):
+        self.ttl = ttl
+        self.persist = persist
+        self.memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    async def get(self, key: str) -> Optional[str]:
+        code = self.memory.get(key)
+        if code is not None:
+            self.hits += 1
+            return code
+
+        if self.persist:
+            code = await asyncio.to_thread(self._load, key)
+            if code is not None:
+                self.db_hits += 1
+                self.memory.set(key, code)
+                return code
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, code: str, model: str = ""):
+        self.memory.set(key, code)
+        if self.persist:
+            try:
+                await asyncio.to_thread(self._store, key, code, model)
+            except Exception as e:
+                print(f"❌ Failed to persist generation cache entry: {e}")
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.db_hits + self.misses
+        return {
+            "hits": self.hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.db_hits) / lookups if lookups else 0.0,
+            "size": len(self.memory),
+            "persistent": self.persist
+        }
+
+    def _load(self, key: str) -> Optional[str]:
+        db = SessionLocal()
+        try:
+            entry = db.get(GenerationCacheEntry, key)
+            if entry is None:
+                return None
+            if entry.expires_at <= datetime.utcnow():
+                db.delete(entry)
+                db.commit()
+                return None
+            return entry.code
+        finally:
+            db.close()
+
+    def _store(self, key: str, code: str, model: str):
+        db = SessionLocal()
+        try:
+            db.merge(GenerationCacheEntry(
+                key=key,
+                model=model,
+                code=code,
+                expires_at=datetime.utcnow() + timedelta(seconds=self.ttl)
+            ))
+            db.commit()
+        finally:
+            db.close()
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one upstream call.
+
+    The first caller starts the call as a task; later callers with the same
+    key await that task instead of starting their own. Each waiter awaits a
+    shield, so a waiter that disconnects does not cancel the shared call for
+    the others, and every waiter gets the result or exception itself.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Task] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Mark the exception as retrieved in case every waiter went away
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._calls),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced
+        }
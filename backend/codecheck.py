@@ -0,0 +1,106 @@
+import ast
+import os
+import re
+from typing import Dict, List, NamedTuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# This module runs in the validation process pool (services.CodeValidator) and
+# every pool worker imports it on start, so it imports nothing of the app
+
+# Generated code validation configuration
+AI_VALIDATION = os.getenv("AI_VALIDATION", "true").lower() in ("1", "true", "yes")
+AI_VALIDATION_WORKERS = int(os.getenv("AI_VALIDATION_WORKERS", "2"))  # processes; 0 checks on the event loop
+AI_VALIDATION_REPAIR = os.getenv("AI_VALIDATION_REPAIR", "true").lower() in ("1", "true", "yes")
+AI_VALIDATION_CACHE_SIZE = int(os.getenv("AI_VALIDATION_CACHE_SIZE", "1024"))
+
+_FENCED_BLOCK = re.compile(r"^[ \t]*```[^\n`]*\n(.*?)^[ \t]*```[ \t]*$", re.MULTILINE | re.DOTALL)
+
+# Calls a pygame game cannot run without, by what they are for
+REQUIRED_CALLS = {
+    "pygame.init": "pygame.init()",
+    "pygame.display.set_mode": "a display (pygame.display.set_mode())",
+    "pygame.quit": "pygame.quit()"
+}
+
+class CodeCheck(NamedTuple):
+    code: str  # with any markdown fences removed
+    problems: List[str]
+    compiles: bool
+
+    @property
+    def ok(self) -> bool:
+        return not self.problems
+
+def strip_fences(text: str) -> str:
+    """Return the program from a reply that wraps it in markdown code fences.
+
+    With several fenced blocks the longest is taken, since prose replies
+    sometimes add a short usage example. A reply cut off before its
+    closing fence loses just the opening line.
+    """
+    blocks = _FENCED_BLOCK.findall(text)
+    if blocks:
+        return max(blocks, key=len).strip("\n")
+    stripped = text.strip("\n")
+    if stripped.lstrip().startswith("```"):
+        stripped = stripped.split("\n", 1)[1] if "\n" in stripped else ""
+    return stripped
+
+def _imported_names(tree: ast.AST) -> Dict[str, str]:
+    """Local name -> dotted pygame name, for `import pygame as pg` and `from pygame import display`"""
+    names = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.name.split(".")[0] == "pygame":
+                    names[alias.asname or alias.name.split(".")[0]] = alias.name if alias.asname else "pygame"
+        elif isinstance(node, ast.ImportFrom) and node.module and node.module.split(".")[0] == "pygame":
+            for alias in node.names:
+                names[alias.asname or alias.name] = f"{node.module}.{alias.name}"
+    return names
+
+def _dotted(node: ast.AST) -> str:
+    parts = []
+    while isinstance(node, ast.Attribute):
+        parts.append(node.attr)
+        node = node.value
+    if not isinstance(node, ast.Name):
+        return ""
+    parts.append(node.id)
+    return ".".join(reversed(parts))
+
+def missing_structure(tree: ast.AST) -> List[str]:
+    """What the program lacks of the pygame game skeleton: imports, init, display, main loop, quit"""
+    names = _imported_names(tree)
+    if not names:
+        return ["pygame is not imported"]
+    calls = set()
+    has_loop = False
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call):
+            name = _dotted(node.func)
+            head, _, rest = name.partition(".")
+            if head in names:
+                calls.add(f"{names[head]}.{rest}" if rest else names[head])
+        elif isinstance(node, ast.While):
+            has_loop = True
+    problems = [f"Missing {what}" for call, what in REQUIRED_CALLS.items() if call not in calls]
+    if not has_loop:
+        problems.append("Missing a main loop (while ...)")
+    return problems
+
+def check_code(text: str) -> CodeCheck:
+    """Strip fences, then parse, compile and check the pygame structure of a generated program"""
+    code = strip_fences(text)
+    try:
+        tree = ast.parse(code)
+        # Catches what the parser lets through, such as return outside a function
+        compile(tree, "<game>", "exec")
+    except SyntaxError as e:
+        return CodeCheck(code, [f"Syntax error on line {e.lineno}: {e.msg}"], False)
+    except ValueError as e:
+        return CodeCheck(code, [str(e)], False)
+    return CodeCheck(code, missing_structure(tree), True)
@@ -0,0 +1,181 @@
+import os
+import zlib
+from typing import Optional
+
+from dotenv import load_dotenv
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+load_dotenv()
+
+# Response compression configuration
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))  # bytes; smaller bodies are sent as is
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+
+# Streams must reach the client chunk by chunk; compressors buffer
+UNCOMPRESSED_TYPES = ("text/event-stream", "application/x-ndjson")
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick br or gzip from an Accept-Encoding header, honouring q=0"""
+    offered = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        offered[name.strip()] = q
+    if brotli is not None and offered.get("br", 0) > 0:
+        return "br"
+    if offered.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    """The ETag of a representation encoded with encoding: "x" becomes "x-gzip" """
+    if not etag.endswith('"'):
+        return etag
+    return f'{etag[:-1]}-{encoding}"'
+
+def decoded_etag(tag: str) -> str:
+    """The ETag of the unencoded representation, from a tag a client sent back"""
+    for encoding in ("br", "gzip"):
+        suffix = f'-{encoding}"'
+        if tag.endswith(suffix):
+            return tag[:-len(suffix)] + '"'
+    return tag
+
+def _compressible(headers: Headers) -> bool:
+    """Whether the response would be compressed for a client that accepts it (size aside)"""
+    return "content-encoding" not in headers and not headers.get("content-type", "").startswith(UNCOMPRESSED_TYPES)
+
+def _varying(send: Send) -> Send:
+    """send, marking compressible responses as varying on Accept-Encoding"""
+    async def send_varying(message: Message):
+        if message["type"] == "http.response.start" and _compressible(Headers(raw=message["headers"])):
+            MutableHeaders(raw=message["headers"]).add_vary_header("Accept-Encoding")
+        await send(message)
+    return send_varying
+
+class _Compressor:
+    def __init__(self, encoding: str):
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=BROTLI_QUALITY)
+            self._zlib = None
+        else:
+            self._brotli = None
+            self._zlib = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # wbits 31: gzip container
+
+    def compress(self, data: bytes) -> bytes:
+        if self._brotli is not None:
+            return self._brotli.process(data)
+        return self._zlib.compress(data)
+
+    def flush(self) -> bytes:
+        if self._brotli is not None:
+            return self._brotli.finish()
+        return self._zlib.flush()
+
+class CompressionMiddleware:
+    """Brotli/gzip response compression negotiated from Accept-Encoding.
+
+    Unlike starlette's GZipMiddleware this also speaks brotli and never
+    touches event streams, which would otherwise sit in the compressor
+    until the generation finishes. A compressed response's ETag gets the
+    coding as a suffix ("g1-v2" becomes "g1-v2-gzip"), so it stays a strong
+    validator of those exact bytes; the app strips the suffix with
+    decoded_etag() when it compares tags. Every response it could have
+    compressed carries Vary: Accept-Encoding, also when it is sent as is
+    because the client takes neither br nor gzip or the body is small, so
+    shared caches keep the variants apart.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, _varying(send))
+            return
+        await _CompressingResponder(self.app, encoding, self.minimum_size)(scope, receive, send)
+
+class _CompressingResponder:
+    def __init__(self, app: ASGIApp, encoding: str, minimum_size: int):
+        self.app = app
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.if_none_match = ""
+        self.send: Send = None
+        self.start: Optional[Message] = None
+        self.compressor: Optional[_Compressor] = None
+        self.passthrough = False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        self.send = send
+        self.if_none_match = Headers(scope=scope).get("if-none-match", "")
+        await self.app(scope, receive, self.send_compressed)
+
+    async def send_compressed(self, message: Message):
+        if message["type"] == "http.response.start":
+            # Hold the headers until the first body chunk shows whether to compress
+            self.start = message
+            headers = Headers(raw=message["headers"])
+            self.passthrough = not _compressible(headers)
+            if message["status"] == 304:
+                # A 304 names the copy the client holds, which may be the encoded one
+                self.passthrough = True
+                mutable = MutableHeaders(raw=message["headers"])
+                mutable.add_vary_header("Accept-Encoding")
+                etag = headers.get("etag")
+                if etag and encoded_etag(etag, self.encoding) in self.if_none_match:
+                    mutable["ETag"] = encoded_etag(etag, self.encoding)
+            if self.passthrough:
+                await self.send(message)
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.start is not None:
+            start, self.start = self.start, None
+            headers = MutableHeaders(raw=start["headers"])
+            headers.add_vary_header("Accept-Encoding")
+            if not more_body and len(body) < self.minimum_size:
+                self.passthrough = True
+                await self.send(start)
+                await self.send(message)
+                return
+            self.compressor = _Compressor(self.encoding)
+            headers["Content-Encoding"] = self.encoding
+            if "etag" in headers:
+                headers["ETag"] = encoded_etag(headers["etag"], self.encoding)
+            if not more_body:
+                body = self.compressor.compress(body) + self.compressor.flush()
+                headers["Content-Length"] = str(len(body))
+                await self.send(start)
+                await self.send({"type": "http.response.body", "body": body})
+                return
+            del headers["Content-Length"]
+            await self.send(start)
+
+        body = self.compressor.compress(body)
+        if not more_body:
+            body += self.compressor.flush()
+        await self.send({"type": "http.response.body", "body": body, "more_body": more_body})
@@ -1,7 +1,12 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+import bisect
 import os
+import threading
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -12,15 +17,186 @@ DATABASE_URL = os.getenv(
     "sqlite:///./vibr.db"
 )
 
+# Connection pool configuration
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # seconds; managed Postgres drops idle connections
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+# Upper bounds (ms) of the checkout wait histogram buckets; the last bucket is unbounded
+POOL_WAIT_BUCKETS_MS = [1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+
+class PoolMetrics:
+    """Counters and a checkout wait-time histogram for one engine's pool.
+
+    Pool events fire on whichever thread checks a connection out, so every
+    update is made under the lock.
+    """
+
+    def __init__(self):
+        self.pool = None
+        self.connects = 0
+        self.checkouts = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self.wait_count = 0
+        self.wait_sum_ms = 0.0
+        self.wait_max_ms = 0.0
+        self.wait_buckets = [0] * (len(POOL_WAIT_BUCKETS_MS) + 1)
+        self._lock = threading.Lock()
+
+    def observe_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def observe_wait(self, seconds: float):
+        ms = seconds * 1000
+        with self._lock:
+            self.wait_count += 1
+            self.wait_sum_ms += ms
+            self.wait_max_ms = max(self.wait_max_ms, ms)
+            self.wait_buckets[bisect.bisect_left(POOL_WAIT_BUCKETS_MS, ms)] += 1
+
+    def attach(self, engine):
+        self.pool = engine.pool
+        event.listen(engine, "connect", self._on_connect)
+        event.listen(engine, "checkout", self._on_checkout)
+        event.listen(engine, "invalidate", self._on_invalidate)
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.connects += 1
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        with self._lock:
+            self.checkouts += 1
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        with self._lock:
+            self.invalidations += 1
+
+    def snapshot(self) -> dict:
+        pool = self.pool
+        queue_pool = isinstance(pool, QueuePool)
+        labels = [f"le_{bound}ms" for bound in POOL_WAIT_BUCKETS_MS] + ["inf"]
+        with self._lock:
+            counters = {
+                "connects": self.connects,
+                "checkouts": self.checkouts,
+                "invalidations": self.invalidations,
+                "timeouts": self.timeouts
+            }
+            wait_ms = {
+                "count": self.wait_count,
+                "avg": self.wait_sum_ms / self.wait_count if self.wait_count else 0.0,
+                "max": self.wait_max_ms,
+                "buckets": dict(zip(labels, self.wait_buckets))
+            }
+        return {
+            "pool": type(pool).__name__ if pool is not None else None,
+            "size": pool.size() if queue_pool else None,
+            "checked_out": pool.checkedout() if queue_pool else None,
+            "overflow": pool.overflow() if queue_pool else None,
+            "idle": pool.checkedin() if queue_pool else None,
+            **counters,
+            "wait_ms": wait_ms
+        }
+
+def _instrumented(pool_class, metrics: PoolMetrics):
+    """Pool subclass that records how long each checkout waited for a connection"""
+    class InstrumentedPool(pool_class):
+        def _do_get(self):
+            start = time.perf_counter()
+            try:
+                return super()._do_get()
+            except exc.TimeoutError:
+                metrics.observe_timeout()
+                raise
+            finally:
+                metrics.observe_wait(time.perf_counter() - start)
+
+    InstrumentedPool.__name__ = f"Instrumented{pool_class.__name__}"
+    return InstrumentedPool
+
+def _pool_options(url: str, pool_class, metrics: PoolMetrics) -> dict:
+    # In-memory SQLite keeps a single connection, so it has no queue pool to tune
+    if url.startswith("sqlite") and not is_sqlite_file(url):
+        return {}
+    return {
+        "poolclass": _instrumented(pool_class, metrics),
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING
+    }
+
+# SQLite profile for file databases: WAL lets readers run alongside the writer
+SQLITE_TUNED = os.getenv("SQLITE_TUNED", "true").lower() in ("1", "true", "yes")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL").upper()
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+def is_sqlite_file(url: str) -> bool:
+    return url.startswith("sqlite") and not (":memory:" in url or url.rstrip("/").endswith(":"))
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """Connect hook applying the SQLite concurrency profile to each new connection"""
+    cursor = dbapi_connection.cursor()
+    try:
+        # journal_mode is persistent, the rest are per connection
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+    finally:
+        cursor.close()
+
+pool_metrics = {"sync": PoolMetrics(), "async": PoolMetrics()}
+
 # Create engine
 engine = create_engine(
     DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {}
+    connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {},
+    **_pool_options(DATABASE_URL, QueuePool, pool_metrics["sync"])
 )
+pool_metrics["sync"].attach(engine)
+if SQLITE_TUNED and is_sqlite_file(DATABASE_URL):
+    event.listen(engine, "connect", apply_sqlite_pragmas)
 
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+def _async_url(url: str) -> str:
+    """Swap the sync driver for its asyncio counterpart (asyncpg, aiosqlite)"""
+    scheme, _, rest = url.partition("://")
+    dialect = scheme.split("+")[0]
+    if dialect in ("postgresql", "postgres"):
+        return f"postgresql+asyncpg://{rest}"
+    if dialect == "sqlite":
+        return f"sqlite+aiosqlite://{rest}"
+    return url
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", _async_url(DATABASE_URL))
+
+# Async engine used by the request handlers so queries don't block the event loop
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    **_pool_options(ASYNC_DATABASE_URL, AsyncAdaptedQueuePool, pool_metrics["async"])
+)
+pool_metrics["async"].attach(async_engine.sync_engine)
+if SQLITE_TUNED and is_sqlite_file(ASYNC_DATABASE_URL):
+    event.listen(async_engine.sync_engine, "connect", apply_sqlite_pragmas)
+
+# expire_on_commit=False keeps returned objects readable after commit without lazy IO
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
 # Create Base class
 Base = declarative_base()
 
@@ -31,3 +207,11 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# Dependency to get an async database session
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def pool_status() -> dict:
+    return {name: metrics.snapshot() for name, metrics in pool_metrics.items()}
@@ -0,0 +1,246 @@
+import asyncio
+import os
+import random
+import socket
+import uuid
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from database import AsyncSessionLocal
+from models import GenerationJob
+from scheduler import PRIORITY_BATCH, run_as
+from usage import start_meter
+
+load_dotenv()
+
+# Background generation jobs configuration
+AI_JOB_WORKERS = int(os.getenv("AI_JOB_WORKERS", "4"))  # jobs run at once per process; 0 only enqueues
+AI_JOB_MAX_ATTEMPTS = int(os.getenv("AI_JOB_MAX_ATTEMPTS", "3"))
+AI_JOB_RETRY_DELAY = float(os.getenv("AI_JOB_RETRY_DELAY", "5"))  # seconds before the first retry, doubled each time
+AI_JOB_RETRY_MAX_DELAY = float(os.getenv("AI_JOB_RETRY_MAX_DELAY", "300"))
+AI_JOB_POLL_INTERVAL = float(os.getenv("AI_JOB_POLL_INTERVAL", "2"))  # seconds between queue checks when idle
+AI_JOB_LEASE = float(os.getenv("AI_JOB_LEASE", "60"))  # seconds without a heartbeat before a running job is requeued
+AI_JOB_RETENTION = float(os.getenv("AI_JOB_RETENTION", str(7 * 86400)))  # seconds finished jobs are kept
+
+class JobError(Exception):
+    """A job failure that retrying cannot fix, such as its game having been deleted"""
+
+class LeaseLost(Exception):
+    """Raised when a worker reports on a job it no longer holds the lease for"""
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff with jitter, so jobs failed by one outage do not retry in lockstep"""
+    delay = min(AI_JOB_RETRY_MAX_DELAY, AI_JOB_RETRY_DELAY * 2 ** max(attempts - 1, 0))
+    return delay * random.uniform(0.5, 1.0)
+
+class JobWorkerPool:
+    """Runs queued generation jobs, up to concurrency at a time.
+
+    One dispatcher claims due jobs from the database and starts a task per
+    job; the queue lives in the database, so jobs survive restarts and any
+    number of processes can run a pool against it. A running job renews its
+    lease with heartbeats. If its process dies, the lease runs out and the
+    job is requeued, or failed once it has used up its attempts. Provider
+    failures are retried with backoff.
+    """
+
+    def __init__(
+        self,
+        job_service,
+        game_service,
+        ai_service,
+        session_factory: async_sessionmaker = AsyncSessionLocal,
+        concurrency: int = AI_JOB_WORKERS,
+        poll_interval: float = AI_JOB_POLL_INTERVAL,
+        lease: float = AI_JOB_LEASE,
+        limiter=None
+    ):
+        self.job_service = job_service
+        self.game_service = game_service
+        self.ai_service = ai_service
+        self.session_factory = session_factory
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.lease = lease
+        # Charged with the tokens each job uses, against its owner's daily budget
+        self.limiter = limiter
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.claimed = 0
+        self.succeeded = 0
+        self.retried = 0
+        self.failed = 0
+        self.requeued = 0
+        self._running: Dict[int, asyncio.Task] = {}
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._wake = asyncio.Event()
+        # job id -> [event set on its next change, number of waiters]
+        self._watchers: Dict[int, List] = {}
+
+    async def start(self):
+        if self.concurrency <= 0 or self._dispatcher is not None:
+            return
+        self._wake = asyncio.Event()
+        self._dispatcher = asyncio.get_running_loop().create_task(self._dispatch())
+        print(f"✅ Generation job workers started ({self.concurrency} at a time)")
+
+    async def stop(self):
+        """Stop claiming and hand running jobs back to the queue"""
+        dispatcher, self._dispatcher = self._dispatcher, None
+        if dispatcher is None:
+            return
+        dispatcher.cancel()
+        tasks = list(self._running.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(dispatcher, *tasks, return_exceptions=True)
+
+    def notify(self):
+        """Wake the dispatcher, e.g. because a job was enqueued"""
+        self._wake.set()
+
+    async def wait_for_change(self, job_id: int, timeout: float):
+        """Wait until this process changes the job, or timeout seconds.
+
+        Changes made by other processes are only seen by polling, so callers
+        re-read the job either way.
+        """
+        watcher = self._watchers.get(job_id)
+        if watcher is None:
+            watcher = self._watchers[job_id] = [asyncio.Event(), 0]
+        watcher[1] += 1
+        try:
+            await asyncio.wait_for(watcher[0].wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            watcher[1] -= 1
+            if watcher[1] == 0 and self._watchers.get(job_id) is watcher:
+                del self._watchers[job_id]
+
+    def _changed(self, job_id: int):
+        watcher = self._watchers.pop(job_id, None)
+        if watcher is not None:
+            watcher[0].set()
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        next_maintenance = 0.0
+        while True:
+            # Cleared before claiming, so an enqueue during the claim is not missed
+            self._wake.clear()
+            try:
+                if loop.time() >= next_maintenance:
+                    await self._maintain()
+                    next_maintenance = loop.time() + self.lease / 2
+                while len(self._running) < self.concurrency:
+                    async with self.session_factory() as db:
+                        job = await self.job_service.claim(db, self.worker_id)
+                    if job is None:
+                        break
+                    self.claimed += 1
+                    self._running[job.id] = loop.create_task(self._run(job))
+                    self._changed(job.id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ Generation job dispatcher error: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _maintain(self):
+        async with self.session_factory() as db:
+            requeued, failed = await self.job_service.requeue_stale(db, self.lease)
+            await self.job_service.purge(db, AI_JOB_RETENTION)
+        if requeued or failed:
+            self.requeued += requeued
+            self.failed += failed
+            print(f"⚠️ Requeued {requeued} and failed {failed} generation jobs whose worker stopped responding")
+
+    async def _heartbeat(self, job: GenerationJob):
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            try:
+                async with self.session_factory() as db:
+                    if not await self.job_service.heartbeat(db, job.id, self.worker_id):
+                        print(f"⚠️ Lost the lease on generation job {job.id}")
+                        return
+            except Exception as e:
+                print(f"⚠️ Generation job {job.id} heartbeat failed: {e}")
+
+    async def _run(self, job: GenerationJob):
+        heartbeat = asyncio.get_running_loop().create_task(self._heartbeat(job))
+        meter = start_meter(job.owner_id)
+        # Nobody is waiting on the request: let interactive calls go first
+        run_as(PRIORITY_BATCH)
+        try:
+            await self._execute(job)
+            self.succeeded += 1
+        except asyncio.CancelledError:
+            # Shutting down: the attempt did not fail, so give it back uncounted
+            await asyncio.shield(self._report(self.job_service.release, job))
+            raise
+        except LeaseLost:
+            print(f"⚠️ Generation job {job.id} was requeued while running; result dropped")
+        except JobError as e:
+            self.failed += 1
+            await self._report(self.job_service.fail, job, str(e))
+        except Exception as e:
+            if job.attempts >= job.max_attempts:
+                self.failed += 1
+                print(f"❌ Generation job {job.id} failed after {job.attempts} attempts: {e}")
+                await self._report(self.job_service.fail, job, str(e))
+            else:
+                self.retried += 1
+                delay = retry_delay(job.attempts)
+                print(f"⚠️ Generation job {job.id} attempt {job.attempts} failed, retrying in {delay:.0f}s: {e}")
+                await self._report(self.job_service.retry, job, str(e), delay)
+        finally:
+            heartbeat.cancel()
+            if self.limiter is not None:
+                await asyncio.shield(self.limiter.charge(meter))
+            self._running.pop(job.id, None)
+            self._changed(job.id)
+            # A slot is free
+            self.notify()
+
+    async def _report(self, method, job: GenerationJob, *args):
+        # If this fails too, the lease runs out and maintenance requeues the job
+        try:
+            async with self.session_factory() as db:
+                await method(db, job, self.worker_id, *args)
+        except Exception as e:
+            print(f"❌ Could not record the outcome of generation job {job.id}: {e}")
+
+    async def _execute(self, job: GenerationJob):
+        params = job.params or {}
+        if job.kind == "generate":
+            code = await self.ai_service.generate_game_code(
+                job.prompt, use_cache=params.get("use_cache", True), fallback=False
+            )
+        else:
+            async with self.session_factory() as db:
+                game = await self.game_service.get_game(db, job.game_id, job.owner_id)
+                existing_code = game.code if game else None
+            if existing_code is None:
+                raise JobError("Game not found")
+            code = await self.ai_service.update_game_code(
+                existing_code, job.prompt, mode=params.get("mode", "patch"), fallback=False
+            )
+        async with self.session_factory() as db:
+            await self.job_service.complete(db, job, self.worker_id, code)
+
+    def stats(self) -> dict:
+        return {
+            "worker": self.worker_id,
+            "concurrency": self.concurrency,
+            "running": len(self._running),
+            "claimed": self.claimed,
+            "succeeded": self.succeeded,
+            "retried": self.retried,
+            "failed": self.failed,
+            "requeued": self.requeued
+        }
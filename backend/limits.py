@@ -0,0 +1,239 @@
+import importlib.util
+import math
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import NamedTuple, Optional, Tuple
+
+from dotenv import load_dotenv
+from fastapi import HTTPException, Request, status
+
+from cache import TTLCache
+from usage import UsageMeter
+
+load_dotenv()
+
+# AI rate limits: sustained requests per minute and burst size per user and per IP (0 disables)
+AI_USER_RATE_PER_MINUTE = float(os.getenv("AI_USER_RATE_PER_MINUTE", "10"))
+AI_USER_RATE_BURST = int(os.getenv("AI_USER_RATE_BURST", "5"))
+AI_IP_RATE_PER_MINUTE = float(os.getenv("AI_IP_RATE_PER_MINUTE", "30"))
+AI_IP_RATE_BURST = int(os.getenv("AI_IP_RATE_BURST", "10"))
+# Provider tokens (input + output) per user per UTC day; 0 disables
+AI_DAILY_TOKEN_BUDGET = int(os.getenv("AI_DAILY_TOKEN_BUDGET", "500000"))
+# Shared state for multi-worker deployments, e.g. redis://localhost:6379/0
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "")
+# Take the client IP from X-Forwarded-For; only behind a proxy that sets it
+RATE_LIMIT_TRUST_PROXY = os.getenv("RATE_LIMIT_TRUST_PROXY", "false").lower() in ("1", "true", "yes")
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+
+USAGE_TTL = 2 * 86400  # seconds a day's usage counter is kept
+
+class MemoryLimitBackend:
+    """Token buckets and usage counters held by this worker"""
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.buckets = TTLCache(maxsize=max_keys, ttl=3600)
+        self.usage = TTLCache(maxsize=max_keys, ttl=USAGE_TTL)
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        """Take one token; return 0 if there was one, else seconds until there is"""
+        now = time.monotonic()
+        tokens, last = self.buckets.get(key, (burst, now))
+        tokens = min(burst, tokens + (now - last) * rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / rate
+        # An expired bucket would have refilled anyway, so it is safe to forget
+        self.buckets.set(key, (tokens, now), ttl=burst / rate)
+        return wait
+
+    async def add_usage(self, key: str, input_tokens: int, output_tokens: int):
+        used_input, used_output = self.usage.get(key, (0, 0))
+        self.usage.set(key, (used_input + input_tokens, used_output + output_tokens))
+
+    async def get_usage(self, key: str) -> Tuple[int, int]:
+        return self.usage.get(key, (0, 0))
+
+# Same bucket as MemoryLimitBackend.take, atomic in Redis and on the Redis clock
+_TAKE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or burst
+local last = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + (now - last) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate))
+return tostring(wait)
+"""
+
+class RedisLimitBackend:
+    """Token buckets and usage counters in Redis, shared by every worker"""
+
+    def __init__(self, url: str):
+        # Imported here so that deployments without Redis never load the client
+        import redis.asyncio as redis_asyncio
+
+        self.client = redis_asyncio.from_url(url)
+        self._take = self.client.register_script(_TAKE_SCRIPT)
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        return float(await self._take(keys=[key], args=[rate, burst]))
+
+    async def add_usage(self, key: str, input_tokens: int, output_tokens: int):
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.hincrby(key, "input", input_tokens)
+            pipe.hincrby(key, "output", output_tokens)
+            pipe.expire(key, USAGE_TTL)
+            await pipe.execute()
+
+    async def get_usage(self, key: str) -> Tuple[int, int]:
+        used_input, used_output = await self.client.hmget(key, "input", "output")
+        return int(used_input or 0), int(used_output or 0)
+
+def client_ip(request: Request) -> str:
+    if RATE_LIMIT_TRUST_PROXY:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+def _seconds_until_tomorrow(now: datetime) -> int:
+    tomorrow = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return math.ceil((tomorrow - now).total_seconds())
+
+# Refusal.reason values
+RATE_LIMITED = "rate_limited"
+BUDGET_EXHAUSTED = "budget_exhausted"
+
+class Refusal(NamedTuple):
+    reason: str  # RATE_LIMITED or BUDGET_EXHAUSTED
+    detail: str
+    wait: float  # seconds until the request would be let through
+
+    @property
+    def retry_after(self) -> int:
+        """wait as a Retry-After value: whole seconds, at least 1"""
+        return max(1, math.ceil(self.wait))
+
+def _too_many_requests(refusal: Refusal) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=refusal.detail,
+        headers={"Retry-After": str(refusal.retry_after)}
+    )
+
+class AIRateLimiter:
+    """Token-bucket rate limits and daily token budgets for the AI endpoints.
+
+    check() runs before a request that calls a provider and raises a 429
+    with Retry-After when the user or their IP is over its rate, or the user
+    has spent their daily budget (admit() is the same without raising, for
+    batches that check each item); charge() adds the tokens the request used
+    afterwards, so the request that crosses the budget still completes. If
+    the backend fails (Redis down), requests are let through rather than
+    turning a Redis outage into an API outage.
+    """
+
+    def __init__(
+        self,
+        backend=None,
+        user_rate: float = AI_USER_RATE_PER_MINUTE,
+        user_burst: int = AI_USER_RATE_BURST,
+        ip_rate: float = AI_IP_RATE_PER_MINUTE,
+        ip_burst: int = AI_IP_RATE_BURST,
+        daily_budget: int = AI_DAILY_TOKEN_BUDGET
+    ):
+        self.backend = backend or MemoryLimitBackend()
+        self.user_rate = user_rate / 60
+        self.user_burst = user_burst
+        self.ip_rate = ip_rate / 60
+        self.ip_burst = ip_burst
+        self.daily_budget = daily_budget
+        self.rate_limited = 0
+        self.over_budget = 0
+        self.backend_errors = 0
+
+    async def admit(self, ip: str, user_id: int, pending_tokens: int = 0) -> Optional[Refusal]:
+        """Take a request token for the IP and the user and check the budget.
+
+        Returns None if the request may go ahead, else why not. pending_tokens
+        are tokens already used but not charged yet, such as earlier items of
+        the batch being served.
+        """
+        try:
+            if self.ip_rate > 0:
+                wait = await self.backend.take(f"rl:ip:{ip}", self.ip_rate, self.ip_burst)
+                if wait > 0:
+                    self.rate_limited += 1
+                    return Refusal(RATE_LIMITED, "Too many AI requests from this address", wait)
+            if self.user_rate > 0:
+                wait = await self.backend.take(f"rl:user:{user_id}", self.user_rate, self.user_burst)
+                if wait > 0:
+                    self.rate_limited += 1
+                    return Refusal(RATE_LIMITED, "Too many AI requests", wait)
+            if self.daily_budget > 0:
+                now = datetime.now(timezone.utc)
+                used = sum(await self.backend.get_usage(_usage_key(user_id, now))) + pending_tokens
+                if used >= self.daily_budget:
+                    self.over_budget += 1
+                    return Refusal(BUDGET_EXHAUSTED, "Daily AI token budget used up", _seconds_until_tomorrow(now))
+        except Exception as e:
+            self.backend_errors += 1
+            print(f"⚠️ Rate limit backend failed, allowing request: {e}")
+        return None
+
+    async def check(self, request: Request, user_id: int):
+        """Raise a 429 with Retry-After unless admit() lets the request through"""
+        refusal = await self.admit(client_ip(request), user_id)
+        if refusal is not None:
+            raise _too_many_requests(refusal)
+
+    async def charge(self, meter: UsageMeter):
+        if meter.total == 0:
+            return
+        try:
+            await self.backend.add_usage(
+                _usage_key(meter.user_id, datetime.now(timezone.utc)), meter.input_tokens, meter.output_tokens
+            )
+        except Exception as e:
+            self.backend_errors += 1
+            print(f"⚠️ Could not record {meter.total} AI tokens for user {meter.user_id}: {e}")
+
+    async def usage(self, user_id: int) -> dict:
+        """Today's token usage and what is left of the budget"""
+        now = datetime.now(timezone.utc)
+        input_tokens, output_tokens = await self.backend.get_usage(_usage_key(user_id, now))
+        used = input_tokens + output_tokens
+        return {
+            "date": now.date().isoformat(),
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": used,
+            "daily_budget": self.daily_budget or None,
+            "remaining": max(0, self.daily_budget - used) if self.daily_budget else None,
+            "resets_in": _seconds_until_tomorrow(now)
+        }
+
+def _usage_key(user_id: int, now: datetime) -> str:
+    return f"usage:{user_id}:{now.date().isoformat()}"
+
+def build_rate_limiter() -> AIRateLimiter:
+    """An AIRateLimiter on Redis when RATE_LIMIT_REDIS_URL is set, else in memory"""
+    if RATE_LIMIT_REDIS_URL:
+        # redis is optional; without it limits are kept per worker
+        if importlib.util.find_spec("redis") is None:
+            print("❌ RATE_LIMIT_REDIS_URL is set but the redis package is not installed; limits are per worker")
+        else:
+            return AIRateLimiter(RedisLimitBackend(RATE_LIMIT_REDIS_URL))
+    return AIRateLimiter()
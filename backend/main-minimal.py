@@ -1,5 +1,7 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from functools import lru_cache
+from typing import Dict, List, Tuple
 import os
 import random
 
@@ -27,24 +29,99 @@ async def health_check():
 async def root():
     return {"message": "Welcome to Vibr API", "docs": "/docs"}
 
+# Keyword weights per game type. A prompt scores the weights of the
+# keywords it contains per type; the highest score wins, ties go to the type
+# listed first, and prompts that match nothing get DEFAULT_GAME_TYPE.
+GAME_KEYWORDS: Dict[str, Dict[str, float]] = {
+    "space_shooter": {
+        "space": 1.0, "shooter": 2.0, "shoot": 1.5, "shooting": 1.5, "alien": 2.0, "spaceship": 3.0,
+        "asteroid": 3.0, "galaxy": 1.5, "laser": 1.0, "invader": 2.5, "ufo": 2.5
+    },
+    "platformer": {
+        "platform": 2.0, "platformer": 3.0, "jump": 1.5, "jumping": 1.5, "mario": 3.0, "runner": 2.0,
+        "ledge": 1.5, "scroller": 3.0, "sidescroller": 3.0
+    },
+    "puzzle": {
+        "puzzle": 3.0, "match": 1.5, "connect": 1.0, "block": 1.0, "tile": 1.5, "tetris": 3.0,
+        "jewel": 2.0, "gem": 1.5, "grid": 1.0, "sudoku": 3.0
+    },
+    "racing": {
+        "racing": 3.0, "race": 2.5, "racer": 2.5, "car": 2.0, "drive": 2.0, "driving": 2.0, "speed": 1.0,
+        "track": 1.5, "lap": 2.0, "highway": 2.0, "kart": 3.0
+    },
+    "adventure": {
+        "adventure": 3.0, "quest": 2.5, "dungeon": 2.5, "explore": 2.0, "treasure": 2.0, "rpg": 3.0,
+        "zelda": 3.0, "maze": 1.5, "sword": 1.5, "monster": 1.0
+    },
+}
+DEFAULT_GAME_TYPE = "adventure"
+
+# Words are runs of letters and digits, so "mario-style" is "mario" + "style".
+# The prompt is tokenized as UTF-8 bytes: one 256-byte table lowercases ASCII
+# and turns every other ASCII byte into a space, and bytes.translate + split
+# run in C with none of the per-character work of str.translate. Non-ASCII
+# bytes stay inside words; no keyword contains them.
+WORD_BREAKS = bytes(
+    c + 32 if 65 <= c <= 90 else c if c >= 128 or chr(c).isalnum() else 32
+    for c in range(256)
+)
+
+class KeywordClassifier:
+    """Weighted keyword scoring in one pass over the prompt.
+
+    Every keyword and its plural is compiled once into a lookup table keyed
+    by the encoded word, so a prompt costs one tokenizing pass plus a hash
+    lookup per word, however many game types and keywords there are.
+    """
+
+    def __init__(self, keywords: Dict[str, Dict[str, float]], default: str):
+        self.default = default
+        self.order = {game_type: i for i, game_type in enumerate(keywords)}
+        self.forms: Dict[bytes, List[Tuple[str, float]]] = {}
+        for game_type, words in keywords.items():
+            for word, weight in words.items():
+                plural = word + ("es" if word.endswith(("s", "x", "z", "ch", "sh")) else "s")
+                for form in (word, plural):
+                    self.forms.setdefault(form.lower().encode(), []).append((game_type, weight))
+        self.words = frozenset(self.forms)
+
+    def scores(self, prompt: str) -> Dict[str, float]:
+        scores: Dict[str, float] = {}
+        # Repeating a keyword does not stack its weight. intersection() looks
+        # each token up in the keyword set without building a set of the
+        # prompt; split(b" ") is cheaper than split() because the empty words
+        # between adjacent breaks are all the one shared b"" object
+        tokens = prompt.encode("utf-8", "replace").translate(WORD_BREAKS).split(b" ")
+        for word in self.words.intersection(tokens):
+            for game_type, weight in self.forms[word]:
+                scores[game_type] = scores.get(game_type, 0.0) + weight
+        return scores
+
+    def classify(self, prompt: str) -> str:
+        best, best_score = None, 0.0
+        # A plain loop: max() with a tuple key costs more than the scoring
+        for game_type, score in self.scores(prompt).items():
+            if best is None or score > best_score or (
+                score == best_score and self.order[game_type] < self.order[best]
+            ):
+                best, best_score = game_type, score
+        return self.default if best is None else best
+
+game_classifier = KeywordClassifier(GAME_KEYWORDS, DEFAULT_GAME_TYPE)
+
+def classify_game_type(prompt: str) -> str:
+    """Pick the game type whose keywords score highest in the prompt"""
+    return game_classifier.classify(prompt)
+
 def generate_game_code(prompt: str) -> str:
     """Generate game code based on the prompt"""
-    prompt_lower = prompt.lower()
-    
-    # Determine game type based on keywords
-    if any(word in prompt_lower for word in ['space', 'shooter', 'alien', 'spaceship', 'asteroid']):
-        return generate_space_shooter(prompt)
-    elif any(word in prompt_lower for word in ['platform', 'jump', 'mario', 'runner']):
-        return generate_platformer(prompt)
-    elif any(word in prompt_lower for word in ['puzzle', 'match', 'connect', 'block']):
-        return generate_puzzle_game(prompt)
-    elif any(word in prompt_lower for word in ['racing', 'car', 'drive', 'speed']):
-        return generate_racing_game(prompt)
-    else:
-        return generate_adventure_game(prompt)
+    return render_game(classify_game_type(prompt), _caption(prompt))
 
-def generate_space_shooter(prompt: str) -> str:
-    return f'''import pygame
+# Game templates. Plain strings, not f-strings: the only request-specific
+# part is the window caption, which is spliced in at CAPTION_PLACEHOLDER
+CAPTION_PLACEHOLDER = "{caption}"
+
+SPACE_SHOOTER_TEMPLATE = '''import pygame
 import random
 import math
 
@@ -55,7 +132,7 @@ pygame.init()
 WIDTH = 800
 HEIGHT = 600
 screen = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("Space Shooter - {prompt[:50] if prompt else 'Custom Game'}")
+pygame.display.set_caption("Space Shooter - {caption}")
 
 # Colors
 WHITE = (255, 255, 255)
@@ -228,8 +305,7 @@ pygame.display.flip()
 pygame.time.wait(3000)
 pygame.quit()'''
 
-def generate_platformer(prompt: str) -> str:
-    return f'''import pygame
+PLATFORMER_TEMPLATE = '''import pygame
 import random
 
 # Initialize Pygame
@@ -239,7 +315,7 @@ pygame.init()
 WIDTH = 800
 HEIGHT = 600
 screen = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("Platformer - {prompt[:50] if prompt else 'Custom Game'}")
+pygame.display.set_caption("Platformer - {caption}")
 
 # Colors
 WHITE = (255, 255, 255)
@@ -400,8 +476,7 @@ while running:
 
 pygame.quit()'''
 
-def generate_puzzle_game(prompt: str) -> str:
-    return f'''import pygame
+PUZZLE_GAME_TEMPLATE = '''import pygame
 import random
 
 # Initialize Pygame
@@ -411,7 +486,7 @@ pygame.init()
 WIDTH = 600
 HEIGHT = 700
 screen = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("Puzzle Game - {prompt[:50] if prompt else 'Custom Game'}")
+pygame.display.set_caption("Puzzle Game - {caption}")
 
 # Colors
 WHITE = (255, 255, 255)
@@ -537,8 +612,7 @@ while running:
 
 pygame.quit()'''
 
-def generate_racing_game(prompt: str) -> str:
-    return f'''import pygame
+RACING_GAME_TEMPLATE = '''import pygame
 import random
 
 # Initialize Pygame
@@ -548,7 +622,7 @@ pygame.init()
 WIDTH = 800
 HEIGHT = 600
 screen = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("Racing Game - {prompt[:50] if prompt else 'Custom Game'}")
+pygame.display.set_caption("Racing Game - {caption}")
 
 # Colors
 WHITE = (255, 255, 255)
@@ -685,8 +759,7 @@ pygame.display.flip()
 pygame.time.wait(3000)
 pygame.quit()'''
 
-def generate_adventure_game(prompt: str) -> str:
-    return f'''import pygame
+ADVENTURE_GAME_TEMPLATE = '''import pygame
 import random
 
 # Initialize Pygame
@@ -696,7 +769,7 @@ pygame.init()
 WIDTH = 800
 HEIGHT = 600
 screen = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("Adventure Game - {prompt[:50] if prompt else 'Custom Game'}")
+pygame.display.set_caption("Adventure Game - {caption}")
 
 # Colors
 WHITE = (255, 255, 255)
@@ -847,6 +920,50 @@ pygame.display.flip()
 pygame.time.wait(3000)
 pygame.quit()'''
 
+def _compile_template(template: str) -> Tuple[str, str]:
+    """Split a template around its caption once, at import"""
+    head, placeholder, tail = template.partition(CAPTION_PLACEHOLDER)
+    if not placeholder or CAPTION_PLACEHOLDER in tail:
+        raise ValueError("Game templates need exactly one caption placeholder")
+    return head, tail
+
+GAME_TEMPLATES: Dict[str, Tuple[str, str]] = {
+    "space_shooter": _compile_template(SPACE_SHOOTER_TEMPLATE),
+    "platformer": _compile_template(PLATFORMER_TEMPLATE),
+    "puzzle": _compile_template(PUZZLE_GAME_TEMPLATE),
+    "racing": _compile_template(RACING_GAME_TEMPLATE),
+    "adventure": _compile_template(ADVENTURE_GAME_TEMPLATE),
+}
+
+# Rendered programs kept per (game type, caption)
+RENDER_CACHE_SIZE = int(os.getenv("RENDER_CACHE_SIZE", "1024"))
+
+def _caption(prompt: str) -> str:
+    caption = prompt[:50] if prompt else "Custom Game"
+    # The caption lands inside a double-quoted string in the generated program
+    return caption.replace("\\", "\\\\").replace('"', '\\"').replace("\r", " ").replace("\n", " ")
+
+@lru_cache(maxsize=RENDER_CACHE_SIZE)
+def render_game(game_type: str, caption: str) -> str:
+    """Splice a caption into a precompiled template"""
+    head, tail = GAME_TEMPLATES[game_type]
+    return head + caption + tail
+
+def generate_space_shooter(prompt: str) -> str:
+    return render_game("space_shooter", _caption(prompt))
+
+def generate_platformer(prompt: str) -> str:
+    return render_game("platformer", _caption(prompt))
+
+def generate_puzzle_game(prompt: str) -> str:
+    return render_game("puzzle", _caption(prompt))
+
+def generate_racing_game(prompt: str) -> str:
+    return render_game("racing", _caption(prompt))
+
+def generate_adventure_game(prompt: str) -> str:
+    return render_game("adventure", _caption(prompt))
+
 @app.post("/api/generate-game")
 async def generate_game(request: dict):
     """Generate game code from prompt"""
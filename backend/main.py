@@ -1,28 +1,48 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Header, Query, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 import uvicorn
-from typing import List, Optional
+from typing import AsyncIterator, List, Literal, Optional
+import asyncio
+import hashlib
+import json
 import os
+import orjson
 from dotenv import load_dotenv
 
-from database import get_db, engine
+from database import get_async_db, engine, AsyncSessionLocal, pool_status
 import models
 import schemas
 import services
 import auth
+from codecheck import AI_VALIDATION
+from compression import CompressionMiddleware, decoded_etag
+from jobs import AI_JOB_POLL_INTERVAL, JobWorkerPool
+from limits import build_rate_limiter, client_ip
+from scheduler import PRIORITY_BATCH, run_as
+from usage import current_meter, start_meter
+from write_queue import build_write_queue
 
 # Load environment variables
 load_dotenv()
 
-# Create database tables
-models.Base.metadata.create_all(bind=engine)
+# Create missing tables at startup; turn off once the schema is managed with `alembic upgrade head`
+DB_CREATE_TABLES = os.getenv("DB_CREATE_TABLES", "true").lower() in ("1", "true", "yes")
+
+# Batch generation (/ai/generate-games)
+AI_BATCH_MAX_ITEMS = int(os.getenv("AI_BATCH_MAX_ITEMS", "500"))
+AI_BATCH_CONCURRENCY = int(os.getenv("AI_BATCH_CONCURRENCY", "8"))  # generations in flight per batch request
+AI_BATCH_INSERT_CHUNK = int(os.getenv("AI_BATCH_INSERT_CHUNK", "25"))  # games saved per transaction
+AI_BATCH_FLUSH_INTERVAL = float(os.getenv("AI_BATCH_FLUSH_INTERVAL", "2"))  # seconds a finished game waits for its chunk to fill
 
 app = FastAPI(
     title="Vibr API",
     description="AI-powered game creation platform",
-    version="1.0.0"
+    version="1.0.0",
+    # orjson encodes the multi-kilobyte code strings several times faster than json
+    default_response_class=ORJSONResponse
 )
 
 # Get allowed origins from environment or use defaults
@@ -35,100 +55,296 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
+# br/gzip for JSON bodies over COMPRESSION_MIN_SIZE; SSE streams are left alone
+app.add_middleware(CompressionMiddleware)
+
 # Security
 security = HTTPBearer()
 
 # Services
-game_service = services.GameService()
-user_service = services.UserService()
+# On SQLite, game writes go through one batching writer instead of racing for the database lock
+write_queue = build_write_queue()
+game_service = services.AsyncGameService(writer=write_queue)
+user_service = services.AsyncUserService()
 ai_service = services.AIService()
+job_service = services.AsyncJobService(writer=write_queue)
+# Per-user and per-IP request rates and daily token budgets on the provider-calling /ai endpoints
+rate_limiter = build_rate_limiter()
+job_workers = JobWorkerPool(job_service, game_service, ai_service, limiter=rate_limiter)
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint for cloud deployment"""
     return {"status": "healthy", "message": "Vibr API is running", "version": "1.0.0"}
 
+@app.on_event("startup")
+async def create_tables():
+    # A startup step rather than an import side effect, so importing main
+    # (scripts, benchmarks, tests) never touches the database
+    if DB_CREATE_TABLES:
+        await asyncio.to_thread(models.Base.metadata.create_all, bind=engine)
+
+@app.on_event("startup")
+async def start_code_validator():
+    # Without providers there is no generated code to check
+    if AI_VALIDATION and not ai_service.use_fallback:
+        ai_service.validator.warm()
+
+@app.on_event("startup")
+async def start_job_workers():
+    await job_workers.start()
+
+@app.on_event("shutdown")
+async def stop_job_workers():
+    # Before the write queue closes: interrupted jobs are handed back through it
+    await job_workers.stop()
+
+@app.on_event("shutdown")
+async def stop_code_validator():
+    ai_service.validator.close()
+
+@app.on_event("shutdown")
+async def stop_write_queue():
+    if write_queue is not None:
+        await write_queue.close()
+
+@app.get("/metrics/db-pool")
+async def db_pool_metrics(current_user = Depends(auth.get_current_user)):
+    """Connection pool usage and checkout wait times for sizing the pool"""
+    return {
+        **pool_status(),
+        "write_queue": write_queue.stats() if write_queue is not None else None
+    }
+
+@app.get("/metrics/jobs")
+async def job_metrics(db: AsyncSession = Depends(get_async_db), current_user = Depends(auth.get_current_user)):
+    """Generation jobs per status, and what this process's workers have done"""
+    return {"queue": await job_service.counts(db), "workers": job_workers.stats()}
+
+@app.get("/metrics/ai-scheduler")
+async def ai_scheduler_metrics(current_user = Depends(auth.get_current_user)):
+    """Provider call slots in use, and queue depth and wait times per priority class"""
+    return ai_service.scheduler.stats()
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to Vibr API", "docs": "/docs"}
 
 # User endpoints
 @app.post("/auth/register", response_model=schemas.UserResponse)
-async def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    return user_service.create_user(db, user)
+async def register(user: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)):
+    return await user_service.create_user(db, user)
 
 @app.post("/auth/login")
-async def login(email: str, password: str, db: Session = Depends(get_db)):
-    user = user_service.authenticate_user(db, email, password)
+async def login(email: str, password: str, db: AsyncSession = Depends(get_async_db)):
+    user = await user_service.authenticate_user(db, email, password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password"
         )
-    access_token = auth.create_access_token(data={"sub": user.email})
+    access_token = auth.create_access_token(data={"sub": user.email, "uid": user.id})
     return {"access_token": access_token, "token_type": "bearer"}
 
+# Clients must revalidate, but may keep the body and send If-None-Match
+GAME_CACHE_CONTROL = "private, no-cache"
+
+def _game_etag(game_id: int, version: int) -> str:
+    # Every update bumps the version, so id + version identifies the representation
+    return f'"g{game_id}-v{version}"'
+
+def _list_etag(user_id: int, count: int, updated_at, limit: int, cursor: Optional[str]) -> str:
+    raw = f"{user_id}|{count}|{updated_at.isoformat() if updated_at else ''}|{limit}|{cursor or ''}"
+    return f'"l{hashlib.sha256(raw.encode()).hexdigest()[:24]}"'
+
+def _etags(header: str) -> List[str]:
+    # If-None-Match uses weak comparison, so W/"x" and the compressed "x-gzip" match "x"
+    return [decoded_etag(tag.strip().removeprefix("W/")) for tag in header.split(",") if tag.strip()]
+
+def _none_match(if_none_match: Optional[str], etag: str) -> bool:
+    """True when the client's copy is current and a 304 can be sent"""
+    if not if_none_match:
+        return False
+    tags = _etags(if_none_match)
+    return "*" in tags or etag in tags
+
+def _if_match_versions(if_match: str, game_id: int) -> Optional[List[int]]:
+    """Versions of this game named by If-Match; None for *"""
+    # The same version sent gzip- or br-encoded is still that version
+    tags = [decoded_etag(tag.strip()) for tag in if_match.split(",")]
+    if "*" in tags:
+        return None
+    prefix = f'"g{game_id}-v'
+    return [int(tag[len(prefix):-1]) for tag in tags if tag.startswith(prefix) and tag[len(prefix):-1].isdigit()]
+
+def _not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": GAME_CACHE_CONTROL})
+
+def _set_game_headers(response: Response, game) -> None:
+    response.headers["ETag"] = _game_etag(game.id, game.version)
+    response.headers["Cache-Control"] = GAME_CACHE_CONTROL
+
 # Game endpoints
 @app.post("/games", response_model=schemas.GameResponse)
 async def create_game(
     game: schemas.GameCreate,
-    db: Session = Depends(get_db),
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
     current_user = Depends(auth.get_current_user)
 ):
-    return game_service.create_game(db, game, current_user.id)
+    created_game = await game_service.create_game(db, game, current_user.id)
+    _set_game_headers(response, created_game)
+    return created_game
 
-@app.get("/games", response_model=List[schemas.GameResponse])
+@app.get("/games", response_model=schemas.GamePage)
 async def get_games(
-    db: Session = Depends(get_db),
+    response: Response,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db),
     current_user = Depends(auth.get_current_user)
 ):
-    return game_service.get_user_games(db, current_user.id)
+    count, updated_at = await game_service.list_fingerprint(db, current_user.id)
+    etag = _list_etag(current_user.id, count, updated_at, limit, cursor)
+    if _none_match(if_none_match, etag):
+        return _not_modified(etag)
+    try:
+        games, next_cursor = await game_service.list_user_games(db, current_user.id, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = GAME_CACHE_CONTROL
+    return {"items": games, "next_cursor": next_cursor}
 
 @app.get("/games/{game_id}", response_model=schemas.GameResponse)
 async def get_game(
     game_id: int,
-    db: Session = Depends(get_db),
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db),
     current_user = Depends(auth.get_current_user)
 ):
-    game = game_service.get_game(db, game_id, current_user.id)
+    if if_none_match:
+        # Revalidation only needs the version, not the code
+        version = await game_service.get_game_version(db, game_id, current_user.id)
+        if version is not None and _none_match(if_none_match, _game_etag(game_id, version)):
+            return _not_modified(_game_etag(game_id, version))
+    game = await game_service.get_game(db, game_id, current_user.id)
     if not game:
         raise HTTPException(status_code=404, detail="Game not found")
+    _set_game_headers(response, game)
     return game
 
 @app.put("/games/{game_id}", response_model=schemas.GameResponse)
 async def update_game(
     game_id: int,
     game: schemas.GameUpdate,
-    db: Session = Depends(get_db),
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db),
     current_user = Depends(auth.get_current_user)
 ):
-    updated_game = game_service.update_game(db, game_id, game, current_user.id)
+    expected_versions = _if_match_versions(if_match, game_id) if if_match else None
+    try:
+        updated_game = await game_service.update_game(db, game_id, game, current_user.id, expected_versions)
+    except services.VersionConflict as e:
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail="Game was modified by another client",
+            headers={"ETag": _game_etag(game_id, e.version)}
+        )
     if not updated_game:
         raise HTTPException(status_code=404, detail="Game not found")
+    _set_game_headers(response, updated_game)
     return updated_game
 
 @app.delete("/games/{game_id}")
 async def delete_game(
     game_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user = Depends(auth.get_current_user)
 ):
-    success = game_service.delete_game(db, game_id, current_user.id)
+    success = await game_service.delete_game(db, game_id, current_user.id)
     if not success:
         raise HTTPException(status_code=404, detail="Game not found")
     return {"message": "Game deleted successfully"}
 
+@app.get("/games/{game_id}/revisions", response_model=List[schemas.GameRevisionSummary])
+async def list_game_revisions(
+    game_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user = Depends(auth.get_current_user)
+):
+    revisions = await game_service.list_revisions(db, game_id, current_user.id)
+    if revisions is None:
+        raise HTTPException(status_code=404, detail="Game not found")
+    return revisions
+
+@app.get("/games/{game_id}/revisions/{version}", response_model=schemas.GameRevisionResponse)
+async def get_game_revision(
+    game_id: int,
+    version: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user = Depends(auth.get_current_user)
+):
+    revision = await game_service.get_revision(db, game_id, version, current_user.id)
+    if not revision:
+        raise HTTPException(status_code=404, detail="Revision not found")
+    return revision
+
+@app.post("/games/{game_id}/revisions/{version}/restore", response_model=schemas.GameResponse)
+async def restore_game_revision(
+    game_id: int,
+    version: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user = Depends(auth.get_current_user)
+):
+    game = await game_service.restore_revision(db, game_id, version, current_user.id)
+    if not game:
+        raise HTTPException(status_code=404, detail="Revision not found")
+    return game
+
 # AI endpoints
+async def limit_ai(request: Request, current_user = Depends(auth.get_current_user)):
+    """Rate-limit a provider-calling request and charge the tokens it uses to the user"""
+    await rate_limiter.check(request, current_user.id)
+    meter = start_meter(current_user.id)
+    try:
+        yield current_user
+    finally:
+        # Runs after the response is sent, so streamed tokens are counted too
+        await rate_limiter.charge(meter)
+
+def _job_accepted(job) -> Response:
+    return ORJSONResponse(
+        schemas.GenerationJobResponse.model_validate(job).model_dump(mode="json"),
+        status_code=status.HTTP_202_ACCEPTED,
+        headers={"Location": f"/ai/jobs/{job.id}"}
+    )
+
 @app.post("/ai/generate-game")
 async def generate_game_code(
     prompt: str,
-    db: Session = Depends(get_db),
-    current_user = Depends(auth.get_current_user)
+    use_cache: bool = True,
+    background: bool = False,
+    save: bool = False,
+    title: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user = Depends(limit_ai)
 ):
+    if background:
+        job = await job_service.enqueue(
+            db, "generate", current_user.id, prompt,
+            params={"use_cache": use_cache, "save": save, "title": title}
+        )
+        job_workers.notify()
+        return _job_accepted(job)
     try:
-        game_code = await ai_service.generate_game_code(prompt)
+        game_code = await ai_service.generate_game_code(prompt, use_cache=use_cache)
         return {"code": game_code}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"AI generation failed: {str(e)}")
@@ -137,15 +353,289 @@ async def generate_game_code(
 async def update_game_code(
     game_id: int,
     update_prompt: str,
-    db: Session = Depends(get_db),
-    current_user = Depends(auth.get_current_user)
+    mode: Literal["patch", "full"] = "patch",
+    background: bool = False,
+    save: bool = False,
+    db: AsyncSession = Depends(get_async_db),
+    current_user = Depends(limit_ai)
 ):
+    game = await game_service.get_game(db, game_id, current_user.id)
+    if not game:
+        raise HTTPException(status_code=404, detail="Game not found")
+    if background:
+        job = await job_service.enqueue(
+            db, "update", current_user.id, update_prompt, game_id=game_id,
+            params={"mode": mode, "save": save}
+        )
+        job_workers.notify()
+        return _job_accepted(job)
     try:
-        updated_code = await ai_service.update_game_code(game_id, update_prompt, db)
+        updated_code = await ai_service.update_game_code(game.code, update_prompt, mode=mode)
         return {"code": updated_code}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"AI update failed: {str(e)}")
 
+@app.get("/ai/jobs/{job_id}", response_model=schemas.GenerationJobResponse)
+async def get_generation_job(
+    job_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user = Depends(auth.get_current_user)
+):
+    job = await job_service.get_job(db, job_id, current_user.id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/ai/cache/stats")
+async def generation_cache_stats(current_user = Depends(auth.get_current_user)):
+    return {
+        **ai_service.cache.stats(),
+        "single_flight": ai_service.inflight.stats(),
+        "validation": ai_service.validator.stats()
+    }
+
+@app.get("/ai/usage")
+async def ai_usage(current_user = Depends(auth.get_current_user)):
+    """Provider tokens used today and what is left of the daily budget"""
+    return await rate_limiter.usage(current_user.id)
+
+@app.get("/ai/providers")
+async def provider_status(current_user = Depends(auth.get_current_user)):
+    return ai_service.router.snapshot()
+
+# Streaming AI endpoints (server-sent events)
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+# Seconds between keepalive comments on quiet streams, below common proxy idle timeouts
+SSE_KEEPALIVE_INTERVAL = 15
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def _save_generated_game(owner_id: int, prompt: str, code: str, title: Optional[str]) -> dict:
+    async with AsyncSessionLocal() as db:
+        game = await game_service.create_game(
+            db,
+            schemas.GameCreate(title=title or prompt[:50], prompt=prompt, code=code),
+            owner_id
+        )
+        return {"game_id": game.id, "version": game.version}
+
+async def _save_updated_game(owner_id: int, game_id: int, code: str) -> dict:
+    async with AsyncSessionLocal() as db:
+        game = await game_service.update_game(db, game_id, schemas.GameUpdate(code=code), owner_id)
+        if not game:
+            raise ValueError("Game no longer exists")
+        return {"game_id": game.id, "version": game.version}
+
+async def _stream_code_events(chunks: AsyncIterator[str], save, failure: str) -> AsyncIterator[str]:
+    """Forward code chunks as SSE token events, then check and save the code and send a done event.
+
+    The done event carries the checked code (fences stripped), which is what
+    is saved; code that does not compile gets an error event and is not saved.
+    """
+    yield _sse("start", {})
+    parts = []
+    try:
+        async for chunk in chunks:
+            parts.append(chunk)
+            yield _sse("token", {"text": chunk})
+        code = await ai_service.streamed_code("".join(parts))
+        result = await save(code) if save else {}
+    except Exception as e:
+        yield _sse("error", {"detail": f"{failure}: {str(e)}"})
+        return
+    yield _sse("done", {"code": code, **result})
+
+@app.post("/ai/generate-game/stream")
+async def stream_game_code(
+    prompt: str,
+    title: Optional[str] = None,
+    save: bool = True,
+    use_cache: bool = True,
+    current_user = Depends(limit_ai)
+):
+    owner_id = current_user.id
+    events = _stream_code_events(
+        ai_service.stream_game_code(prompt, use_cache=use_cache),
+        (lambda code: _save_generated_game(owner_id, prompt, code, title)) if save else None,
+        "AI generation failed"
+    )
+    return StreamingResponse(events, media_type="text/event-stream", headers=SSE_HEADERS)
+
+@app.post("/ai/update-game/stream")
+async def stream_update_code(
+    game_id: int,
+    update_prompt: str,
+    save: bool = True,
+    db: AsyncSession = Depends(get_async_db),
+    current_user = Depends(limit_ai)
+):
+    game = await game_service.get_game(db, game_id, current_user.id)
+    if not game:
+        raise HTTPException(status_code=404, detail="Game not found")
+    owner_id = current_user.id
+    events = _stream_code_events(
+        ai_service.stream_update_code(game.code, update_prompt),
+        (lambda code: _save_updated_game(owner_id, game_id, code)) if save else None,
+        "AI update failed"
+    )
+    return StreamingResponse(events, media_type="text/event-stream", headers=SSE_HEADERS)
+
+# Batch generation (NDJSON)
+def _ndjson(data: dict) -> bytes:
+    return orjson.dumps(data) + b"\n"
+
+async def _save_batch_chunk(chunk: list, owner_id: int) -> List[bytes]:
+    """Save a chunk of generated games in one transaction and return their result lines"""
+    games = [
+        schemas.GameCreate(
+            title=item.title or item.prompt[:50],
+            description=item.description,
+            prompt=item.prompt,
+            code=code,
+            is_public=item.is_public,
+            metadata=item.metadata
+        )
+        for _, item, code in chunk
+    ]
+    try:
+        async with AsyncSessionLocal() as db:
+            saved = await game_service.create_games(db, games, owner_id)
+    except Exception as e:
+        print(f"❌ Could not save {len(chunk)} batch-generated games: {e}")
+        return [
+            _ndjson({"index": index, "prompt": item.prompt, "code": code, "error": f"Save failed: {str(e)}"})
+            for index, item, code in chunk
+        ]
+    return [
+        _ndjson({"index": index, "prompt": item.prompt, "code": code, "game_id": game.id, "version": game.version})
+        for (index, item, code), game in zip(chunk, saved)
+    ]
+
+async def _generate_batch(
+    items: List[schemas.BatchGameItem], owner_id: int, ip: str, save: bool, use_cache: bool
+) -> AsyncIterator[bytes]:
+    """Generate items AI_BATCH_CONCURRENCY at a time, yielding a line per item as it finishes.
+
+    Every item after the first takes its own rate limit token and is checked
+    against the budget, counting what the batch has used so far; once one is
+    refused, it and every item after it get a rate_limited or
+    budget_exhausted line instead of being generated. Generated games are
+    saved AI_BATCH_INSERT_CHUNK per transaction; a chunk is written once it
+    is full, when AI_BATCH_FLUSH_INTERVAL has passed since its first game
+    finished, or at the end.
+    """
+    loop = asyncio.get_running_loop()
+    # Queued behind interactive calls; set before the workers copy the context
+    run_as(PRIORITY_BATCH)
+    # Started by limit_ai; charged once the response is sent
+    meter = current_meter()
+    pending = iter(enumerate(items))
+    results: asyncio.Queue = asyncio.Queue()
+    refusal = None
+
+    async def worker():
+        nonlocal refusal
+        for index, item in pending:
+            # limit_ai has already admitted the first item with the request
+            if refusal is None and index > 0:
+                refusal = await rate_limiter.admit(ip, owner_id, pending_tokens=meter.total if meter else 0)
+            if refusal is not None:
+                results.put_nowait((index, item, None, {
+                    "error": refusal.detail, "status": refusal.reason, "retry_after": refusal.retry_after
+                }))
+                continue
+            try:
+                # No fallback game: a failed prompt is reported, not saved as a placeholder
+                code = await ai_service.generate_game_code(item.prompt, use_cache=use_cache, fallback=False)
+                results.put_nowait((index, item, code, None))
+            except Exception as e:
+                results.put_nowait((index, item, None, {"error": f"AI generation failed: {str(e)}"}))
+
+    workers = [loop.create_task(worker()) for _ in range(min(AI_BATCH_CONCURRENCY, len(items)))]
+    remaining = len(items)
+    chunk = []
+    deadline = None
+    try:
+        while remaining or chunk:
+            if remaining and (deadline is None or loop.time() < deadline):
+                try:
+                    timeout = None if deadline is None else deadline - loop.time()
+                    index, item, code, error = await asyncio.wait_for(results.get(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                else:
+                    remaining -= 1
+                    if error is not None:
+                        yield _ndjson({"index": index, "prompt": item.prompt, **error})
+                    elif not save:
+                        yield _ndjson({"index": index, "prompt": item.prompt, "code": code})
+                    else:
+                        chunk.append((index, item, code))
+                        if deadline is None:
+                            deadline = loop.time() + AI_BATCH_FLUSH_INTERVAL
+            if chunk and (len(chunk) >= AI_BATCH_INSERT_CHUNK or not remaining or loop.time() >= deadline):
+                for line in await _save_batch_chunk(chunk, owner_id):
+                    yield line
+                chunk = []
+                deadline = None
+    finally:
+        # The client went away: stop generating what nobody will receive
+        for task in workers:
+            task.cancel()
+
+@app.post("/ai/generate-games")
+async def generate_games(
+    batch: schemas.BatchGenerationRequest,
+    request: Request,
+    current_user = Depends(limit_ai)
+):
+    if len(batch.items) > AI_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {AI_BATCH_MAX_ITEMS} prompts per batch")
+    return StreamingResponse(
+        _generate_batch(batch.items, current_user.id, client_ip(request), batch.save, batch.use_cache),
+        media_type="application/x-ndjson",
+        headers=SSE_HEADERS
+    )
+
+async def _job_events(job_id: int, owner_id: int) -> AsyncIterator[str]:
+    """Send a job's status changes as SSE, ending with a done or error event"""
+    loop = asyncio.get_running_loop()
+    last_state = None
+    last_sent = loop.time()
+    while True:
+        # A short session per check: the stream may stay open for minutes
+        async with AsyncSessionLocal() as db:
+            job = await job_service.get_job(db, job_id, owner_id)
+        if job is None:
+            yield _sse("error", {"detail": "Job not found"})
+            return
+        if (job.status, job.attempts) != last_state:
+            last_state = (job.status, job.attempts)
+            yield _sse("status", {"status": job.status, "attempts": job.attempts, "error": job.error})
+            last_sent = loop.time()
+        if job.status == models.JOB_SUCCEEDED:
+            yield _sse("done", {"code": job.code, "game_id": job.game_id, "version": job.version})
+            return
+        if job.status == models.JOB_FAILED:
+            yield _sse("error", {"detail": job.error})
+            return
+        if loop.time() - last_sent >= SSE_KEEPALIVE_INTERVAL:
+            yield ": keepalive\n\n"
+            last_sent = loop.time()
+        await job_workers.wait_for_change(job_id, min(AI_JOB_POLL_INTERVAL, SSE_KEEPALIVE_INTERVAL))
+
+@app.get("/ai/jobs/{job_id}/events")
+async def stream_job_events(job_id: int, current_user = Depends(auth.get_current_user)):
+    # Not the request session: it would hold a connection until the stream ends
+    async with AsyncSessionLocal() as db:
+        job = await job_service.get_job(db, job_id, current_user.id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return StreamingResponse(
+        _job_events(job_id, current_user.id), media_type="text/event-stream", headers=SSE_HEADERS
+    )
+
 if __name__ == "__main__":
     uvicorn.run(
         "main:app",
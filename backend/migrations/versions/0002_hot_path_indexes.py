@@ -0,0 +1,47 @@
+"""Indexes for the hot query paths
+
+- games (owner_id, updated_at, id): GameService.list_user_games filters on the
+  owner and pages on (updated_at, id) in index order
+- assets (owner_id, id): AssetService.get_user_assets
+- game_shares (game_id): Game.shared_with and share lookups per game
+- game_shares (shared_with_email): games shared with a user
+
+Also fills in games.updated_at, which used to be NULL until the first
+update and which the listing cursor relies on.
+
+Revision ID: 0002_hot_path_indexes
+Revises: 0001_initial_schema
+Create Date: 2026-10-18 09:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002_hot_path_indexes'
+down_revision: Union[str, None] = '0001_initial_schema'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("UPDATE games SET updated_at = created_at WHERE updated_at IS NULL")
+    if op.get_bind().dialect.name == "sqlite":
+        # CURRENT_TIMESTAMP has no fractional seconds; store the same format
+        # SQLAlchemy binds so cursor comparisons on updated_at are exact
+        op.execute("UPDATE games SET updated_at = updated_at || '.000000' WHERE length(updated_at) = 19")
+
+    op.create_index('ix_games_owner_id_updated_at_id', 'games', ['owner_id', 'updated_at', 'id'], unique=False)
+    op.create_index('ix_assets_owner_id_id', 'assets', ['owner_id', 'id'], unique=False)
+    op.create_index('ix_game_shares_game_id', 'game_shares', ['game_id'], unique=False)
+    op.create_index('ix_game_shares_shared_with_email', 'game_shares', ['shared_with_email'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_game_shares_shared_with_email', table_name='game_shares')
+    op.drop_index('ix_game_shares_game_id', table_name='game_shares')
+    op.drop_index('ix_assets_owner_id_id', table_name='assets')
+    op.drop_index('ix_games_owner_id_updated_at_id', table_name='games')
@@ -0,0 +1,60 @@
+"""Game revision history
+
+Adds game_revisions, which keeps every version of a game's code as a zlib
+snapshot or a compressed delta against the previous version (see
+revisions.py). Existing games get a snapshot of their current version, so
+their history starts there.
+
+Revision ID: 0003_game_revisions
+Revises: 0002_hot_path_indexes
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+import zlib
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003_game_revisions'
+down_revision: Union[str, None] = '0002_hot_path_indexes'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    game_revisions = op.create_table(
+        'game_revisions',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('game_id', sa.Integer(), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=8), nullable=False),
+        sa.Column('data', sa.LargeBinary(), nullable=False),
+        sa.Column('size', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+        sa.ForeignKeyConstraint(['game_id'], ['games.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('game_id', 'version', name='uq_game_revisions_game_id_version')
+    )
+
+    # Same encoding as revisions.compress_text, inlined so the migration
+    # does not change if that module does
+    bind = op.get_bind()
+    games = bind.execute(sa.text("SELECT id, COALESCE(version, 1), code FROM games")).fetchall()
+    for start in range(0, len(games), 500):
+        op.bulk_insert(game_revisions, [
+            {
+                'game_id': game_id,
+                'version': version,
+                'kind': 'snapshot',
+                'data': zlib.compress(code.encode('utf-8'), 9),
+                'size': len(code)
+            }
+            for game_id, version, code in games[start:start + 500]
+        ])
+
+
+def downgrade() -> None:
+    op.drop_table('game_revisions')
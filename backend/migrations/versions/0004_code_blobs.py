@@ -0,0 +1,84 @@
+"""Content-addressed code blobs
+
+Moves games.code into code_blobs, keyed by the sha256 of the code and
+stored zlib-compressed, with games.code_hash referencing it. Games with
+identical code share one blob. Run scripts/code_storage_report.py
+afterwards to see the space saved.
+
+Revision ID: 0004_code_blobs
+Revises: 0003_game_revisions
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+import hashlib
+import zlib
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004_code_blobs'
+down_revision: Union[str, None] = '0003_game_revisions'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH = 500
+
+
+def upgrade() -> None:
+    code_blobs = op.create_table(
+        'code_blobs',
+        sa.Column('hash', sa.String(length=64), nullable=False),
+        sa.Column('data', sa.LargeBinary(), nullable=False),
+        sa.Column('size', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+        sa.PrimaryKeyConstraint('hash')
+    )
+    op.add_column('games', sa.Column('code_hash', sa.String(length=64), nullable=True))
+
+    # Same encoding as models.CodeBlob.row, inlined so the migration does
+    # not change if the model does
+    bind = op.get_bind()
+    games = sa.table('games', sa.column('id', sa.Integer), sa.column('code_hash', sa.String))
+    seen = set()
+    rows = bind.execute(sa.text("SELECT id, code FROM games ORDER BY id")).fetchall()
+    for start in range(0, len(rows), BATCH):
+        blobs, hashes = [], []
+        for game_id, code in rows[start:start + BATCH]:
+            raw = (code or "").encode('utf-8')
+            digest = hashlib.sha256(raw).hexdigest()
+            hashes.append({'game_id': game_id, 'digest': digest})
+            if digest not in seen:
+                seen.add(digest)
+                blobs.append({'hash': digest, 'data': zlib.compress(raw, 9), 'size': len(raw)})
+        if blobs:
+            op.bulk_insert(code_blobs, blobs)
+        bind.execute(
+            games.update().where(games.c.id == sa.bindparam('game_id')).values(code_hash=sa.bindparam('digest')),
+            hashes
+        )
+
+    with op.batch_alter_table('games') as batch_op:
+        batch_op.alter_column('code_hash', existing_type=sa.String(length=64), nullable=False)
+        batch_op.create_foreign_key('fk_games_code_hash_code_blobs', 'code_blobs', ['code_hash'], ['hash'])
+        batch_op.create_index('ix_games_code_hash', ['code_hash'], unique=False)
+        batch_op.drop_column('code')
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('games') as batch_op:
+        batch_op.add_column(sa.Column('code', sa.Text(), nullable=True))
+
+    bind = op.get_bind()
+    games = sa.table('games', sa.column('code_hash', sa.String), sa.column('code', sa.Text))
+    for digest, data in bind.execute(sa.text("SELECT hash, data FROM code_blobs")).fetchall():
+        bind.execute(games.update().where(games.c.code_hash == digest).values(code=zlib.decompress(data).decode('utf-8')))
+
+    with op.batch_alter_table('games') as batch_op:
+        batch_op.alter_column('code', existing_type=sa.Text(), nullable=False)
+        batch_op.drop_index('ix_games_code_hash')
+        batch_op.drop_constraint('fk_games_code_hash_code_blobs', type_='foreignkey')
+        batch_op.drop_column('code_hash')
+    op.drop_table('code_blobs')
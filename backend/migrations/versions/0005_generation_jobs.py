@@ -0,0 +1,52 @@
+"""Generation jobs
+
+Adds generation_jobs, the durable queue behind background AI generation
+(see jobs.py). Workers claim due jobs through (status, run_at).
+
+Revision ID: 0005_generation_jobs
+Revises: 0004_code_blobs
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005_generation_jobs'
+down_revision: Union[str, None] = '0004_code_blobs'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'generation_jobs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=16), nullable=False),
+        sa.Column('status', sa.String(length=16), nullable=False),
+        sa.Column('owner_id', sa.Integer(), nullable=False),
+        sa.Column('game_id', sa.Integer(), nullable=True),
+        sa.Column('prompt', sa.Text(), nullable=False),
+        sa.Column('params', sa.JSON(), nullable=True),
+        sa.Column('code', sa.Text(), nullable=True),
+        sa.Column('version', sa.Integer(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('max_attempts', sa.Integer(), nullable=False),
+        sa.Column('worker', sa.String(length=128), nullable=True),
+        sa.Column('run_at', sa.DateTime(), nullable=False),
+        sa.Column('heartbeat_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+        sa.ForeignKeyConstraint(['owner_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_generation_jobs_status_run_at', 'generation_jobs', ['status', 'run_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_generation_jobs_status_run_at', table_name='generation_jobs')
+    op.drop_table('generation_jobs')
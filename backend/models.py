@@ -1,8 +1,15 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, JSON
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, JSON, Index, LargeBinary, UniqueConstraint, event, inspect, insert, select
+from sqlalchemy.orm import Session, relationship
 from sqlalchemy.sql import func
+from datetime import datetime, timezone
+from typing import Optional
+import hashlib
+import zlib
 from database import Base
 
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
 class User(Base):
     __tablename__ = "users"
 
@@ -25,13 +32,16 @@ class Game(Base):
     title = Column(String, nullable=False)
     description = Column(Text)
     prompt = Column(Text, nullable=False)
-    code = Column(Text, nullable=False)
+    # Program body lives in code_blobs; read and write it through Game.code
+    code_hash = Column(String(64), ForeignKey("code_blobs.hash"), nullable=False, index=True)
     thumbnail_url = Column(String)
     is_public = Column(Boolean, default=False)
     version = Column(Integer, default=1)
-    metadata = Column(JSON)  # For storing game-specific data
+    # "metadata" is reserved by declarative models, so map the column under another name
+    game_metadata = Column("metadata", JSON)  # For storing game-specific data
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    # Set on insert and stamped client-side so listing cursors round-trip exactly
+    updated_at = Column(DateTime(timezone=True), default=_utcnow, onupdate=_utcnow)
     
     # Foreign keys
     owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -39,6 +49,98 @@ class Game(Base):
     # Relationships
     owner = relationship("User", back_populates="games")
     shared_with = relationship("GameShare", back_populates="game")
+    # Never lazy-loaded: queries that need the code join it in (services._game_query)
+    blob = relationship("CodeBlob", lazy="raise", viewonly=True)
+
+    __table_args__ = (
+        # GameService.list_user_games: owner filter, (updated_at, id) keyset order
+        Index("ix_games_owner_id_updated_at_id", "owner_id", "updated_at", "id"),
+    )
+
+    @property
+    def code(self) -> Optional[str]:
+        """Program source, decompressed from its blob"""
+        cached = self.__dict__.get("_code")
+        if cached is None or cached[0] != self.code_hash:
+            if self.code_hash is None:
+                return None
+            cached = (self.code_hash, self.blob.text)
+            self.__dict__["_code"] = cached
+        return cached[1]
+
+    @code.setter
+    def code(self, value: str):
+        # The blob row itself is inserted at flush time, see _store_code_blobs
+        self.code_hash = CodeBlob.hash_code(value)
+        self.__dict__["_code"] = (self.code_hash, value)
+
+class CodeBlob(Base):
+    """Content-addressed, zlib-compressed program body shared by identical games"""
+    __tablename__ = "code_blobs"
+
+    hash = Column(String(64), primary_key=True)  # sha256 of the UTF-8 code
+    data = Column(LargeBinary, nullable=False)
+    size = Column(Integer, nullable=False)  # uncompressed bytes
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    @staticmethod
+    def hash_code(code: str) -> str:
+        return hashlib.sha256(code.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def row(code: str) -> dict:
+        raw = code.encode("utf-8")
+        return {"hash": hashlib.sha256(raw).hexdigest(), "data": zlib.compress(raw, 9), "size": len(raw)}
+
+    @property
+    def text(self) -> str:
+        return zlib.decompress(self.data).decode("utf-8")
+
+def _insert_missing_blobs(session: Session, rows: list):
+    dialect = session.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        session.execute(dialect_insert(CodeBlob).on_conflict_do_nothing(index_elements=["hash"]), rows)
+        return
+    existing = set(session.scalars(select(CodeBlob.hash).where(CodeBlob.hash.in_([row["hash"] for row in rows]))))
+    missing = [row for row in rows if row["hash"] not in existing]
+    if missing:
+        session.execute(insert(CodeBlob), missing)
+
+@event.listens_for(Session, "before_flush")
+def _store_code_blobs(session, flush_context, instances):
+    """Insert the blobs of new or changed game code before the games referencing them"""
+    rows = {}
+    for obj in list(session.new) + list(session.dirty):
+        if not isinstance(obj, Game):
+            continue
+        cached = obj.__dict__.get("_code")
+        if cached is None or cached[0] != obj.code_hash:
+            continue
+        if obj in session.new or inspect(obj).attrs.code_hash.history.has_changes():
+            rows[cached[0]] = cached[1]
+    if rows:
+        _insert_missing_blobs(session, [CodeBlob.row(code) for code in rows.values()])
+
+class GameRevision(Base):
+    """One version of a game's code, stored as a compressed snapshot or a delta"""
+    __tablename__ = "game_revisions"
+
+    id = Column(Integer, primary_key=True)
+    game_id = Column(Integer, ForeignKey("games.id"), nullable=False)
+    version = Column(Integer, nullable=False)
+    kind = Column(String(8), nullable=False)  # snapshot: zlib(code), delta: zlib(ops against the previous version)
+    data = Column(LargeBinary, nullable=False)
+    size = Column(Integer, nullable=False)  # length of the code this revision rebuilds
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        # Rebuilding a version reads its chain in version order
+        UniqueConstraint("game_id", "version", name="uq_game_revisions_game_id_version"),
+    )
 
 class GameShare(Base):
     __tablename__ = "game_shares"
@@ -52,6 +154,11 @@ class GameShare(Base):
     # Relationships
     game = relationship("Game", back_populates="shared_with")
 
+    __table_args__ = (
+        Index("ix_game_shares_game_id", "game_id"),
+        Index("ix_game_shares_shared_with_email", "shared_with_email"),
+    )
+
 class Asset(Base):
     __tablename__ = "assets"
 
@@ -69,3 +176,52 @@ class Asset(Base):
     
     # Relationships
     owner = relationship("User", back_populates="assets")
+
+    __table_args__ = (
+        # AssetService.get_user_assets
+        Index("ix_assets_owner_id_id", "owner_id", "id"),
+    )
+
+class GenerationCacheEntry(Base):
+    __tablename__ = "generation_cache"
+
+    key = Column(String(64), primary_key=True)  # sha256 of normalized prompt, model and system prompt
+    model = Column(String, nullable=False)
+    code = Column(Text, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime, nullable=False, index=True)  # naive UTC
+
+# GenerationJob.status values
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+class GenerationJob(Base):
+    """An AI generation or update run by the background workers (see jobs.py)"""
+    __tablename__ = "generation_jobs"
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(16), nullable=False)  # generate or update
+    status = Column(String(16), nullable=False, default=JOB_QUEUED)
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    # The game to update, or the game a saved generation created. Not a foreign
+    # key: deleting a game leaves its job history alone
+    game_id = Column(Integer)
+    prompt = Column(Text, nullable=False)
+    params = Column(JSON)  # mode, use_cache, save, title
+    code = Column(Text)  # result
+    version = Column(Integer)  # version of the saved game
+    error = Column(Text)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False)
+    worker = Column(String(128))  # lease holder while running
+    run_at = Column(DateTime, nullable=False)  # naive UTC; not claimed before this (retry backoff)
+    heartbeat_at = Column(DateTime)  # naive UTC; renewed while running, stale leases are requeued
+    finished_at = Column(DateTime)  # naive UTC
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        # Claiming: the oldest queued job that is due
+        Index("ix_generation_jobs_status_run_at", "status", "run_at"),
+    )
@@ -0,0 +1,78 @@
+import os
+from typing import List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Patch-mode update configuration
+AI_PATCH_MAX_TOKENS = int(os.getenv("AI_PATCH_MAX_TOKENS", "2000"))
+AI_PATCH_ATTEMPTS = int(os.getenv("AI_PATCH_ATTEMPTS", "2"))
+
+SEARCH_MARKER = "<<<<<<< SEARCH"
+DIVIDER = "======="
+REPLACE_MARKER = ">>>>>>> REPLACE"
+
+EditBlock = Tuple[str, str]
+
+class PatchError(ValueError):
+    """Raised when edit blocks cannot be parsed or applied"""
+
+def parse_edit_blocks(text: str) -> List[EditBlock]:
+    """Extract (search, replace) pairs from a model reply, ignoring any prose around them"""
+    blocks: List[EditBlock] = []
+    search: List[str] = []
+    replace: List[str] = []
+    state = None
+
+    for line in text.splitlines():
+        marker = line.strip()
+        if marker == SEARCH_MARKER:
+            search, replace, state = [], [], "search"
+        elif marker == DIVIDER and state == "search":
+            state = "replace"
+        elif marker == REPLACE_MARKER and state == "replace":
+            blocks.append(("\n".join(search), "\n".join(replace)))
+            state = None
+        elif state == "search":
+            search.append(line)
+        elif state == "replace":
+            replace.append(line)
+
+    if state is not None:
+        raise PatchError("Unterminated edit block")
+    if not blocks:
+        raise PatchError("No SEARCH/REPLACE blocks found")
+    return blocks
+
+def _find(lines: List[str], search: List[str], normalize) -> Optional[int]:
+    """Return the line index of the unique match of search in lines, if any"""
+    wanted = [normalize(line) for line in search]
+    haystack = [normalize(line) for line in lines]
+    matches = [
+        i for i in range(len(lines) - len(wanted) + 1)
+        if haystack[i:i + len(wanted)] == wanted
+    ]
+    if len(matches) > 1:
+        raise PatchError(f"SEARCH block matches {len(matches)} places:\n{chr(10).join(search)}")
+    return matches[0] if matches else None
+
+def apply_edit_blocks(code: str, blocks: List[EditBlock]) -> str:
+    """Apply edit blocks in order; every SEARCH must match exactly one run of whole lines.
+
+    Lines are compared exactly first and then ignoring trailing whitespace,
+    which models often drop.
+    """
+    lines = code.split("\n")
+    for search, replace in blocks:
+        if not search.strip():
+            raise PatchError("Empty SEARCH block")
+
+        search_lines = search.split("\n")
+        start = _find(lines, search_lines, lambda line: line)
+        if start is None:
+            start = _find(lines, search_lines, str.rstrip)
+        if start is None:
+            raise PatchError(f"SEARCH block not found in the current code:\n{search}")
+        lines[start:start + len(search_lines)] = replace.split("\n") if replace else []
+    return "\n".join(lines)
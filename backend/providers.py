@@ -0,0 +1,245 @@
+import asyncio
+import importlib.util
+import os
+from typing import TYPE_CHECKING, AsyncIterator, List, Optional
+
+from dotenv import load_dotenv
+
+from usage import estimate_tokens, record_usage
+
+if TYPE_CHECKING:
+    import httpx
+
+load_dotenv()
+
+# Provider configuration
+ANTHROPIC_MODEL = os.getenv("ANTHROPIC_MODEL", "claude-3-sonnet-20240229")
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4")
+AI_REQUEST_TIMEOUT = float(os.getenv("AI_REQUEST_TIMEOUT", "120"))
+AI_CONNECT_TIMEOUT = float(os.getenv("AI_CONNECT_TIMEOUT", "10"))
+AI_MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", "200"))
+
+def _usage_count(usage, field: str) -> Optional[int]:
+    # anthropic 0.8.x has no usage fields on its models, nor openai 1.3.x on stream
+    # chunks, and both hand them over as dicts
+    if isinstance(usage, dict):
+        value = usage.get(field)
+    else:
+        value = getattr(usage, field, None)
+    return value if isinstance(value, int) else None
+
+class ProviderError(Exception):
+    """Raised when a provider call fails, times out or returns nothing"""
+
+class AIProvider:
+    """Base class for async LLM providers.
+
+    Each provider owns a semaphore so one worker can keep many generations in
+    flight without opening more upstream connections than the provider allows.
+    The SDK client is built on first use: importing anthropic or openai (and
+    httpx with them) takes a few hundred milliseconds, which every cold start
+    would otherwise pay, including instances that never generate.
+
+    Providers only stream; ProviderRouter.complete joins a stream for callers
+    that want the whole text, so usage is recorded in one place per SDK.
+    """
+    name = "provider"
+    label = "Provider"
+    sdk = ""
+
+    def __init__(self, model: str, max_concurrency: int = AI_MAX_CONCURRENCY, timeout: float = AI_REQUEST_TIMEOUT):
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.in_flight = 0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._client = None
+
+    @classmethod
+    def available(cls) -> bool:
+        """Whether the provider's SDK is installed, without importing it"""
+        return importlib.util.find_spec(cls.sdk) is not None
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = self._build_client()
+        return self._client
+
+    def _build_client(self):
+        raise NotImplementedError
+
+    def _http_client(self) -> "httpx.AsyncClient":
+        import httpx
+
+        return httpx.AsyncClient(
+            timeout=httpx.Timeout(self.timeout, connect=AI_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=self.max_concurrency,
+                max_keepalive_connections=min(self.max_concurrency, 50)
+            )
+        )
+
+    async def stream(self, system: str, prompt: str, max_tokens: int = 4000) -> AsyncIterator[str]:
+        """Stream a completion as text chunks, holding a concurrency slot until done"""
+        loop = asyncio.get_running_loop()
+        async with self._semaphore:
+            self.in_flight += 1
+            deadline = loop.time() + self.timeout
+            chunks = self._stream(system, prompt, max_tokens)
+            try:
+                while True:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        raise asyncio.TimeoutError()
+                    try:
+                        text = await asyncio.wait_for(chunks.__anext__(), timeout=remaining)
+                    except StopAsyncIteration:
+                        break
+                    if text:
+                        yield text
+            except asyncio.TimeoutError as e:
+                raise ProviderError(f"{self.label} timed out after {self.timeout:.0f}s") from e
+            except ProviderError:
+                raise
+            except Exception as e:
+                raise ProviderError(str(e)) from e
+            finally:
+                self.in_flight -= 1
+                await chunks.aclose()
+
+    def _stream(self, system: str, prompt: str, max_tokens: int) -> AsyncIterator[str]:
+        raise NotImplementedError
+
+class AnthropicProvider(AIProvider):
+    name = "anthropic"
+    label = "Anthropic"
+    sdk = "anthropic"
+
+    def __init__(self, api_key: str, model: str = ANTHROPIC_MODEL, **kwargs):
+        super().__init__(model, **kwargs)
+        self.api_key = api_key
+
+    def _build_client(self):
+        import anthropic
+
+        return anthropic.AsyncAnthropic(
+            api_key=self.api_key,
+            http_client=self._http_client(),
+            max_retries=0
+        )
+
+    @property
+    def messages(self):
+        # The Messages API is GA as client.messages from anthropic 0.18; the
+        # 0.8.x SDK we pin only has it as client.beta.messages
+        messages = getattr(self.client, "messages", None)
+        return messages if messages is not None else self.client.beta.messages
+
+    async def _stream(self, system: str, prompt: str, max_tokens: int) -> AsyncIterator[str]:
+        sent = 0
+        input_tokens = output_tokens = None
+        try:
+            async with self.messages.stream(
+                model=self.model,
+                max_tokens=max_tokens,
+                system=system,
+                messages=[{"role": "user", "content": prompt}]
+            ) as stream:
+                async for event in stream:
+                    if event.type == "content_block_delta":
+                        text = getattr(event.delta, "text", None)
+                        if text:
+                            sent += len(text)
+                            yield text
+                    elif event.type == "message_start":
+                        input_tokens = _usage_count(getattr(event.message, "usage", None), "input_tokens")
+                    elif event.type == "message_delta":
+                        output_tokens = _usage_count(getattr(event, "usage", None), "output_tokens")
+        finally:
+            # Estimated when the stream was cut off before reporting usage
+            record_usage(
+                input_tokens if input_tokens is not None else estimate_tokens(system + prompt),
+                output_tokens if output_tokens is not None else (sent + 3) // 4
+            )
+
+class OpenAIProvider(AIProvider):
+    name = "openai"
+    label = "OpenAI"
+    sdk = "openai"
+
+    def __init__(self, api_key: str, model: str = OPENAI_MODEL, **kwargs):
+        super().__init__(model, **kwargs)
+        self.api_key = api_key
+
+    def _build_client(self):
+        from openai import AsyncOpenAI
+
+        return AsyncOpenAI(
+            api_key=self.api_key,
+            http_client=self._http_client(),
+            max_retries=0
+        )
+
+    async def _stream(self, system: str, prompt: str, max_tokens: int) -> AsyncIterator[str]:
+        response = await self.client.chat.completions.create(
+            model=self.model,
+            max_tokens=max_tokens,
+            stream=True,
+            # Ask for a final chunk with the usage; openai 1.3.x has no stream_options argument yet
+            extra_body={"stream_options": {"include_usage": True}},
+            messages=[
+                {"role": "system", "content": system},
+                {"role": "user", "content": prompt}
+            ]
+        )
+        sent = 0
+        input_tokens = output_tokens = None
+        try:
+            async for chunk in response:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    sent += len(chunk.choices[0].delta.content)
+                    yield chunk.choices[0].delta.content
+                usage = getattr(chunk, "usage", None)
+                if usage is not None:
+                    input_tokens = _usage_count(usage, "prompt_tokens")
+                    output_tokens = _usage_count(usage, "completion_tokens")
+        finally:
+            await response.response.aclose()
+            # Estimate what the stream did not report, e.g. when it was cut short
+            record_usage(
+                estimate_tokens(system + prompt) if input_tokens is None else input_tokens,
+                (sent + 3) // 4 if output_tokens is None else output_tokens
+            )
+
+def build_providers() -> List[AIProvider]:
+    """Create the configured providers in priority order"""
+    providers: List[AIProvider] = []
+
+    anthropic_key = os.getenv("ANTHROPIC_API_KEY")
+    if anthropic_key and not AnthropicProvider.available():
+        print("❌ Failed to initialize Anthropic: the anthropic package is not installed")
+    elif anthropic_key:
+        try:
+            providers.append(AnthropicProvider(
+                anthropic_key,
+                max_concurrency=int(os.getenv("ANTHROPIC_MAX_CONCURRENCY", AI_MAX_CONCURRENCY))
+            ))
+            print("✅ Anthropic API initialized")
+        except Exception as e:
+            print(f"❌ Failed to initialize Anthropic: {e}")
+
+    openai_key = os.getenv("OPENAI_API_KEY")
+    if openai_key and not OpenAIProvider.available():
+        print("❌ Failed to initialize OpenAI: the openai package is not installed")
+    elif openai_key:
+        try:
+            providers.append(OpenAIProvider(
+                openai_key,
+                max_concurrency=int(os.getenv("OPENAI_MAX_CONCURRENCY", AI_MAX_CONCURRENCY))
+            ))
+            print("✅ OpenAI API initialized as fallback")
+        except Exception as e:
+            print(f"❌ Failed to initialize OpenAI: {e}")
+
+    return providers
@@ -0,0 +1,79 @@
+import json
+import os
+import zlib
+from difflib import SequenceMatcher
+from typing import List, Optional
+
+from dotenv import load_dotenv
+
+from models import GameRevision
+
+load_dotenv()
+
+# Revision history configuration: a full snapshot every N revisions bounds how
+# many deltas have to be replayed to rebuild any version
+GAME_REVISION_SNAPSHOT_EVERY = int(os.getenv("GAME_REVISION_SNAPSHOT_EVERY", "20"))
+
+SNAPSHOT = "snapshot"
+DELTA = "delta"
+
+def compress_text(text: str) -> bytes:
+    return zlib.compress(text.encode("utf-8"), 9)
+
+def decompress_text(data: bytes) -> str:
+    return zlib.decompress(data).decode("utf-8")
+
+def encode_delta(base: str, target: str) -> bytes:
+    """Line delta turning base into target, as compressed JSON.
+
+    Each op is either [start, end], copying base lines start:end, or a
+    string of new text. AI edits touch a few lines, so most of a delta is
+    a handful of copy ranges.
+    """
+    base_lines = base.splitlines(keepends=True)
+    target_lines = target.splitlines(keepends=True)
+    ops: List = []
+    matcher = SequenceMatcher(None, base_lines, target_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append([i1, i2])
+        elif j2 > j1:
+            ops.append("".join(target_lines[j1:j2]))
+    return zlib.compress(json.dumps(ops, separators=(",", ":")).encode("utf-8"), 9)
+
+def apply_delta(base: str, delta: bytes) -> str:
+    base_lines = base.splitlines(keepends=True)
+    parts = []
+    for op in json.loads(zlib.decompress(delta)):
+        parts.append("".join(base_lines[op[0]:op[1]]) if isinstance(op, list) else op)
+    return "".join(parts)
+
+def new_revision(
+    game_id: int, version: int, code: str, previous_code: Optional[str] = None, chain_length: int = 0
+) -> GameRevision:
+    """Build the revision row for a game version.
+
+    chain_length is the number of revisions stored since the game's latest
+    snapshot, that snapshot included. First versions, versions that would
+    make the chain longer than GAME_REVISION_SNAPSHOT_EVERY, games without a
+    snapshot and edits whose delta would not be smaller than a snapshot are
+    stored in full; everything else is a delta against the previous revision.
+    """
+    snapshot = compress_text(code)
+    if previous_code is not None and 0 < chain_length < GAME_REVISION_SNAPSHOT_EVERY:
+        delta = encode_delta(previous_code, code)
+        if len(delta) < len(snapshot):
+            return GameRevision(game_id=game_id, version=version, kind=DELTA, data=delta, size=len(code))
+    return GameRevision(game_id=game_id, version=version, kind=SNAPSHOT, data=snapshot, size=len(code))
+
+def rebuild(revisions: List[GameRevision]) -> str:
+    """Replay revisions ordered by version, starting from a snapshot"""
+    if not revisions or revisions[0].kind != SNAPSHOT:
+        raise ValueError("Revision chain does not start with a snapshot")
+    code = decompress_text(revisions[0].data)
+    for revision in revisions[1:]:
+        if revision.kind == SNAPSHOT:
+            code = decompress_text(revision.data)
+        else:
+            code = apply_delta(code, revision.data)
+    return code
@@ -0,0 +1,254 @@
+import asyncio
+import os
+import time
+from collections import deque
+from typing import AsyncIterator, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from providers import AIProvider, ProviderError
+
+load_dotenv()
+
+# Router configuration
+AI_HEDGE_DELAY = float(os.getenv("AI_HEDGE_DELAY", "0"))  # seconds without a first token before hedging; 0 disables
+AI_BREAKER_FAILURES = int(os.getenv("AI_BREAKER_FAILURES", "5"))
+AI_BREAKER_COOLDOWN = float(os.getenv("AI_BREAKER_COOLDOWN", "30"))
+AI_LATENCY_WINDOW = int(os.getenv("AI_LATENCY_WINDOW", "100"))
+AI_DEGRADED_ERROR_RATE = float(os.getenv("AI_DEGRADED_ERROR_RATE", "0.25"))
+AI_DEGRADED_LATENCY_FACTOR = float(os.getenv("AI_DEGRADED_LATENCY_FACTOR", "2.0"))
+
+# Samples needed before latency is used for routing decisions
+MIN_LATENCY_SAMPLES = 5
+
+class AllProvidersFailed(ProviderError):
+    """Raised when no provider could produce a completion"""
+
+def percentile(samples, q: float) -> Optional[float]:
+    """The q-quantile (0..1) of samples by nearest rank, or None if there are none"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+class ProviderStats:
+    """Rolling window of latencies and outcomes for one provider"""
+
+    def __init__(self, window: int = AI_LATENCY_WINDOW):
+        self.latencies = deque(maxlen=window)
+        self.first_token = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+
+    def record_success(self, latency: float, first_token: Optional[float]):
+        self.latencies.append(latency)
+        if first_token is not None:
+            self.first_token.append(first_token)
+        self.outcomes.append(True)
+
+    def record_failure(self):
+        self.outcomes.append(False)
+
+    @property
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    @property
+    def p95(self) -> Optional[float]:
+        if len(self.latencies) < MIN_LATENCY_SAMPLES:
+            return None
+        return percentile(self.latencies, 0.95)
+
+    def snapshot(self) -> dict:
+        return {
+            "calls": len(self.outcomes),
+            "error_rate": self.error_rate,
+            "latency_p50": percentile(self.latencies, 0.5),
+            "latency_p95": percentile(self.latencies, 0.95),
+            "first_token_p50": percentile(self.first_token, 0.5),
+            "first_token_p95": percentile(self.first_token, 0.95)
+        }
+
+class CircuitBreaker:
+    """Opens after consecutive failures and lets one probe through per cooldown"""
+
+    def __init__(self, failure_threshold: int = AI_BREAKER_FAILURES, cooldown: float = AI_BREAKER_COOLDOWN):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.state = "closed"
+        self.opened_at = 0.0
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        now = time.monotonic()
+        if now - self.opened_at >= self.cooldown:
+            # Half-open: this call is the probe, the next one waits another cooldown
+            self.state = "half_open"
+            self.opened_at = now
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.state = "closed"
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state == "closed":
+                print(f"⚠️ Circuit opened after {self.failures} consecutive failures")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+class ProviderRouter:
+    """Routes completions across providers using circuit breakers and latency.
+
+    Providers keep their configured preference order unless they are
+    degraded (high error rate, or p95 latency far above the best provider),
+    in which case they are tried last. With AI_HEDGE_DELAY set, a second
+    provider is started when the first has not produced a token in time.
+    """
+
+    def __init__(self, providers: List[AIProvider], hedge_delay: float = AI_HEDGE_DELAY):
+        self.providers = providers
+        self.hedge_delay = hedge_delay
+        self.stats: Dict[str, ProviderStats] = {p.name: ProviderStats() for p in providers}
+        self.breakers: Dict[str, CircuitBreaker] = {p.name: CircuitBreaker() for p in providers}
+        self.hedges = 0
+
+    def _degraded(self, provider: AIProvider, best_p95: Optional[float]) -> bool:
+        stats = self.stats[provider.name]
+        if len(stats.outcomes) >= MIN_LATENCY_SAMPLES and stats.error_rate >= AI_DEGRADED_ERROR_RATE:
+            return True
+        p95 = stats.p95
+        return p95 is not None and best_p95 is not None and p95 > best_p95 * AI_DEGRADED_LATENCY_FACTOR
+
+    def ranked(self) -> List[AIProvider]:
+        known = [s.p95 for s in self.stats.values() if s.p95 is not None]
+        best_p95 = min(known) if known else None
+        order = {p.name: i for i, p in enumerate(self.providers)}
+        return sorted(
+            self.providers,
+            key=lambda p: (self._degraded(p, best_p95), order[p.name])
+        )
+
+    async def complete(self, system: str, prompt: str, max_tokens: int = 4000) -> str:
+        """Return the first completion to finish"""
+        async for code in self._race(system, prompt, max_tokens, stream=False):
+            return code
+        raise AllProvidersFailed("No AI provider available")
+
+    def stream(self, system: str, prompt: str, max_tokens: int = 4000) -> AsyncIterator[str]:
+        """Stream from whichever provider produces a token first"""
+        return self._race(system, prompt, max_tokens, stream=True)
+
+    async def _race(self, system: str, prompt: str, max_tokens: int, stream: bool) -> AsyncIterator[str]:
+        candidates = self.ranked()
+        queue: asyncio.Queue = asyncio.Queue()
+        attempts: Dict[str, asyncio.Task] = {}
+        buffers: Dict[str, List[str]] = {}
+        errors: List[str] = []
+        winner = None
+
+        def launch() -> bool:
+            while candidates:
+                provider = candidates.pop(0)
+                if not self.breakers[provider.name].allow():
+                    errors.append(f"{provider.label} circuit open")
+                    continue
+                buffers[provider.name] = []
+                attempts[provider.name] = asyncio.ensure_future(
+                    self._pump(provider, system, prompt, max_tokens, queue)
+                )
+                return True
+            return False
+
+        def cancel_others(keep: str):
+            for name, task in attempts.items():
+                if name != keep:
+                    task.cancel()
+
+        try:
+            launch()
+            while attempts:
+                started = any(buffers[name] for name in attempts)
+                hedge = self.hedge_delay > 0 and not started and candidates and winner is None
+                try:
+                    name, kind, value = await asyncio.wait_for(
+                        queue.get(), timeout=self.hedge_delay if hedge else None
+                    )
+                except asyncio.TimeoutError:
+                    if launch():
+                        self.hedges += 1
+                    continue
+                if name not in attempts or (winner is not None and name != winner):
+                    continue
+
+                if kind == "error":
+                    del attempts[name]
+                    errors.append(str(value))
+                    if name == winner:
+                        raise value
+                    if not attempts:
+                        launch()
+                elif kind == "chunk":
+                    buffers[name].append(value)
+                    if stream:
+                        if winner is None:
+                            winner = name
+                            cancel_others(name)
+                        yield value
+                else:
+                    cancel_others(name)
+                    if not stream:
+                        yield "".join(buffers[name])
+                    return
+
+            raise AllProvidersFailed("; ".join(errors) or "No AI provider available")
+        finally:
+            for task in attempts.values():
+                task.cancel()
+
+    async def _pump(self, provider: AIProvider, system: str, prompt: str, max_tokens: int, queue: asyncio.Queue):
+        stats = self.stats[provider.name]
+        breaker = self.breakers[provider.name]
+        start = time.monotonic()
+        first_token = None
+        try:
+            async for chunk in provider.stream(system, prompt, max_tokens):
+                if first_token is None:
+                    first_token = time.monotonic() - start
+                queue.put_nowait((provider.name, "chunk", chunk))
+        except ProviderError as e:
+            print(f"{provider.label} API error: {e}")
+            stats.record_failure()
+            breaker.record_failure()
+            queue.put_nowait((provider.name, "error", e))
+            return
+        if first_token is None:
+            stats.record_failure()
+            breaker.record_failure()
+            queue.put_nowait((provider.name, "error", ProviderError(f"{provider.label} returned an empty completion")))
+            return
+        stats.record_success(time.monotonic() - start, first_token)
+        breaker.record_success()
+        queue.put_nowait((provider.name, "done", None))
+
+    def snapshot(self) -> dict:
+        return {
+            "hedge_delay": self.hedge_delay,
+            "hedges": self.hedges,
+            "providers": [
+                {
+                    "name": p.name,
+                    "model": p.model,
+                    "in_flight": p.in_flight,
+                    "circuit": self.breakers[p.name].state,
+                    **self.stats[p.name].snapshot()
+                }
+                for p in self.ranked()
+            ]
+        }
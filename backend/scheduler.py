@@ -0,0 +1,157 @@
+import asyncio
+import os
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Deque, Dict, Optional
+
+from dotenv import load_dotenv
+
+from providers import AI_MAX_CONCURRENCY
+from router import AI_LATENCY_WINDOW, percentile
+from usage import current_meter
+
+load_dotenv()
+
+# Priority classes, most urgent first
+PRIORITY_INTERACTIVE = "interactive"  # edits to a game someone is looking at
+PRIORITY_GENERATE = "generate"  # new games requested from the UI
+PRIORITY_BATCH = "batch"  # background jobs and bulk requests
+
+# Scheduler configuration
+AI_SCHEDULER_SLOTS = int(os.getenv("AI_SCHEDULER_SLOTS", str(AI_MAX_CONCURRENCY)))  # provider calls in flight per process
+# Share of the slots each class gets while all of them are waiting
+AI_SCHEDULER_WEIGHTS = os.getenv("AI_SCHEDULER_WEIGHTS", "interactive:8,generate:4,batch:1")
+
+def _parse_weights(spec: str) -> Dict[str, float]:
+    weights = {PRIORITY_INTERACTIVE: 8.0, PRIORITY_GENERATE: 4.0, PRIORITY_BATCH: 1.0}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, weight = item.partition(":")
+        if name.strip() in weights and float(weight) > 0:
+            weights[name.strip()] = float(weight)
+    return weights
+
+# The class of the request or job being served; unset, AIService picks one per call
+_priority: ContextVar[Optional[str]] = ContextVar("ai_priority", default=None)
+
+def run_as(priority: str):
+    """Schedule provider calls made from here on in this context as priority"""
+    _priority.set(priority)
+
+def current_priority(default: str) -> str:
+    return _priority.get() or default
+
+def scheduled_user() -> Optional[int]:
+    """The user provider calls in this context are queued under: the one being charged for them"""
+    meter = current_meter()
+    return meter.user_id if meter is not None else None
+
+class FairScheduler:
+    """Hands out provider call slots fairly across priority classes and users.
+
+    While slots are free calls go straight through. Once they are all taken,
+    callers queue per class and per user: classes are served in proportion
+    to their weights (stride scheduling, so batch still moves under
+    interactive load), and within a class users take turns, so one user's
+    hundred queued calls wait behind everyone else's next one rather than
+    in front of them.
+    """
+
+    def __init__(self, slots: int = AI_SCHEDULER_SLOTS, weights: Optional[Dict[str, float]] = None):
+        self.slots = slots
+        self.weights = weights or _parse_weights(AI_SCHEDULER_WEIGHTS)
+        self.active = 0
+        self.queued = 0
+        # class -> user -> waiters in arrival order; users rotate to the back once served
+        self._queues: Dict[str, OrderedDict] = {p: OrderedDict() for p in self.weights}
+        self._pass: Dict[str, float] = {p: 0.0 for p in self.weights}
+        self._virtual_time = 0.0
+        self.served: Dict[str, int] = {p: 0 for p in self.weights}
+        self.waits: Dict[str, Deque[float]] = {p: deque(maxlen=AI_LATENCY_WINDOW) for p in self.weights}
+
+    @asynccontextmanager
+    async def slot(self, priority: str, user_id: Optional[int] = None):
+        """Hold a provider call slot for the duration of the block"""
+        if priority not in self.weights:
+            priority = PRIORITY_GENERATE
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        if self.active < self.slots and not self.queued:
+            self.active += 1
+        else:
+            await self._wait(priority, user_id)
+        self.served[priority] += 1
+        self.waits[priority].append(loop.time() - start)
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._grant()
+
+    async def _wait(self, priority: str, user_id: Optional[int]):
+        users = self._queues[priority]
+        if not users:
+            # A class coming back from idle starts at the current virtual time,
+            # not with credit for the time it had nothing queued
+            self._pass[priority] = max(self._pass[priority], self._virtual_time)
+        waiter = asyncio.get_running_loop().create_future()
+        users.setdefault(user_id, deque()).append(waiter)
+        self.queued += 1
+        # Slots can be free if everyone queued ahead was cancelled
+        self._grant()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Granted a slot just as we were cancelled: pass it on
+                self.active -= 1
+                self._grant()
+            else:
+                self._discard(priority, user_id, waiter)
+            raise
+
+    def _discard(self, priority: str, user_id: Optional[int], waiter: asyncio.Future):
+        users = self._queues[priority]
+        waiters = users.get(user_id)
+        if waiters is None or waiter not in waiters:
+            return
+        waiters.remove(waiter)
+        self.queued -= 1
+        if not waiters:
+            del users[user_id]
+
+    def _grant(self):
+        while self.active < self.slots and self.queued:
+            priority = min((p for p in self._queues if self._queues[p]), key=self._pass.__getitem__)
+            users = self._queues[priority]
+            user_id, waiters = next(iter(users.items()))
+            waiter = waiters.popleft()
+            self.queued -= 1
+            if waiters:
+                users.move_to_end(user_id)
+            else:
+                del users[user_id]
+            if waiter.done():
+                continue
+            self._virtual_time = self._pass[priority]
+            self._pass[priority] += 1 / self.weights[priority]
+            self.active += 1
+            waiter.set_result(None)
+
+    def stats(self) -> dict:
+        return {
+            "slots": self.slots,
+            "active": self.active,
+            "queued": self.queued,
+            "classes": {
+                p: {
+                    "weight": self.weights[p],
+                    "queued": sum(len(waiters) for waiters in self._queues[p].values()),
+                    "queued_users": len(self._queues[p]),
+                    "served": self.served[p],
+                    "wait_p50": percentile(self.waits[p], 0.5),
+                    "wait_p95": percentile(self.waits[p], 0.95)
+                }
+                for p in self.weights
+            }
+        }
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import AliasChoices, BaseModel, EmailStr, Field
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 
@@ -41,7 +41,9 @@ class GameResponse(GameBase):
     code: str
     thumbnail_url: Optional[str] = None
     version: int
-    metadata: Optional[Dict[str, Any]] = None
+    metadata: Optional[Dict[str, Any]] = Field(
+        None, validation_alias=AliasChoices("game_metadata", "metadata")
+    )
     created_at: datetime
     updated_at: Optional[datetime] = None
     owner_id: int
@@ -49,6 +51,39 @@ class GameResponse(GameBase):
     class Config:
         from_attributes = True
 
+class GameSummary(GameBase):
+    """Game listing entry without the code body"""
+    id: int
+    thumbnail_url: Optional[str] = None
+    version: int
+    metadata: Optional[Dict[str, Any]] = Field(
+        None, validation_alias=AliasChoices("game_metadata", "metadata")
+    )
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+    owner_id: int
+
+    class Config:
+        from_attributes = True
+
+class GamePage(BaseModel):
+    items: List[GameSummary]
+    next_cursor: Optional[str] = None
+
+# Game revision schemas
+class GameRevisionSummary(BaseModel):
+    version: int
+    kind: str
+    size: int
+    stored_bytes: int
+    created_at: Optional[datetime] = None
+
+class GameRevisionResponse(BaseModel):
+    game_id: int
+    version: int
+    code: str
+    created_at: Optional[datetime] = None
+
 # Asset schemas
 class AssetBase(BaseModel):
     filename: str
@@ -97,6 +132,35 @@ class GameUpdateRequest(BaseModel):
     update_prompt: str
     current_code: str
 
+class BatchGameItem(BaseModel):
+    """One prompt of a batch, with the details of the game to save it as"""
+    prompt: str
+    title: Optional[str] = None  # defaults to the start of the prompt
+    description: Optional[str] = None
+    is_public: bool = False
+    metadata: Optional[Dict[str, Any]] = None
+
+class BatchGenerationRequest(BaseModel):
+    items: List[BatchGameItem] = Field(..., min_length=1)
+    save: bool = True
+    use_cache: bool = True
+
+class GenerationJobResponse(BaseModel):
+    id: int
+    kind: str
+    status: str  # queued, running, succeeded, failed
+    attempts: int
+    max_attempts: int
+    error: Optional[str] = None
+    code: Optional[str] = None
+    game_id: Optional[int] = None
+    version: Optional[int] = None
+    created_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
 # Token schemas
 class Token(BaseModel):
     access_token: str
@@ -0,0 +1,167 @@
+"""Check that the service queries use indexes.
+
+Runs each hot service query against DATABASE_URL, captures the SQL it
+emits, and EXPLAINs it (EXPLAIN QUERY PLAN on SQLite, EXPLAIN on Postgres
+with sequential scans and sorts disabled, so the plan shows whether an index
+path exists at all). Exits non-zero if a query scans a table or sorts where
+an index should serve it.
+
+    python scripts/check_query_plans.py             # a migrated throwaway SQLite database
+    DATABASE_URL=postgresql://... python scripts/check_query_plans.py --migrate
+
+Without DATABASE_URL (in the environment or .env) it creates a SQLite
+database in a temporary directory, migrates it to head and removes it
+afterwards, so nothing is written to the source tree. Against DATABASE_URL
+it refuses to run unless the schema is at the alembic head; --migrate runs
+alembic upgrade head first. Run it once with SQLite and once with a Postgres
+URL to cover both.
+"""
+import argparse
+import os
+import sys
+import tempfile
+from datetime import datetime, timezone
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+from dotenv import load_dotenv
+
+load_dotenv()
+# Set before database is imported, which reads it at import time
+_scratch = None
+if not os.getenv("DATABASE_URL"):
+    _scratch = tempfile.TemporaryDirectory()
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_scratch.name, 'plans.db')}"
+    os.environ.pop("ASYNC_DATABASE_URL", None)
+
+from alembic import command
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import event
+
+from database import DATABASE_URL, SessionLocal, engine
+from models import Game, GameShare
+import services
+
+user_service = services.UserService()
+game_service = services.GameService()
+asset_service = services.AssetService()
+
+# (name, query, table, index the plan must mention or None for any index/primary key, must avoid a sort)
+CHECKS = [
+    ("get_user_by_email", lambda db: user_service.get_user_by_email(db, "player@example.com"), "users", "ix_users_email", False),
+    ("list_user_games", lambda db: game_service.list_user_games(db, 1, 20), "games", "ix_games_owner_id_updated_at_id", True),
+    ("list_user_games (cursor)", lambda db: game_service.list_user_games(
+        db, 1, 20, services.encode_cursor(Game(id=100, updated_at=datetime.now(timezone.utc)))
+    ), "games", "ix_games_owner_id_updated_at_id", True),
+    ("get_game", lambda db: game_service.get_game(db, 1, 1), "games", None, False),
+    ("list_revisions", lambda db: db.execute(services._revisions_query(1)).all(), "game_revisions", None, True),
+    ("revision chain", lambda db: db.scalars(services._revision_chain_query(1, 30)).all(), "game_revisions", None, True),
+    ("get_user_assets", lambda db: asset_service.get_user_assets(db, 1), "assets", "ix_assets_owner_id_id", False),
+    ("get_asset", lambda db: asset_service.get_asset(db, 1, 1), "assets", None, False),
+    ("game shares", lambda db: db.query(GameShare).filter(GameShare.game_id == 1).all(), "game_shares", "ix_game_shares_game_id", False),
+    ("shared with email", lambda db: db.query(GameShare).filter(GameShare.shared_with_email == "player@example.com").all(), "game_shares", "ix_game_shares_shared_with_email", False),
+    ("claim generation job", lambda db: db.scalars(services._due_jobs_query(datetime.utcnow(), 5)).all(), "generation_jobs", "ix_generation_jobs_status_run_at", True),
+    ("get generation job", lambda db: db.scalars(services._job_query(1, 1)).all(), "generation_jobs", None, False),
+]
+
+def capture(run):
+    statements = []
+
+    def listener(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", listener)
+    db = SessionLocal()
+    try:
+        run(db)
+    finally:
+        db.close()
+        event.remove(engine, "before_cursor_execute", listener)
+    return statements
+
+def explain(statement, parameters):
+    with engine.connect() as conn:
+        if conn.dialect.name == "sqlite":
+            rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+            return [row[-1] for row in rows]
+        conn.exec_driver_sql("SET enable_seqscan = off")
+        conn.exec_driver_sql("SET enable_sort = off")
+        rows = conn.exec_driver_sql(f"EXPLAIN {statement}", parameters).fetchall()
+        return [row[0] for row in rows]
+
+def problems(plan, dialect, table, index, no_sort):
+    text = "\n".join(plan)
+    found = []
+    if dialect == "sqlite":
+        scans = [line for line in plan if line.startswith(f"SCAN {table}") and "INDEX" not in line]
+        if scans:
+            found.append(f"full scan: {scans[0]}")
+        if no_sort and "TEMP B-TREE" in text:
+            found.append("sorts instead of reading in index order")
+    else:
+        if f"Seq Scan on {table}" in text:
+            found.append(f"sequential scan on {table}")
+        if no_sort and "Sort" in text:
+            found.append("sorts instead of reading in index order")
+    if index and index not in text:
+        found.append(f"does not use {index}")
+    return found
+
+def alembic_config() -> Config:
+    config = Config(os.path.join(BACKEND, "alembic.ini"))
+    # alembic.ini's script_location is relative to the backend directory, not the caller's
+    config.set_main_option("script_location", os.path.join(BACKEND, "migrations"))
+    return config
+
+def schema_revision() -> tuple:
+    """(current, head) alembic revisions of the database"""
+    head = ScriptDirectory.from_config(alembic_config()).get_current_head()
+    with engine.connect() as conn:
+        current = MigrationContext.configure(conn).get_current_revision()
+    return current, head
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--migrate", action="store_true", help="run alembic upgrade head first (always done for the temporary database)")
+    args = parser.parse_args()
+
+    if args.migrate or _scratch is not None:
+        command.upgrade(alembic_config(), "head")
+    current, head = schema_revision()
+    if current != head:
+        print(f"❌ Schema is at {current or 'no revision'}, not head ({head}); run with --migrate or alembic upgrade head")
+        return 2
+
+    dialect = engine.dialect.name
+    print(f"Checking query plans on {dialect} ({DATABASE_URL.split('@')[-1]})")
+    failures = 0
+    for name, run, table, index, no_sort in CHECKS:
+        statements = capture(run)
+        if not statements:
+            print(f"❌ {name}: no query captured")
+            failures += 1
+            continue
+        statement, parameters = statements[0]
+        plan = explain(statement, parameters)
+        found = problems(plan, dialect, table, index, no_sort)
+        if found:
+            failures += 1
+            print(f"❌ {name}: {'; '.join(found)}")
+            for line in plan:
+                print(f"     {line}")
+        else:
+            print(f"✅ {name}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    try:
+        status = main()
+    finally:
+        engine.dispose()
+        if _scratch is not None:
+            _scratch.cleanup()
+    sys.exit(status)
@@ -0,0 +1,70 @@
+"""Report how much space the code blob store saves.
+
+Compares the code as it would be stored inline (one uncompressed copy per
+game) with what code_blobs actually holds (one compressed copy per distinct
+program), and lists the most shared programs.
+
+    python scripts/code_storage_report.py
+    python scripts/code_storage_report.py --prune   # also delete blobs no game references
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import delete, func, select
+
+from database import DATABASE_URL, SessionLocal
+from models import CodeBlob, Game
+
+def human(size: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.1f} {unit}"
+        size /= 1024
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--prune", action="store_true", help="delete blobs that no game references")
+    parser.add_argument("--top", type=int, default=5, help="number of most shared programs to list")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        games, inline = db.execute(
+            select(func.count(Game.id), func.coalesce(func.sum(CodeBlob.size), 0))
+            .join(CodeBlob, Game.code_hash == CodeBlob.hash)
+        ).one()
+        blobs, raw, stored = db.execute(
+            select(func.count(CodeBlob.hash), func.coalesce(func.sum(CodeBlob.size), 0), func.coalesce(func.sum(func.length(CodeBlob.data)), 0))
+        ).one()
+        referenced = select(Game.id).where(Game.code_hash == CodeBlob.hash).exists()
+        orphans = db.scalar(select(func.count(CodeBlob.hash)).where(~referenced))
+        shared = db.execute(
+            select(Game.code_hash, func.count(Game.id).label("games"))
+            .group_by(Game.code_hash).having(func.count(Game.id) > 1)
+            .order_by(func.count(Game.id).desc()).limit(args.top)
+        ).all()
+
+        print(f"Code storage on {DATABASE_URL.split('@')[-1]}")
+        print(f"  games:                 {games}")
+        print(f"  distinct programs:     {blobs} ({orphans} unreferenced)")
+        print(f"  inline (one per game): {human(inline)}")
+        print(f"  deduplicated:          {human(raw)}")
+        print(f"  stored (compressed):   {human(stored)}")
+        if stored:
+            print(f"  saved:                 {human(inline - stored)} ({inline / stored:.1f}x smaller)")
+        for code_hash, count in shared:
+            print(f"  {code_hash[:12]}  shared by {count} games")
+
+        if args.prune and orphans:
+            db.execute(delete(CodeBlob).where(~referenced))
+            db.commit()
+            print(f"🗑️ Deleted {orphans} unreferenced blobs")
+    finally:
+        db.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,49 @@
+"""Run generation job workers without the web app.
+
+The API process runs AI_JOB_WORKERS workers itself. To scale them
+separately, set AI_JOB_WORKERS=0 on the web instances and run this on
+worker instances against the same DATABASE_URL:
+
+    AI_JOB_WORKERS=8 python scripts/run_job_workers.py
+
+Stops on Ctrl+C / SIGTERM and hands running jobs back to the queue.
+"""
+import asyncio
+import os
+import signal
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import services
+from jobs import AI_JOB_WORKERS, JobWorkerPool
+from limits import build_rate_limiter
+from write_queue import build_write_queue
+
+async def run() -> int:
+    if AI_JOB_WORKERS <= 0:
+        print("❌ AI_JOB_WORKERS must be at least 1")
+        return 1
+    write_queue = build_write_queue()
+    game_service = services.AsyncGameService(writer=write_queue)
+    job_service = services.AsyncJobService(writer=write_queue)
+    ai_service = services.AIService()
+    # Set RATE_LIMIT_REDIS_URL so job usage counts against the budgets the API enforces
+    pool = JobWorkerPool(job_service, game_service, ai_service, limiter=build_rate_limiter())
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    await pool.start()
+    await stop.wait()
+    print("🛑 Stopping generation job workers")
+    await pool.stop()
+    ai_service.validator.close()
+    if write_queue is not None:
+        await write_queue.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(run()))
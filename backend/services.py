@@ -1,28 +1,207 @@
-from sqlalchemy.orm import Session
-from typing import List, Optional
-import anthropic
-import os
+from sqlalchemy import delete, func, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.sql import Select
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import AsyncIterator, Callable, Collection, List, Optional, Tuple
+from datetime import datetime, timedelta
+import asyncio
+import base64
+import hashlib
+import multiprocessing
+import time
 from dotenv import load_dotenv
-import openai
-from openai import OpenAI
 
-from models import User, Game, Asset, GameShare
+from models import User, Game, GameRevision, Asset, GameShare, CodeBlob, GenerationJob, JOB_QUEUED, JOB_RUNNING, JOB_SUCCEEDED, JOB_FAILED
 from schemas import UserCreate, GameCreate, GameUpdate, AssetCreate
-from auth import get_password_hash, verify_password
+from auth import hash_password, verify_and_update_password
+from providers import ProviderError, build_providers
+from router import AI_LATENCY_WINDOW, ProviderRouter, percentile
+from patching import AI_PATCH_ATTEMPTS, AI_PATCH_MAX_TOKENS, PatchError, apply_edit_blocks, parse_edit_blocks
+from cache import AI_CACHE_TTL, GenerationCache, SingleFlight, TTLCache, cache_key
+from codecheck import AI_VALIDATION, AI_VALIDATION_CACHE_SIZE, AI_VALIDATION_REPAIR, AI_VALIDATION_WORKERS, CodeCheck, check_code
+from scheduler import PRIORITY_GENERATE, PRIORITY_INTERACTIVE, FairScheduler, current_priority, scheduled_user
+from revisions import SNAPSHOT, new_revision, rebuild
+from jobs import AI_JOB_MAX_ATTEMPTS, JobError, LeaseLost
 
 load_dotenv()
 
+# Queries shared by the sync and async services
+def _existing_user_query(email: str, username: str) -> Select:
+    return select(User).where((User.email == email) | (User.username == username)).limit(1)
+
+def _user_by_email_query(email: str) -> Select:
+    return select(User).where(User.email == email).limit(1)
+
+def _user_games_query(user_id: int, limit: int, cursor: Optional[str]) -> Select:
+    # Code lives in code_blobs, so listing rows stay small without deferring anything
+    query = select(Game).where(Game.owner_id == user_id)
+    if cursor:
+        updated_at, game_id = decode_cursor(cursor)
+        query = query.where(tuple_(Game.updated_at, Game.id) < (updated_at, game_id))
+    # One extra row tells us whether there is another page
+    return query.order_by(Game.updated_at.desc(), Game.id.desc()).limit(limit + 1)
+
+def _user_games_fingerprint_query(user_id: int) -> Select:
+    # Any create, update or delete changes the count or the newest updated_at
+    return select(func.count(Game.id), func.max(Game.updated_at)).where(Game.owner_id == user_id)
+
+def _game_version_query(game_id: int, user_id: int) -> Select:
+    return select(Game.version).where(Game.id == game_id, Game.owner_id == user_id)
+
+def _game_query(game_id: int, user_id: int) -> Select:
+    return select(Game).options(joinedload(Game.blob)).where(Game.id == game_id, Game.owner_id == user_id)
+
+def _revisions_query(game_id: int) -> Select:
+    return select(
+        GameRevision.version,
+        GameRevision.kind,
+        GameRevision.size,
+        func.length(GameRevision.data).label("stored_bytes"),
+        GameRevision.created_at
+    ).where(GameRevision.game_id == game_id).order_by(GameRevision.version.desc())
+
+def _revision_chain_length_query(game_id: int) -> Select:
+    """Revisions from the game's latest snapshot on, that snapshot included"""
+    start = select(func.max(GameRevision.version)).where(
+        GameRevision.game_id == game_id,
+        GameRevision.kind == SNAPSHOT
+    ).scalar_subquery()
+    return select(func.count(GameRevision.id)).where(
+        GameRevision.game_id == game_id,
+        GameRevision.version >= start
+    )
+
+def _revision_chain_query(game_id: int, version: int) -> Select:
+    """Revisions from the closest snapshot at or before version up to version"""
+    start = select(func.max(GameRevision.version)).where(
+        GameRevision.game_id == game_id,
+        GameRevision.kind == SNAPSHOT,
+        GameRevision.version <= version
+    ).scalar_subquery()
+    return select(GameRevision).where(
+        GameRevision.game_id == game_id,
+        GameRevision.version >= start,
+        GameRevision.version <= version
+    ).order_by(GameRevision.version)
+
+def _delete_revisions_query(game_id: int):
+    return delete(GameRevision).where(GameRevision.game_id == game_id)
+
+def _user_assets_query(user_id: int) -> Select:
+    return select(Asset).where(Asset.owner_id == user_id)
+
+def _asset_query(asset_id: int, user_id: int) -> Select:
+    return select(Asset).where(Asset.id == asset_id, Asset.owner_id == user_id)
+
+def _job_query(job_id: int, user_id: int) -> Select:
+    return select(GenerationJob).where(GenerationJob.id == job_id, GenerationJob.owner_id == user_id)
+
+def _due_jobs_query(now: datetime, limit: int) -> Select:
+    return select(GenerationJob.id).where(
+        GenerationJob.status == JOB_QUEUED,
+        GenerationJob.run_at <= now
+    ).order_by(GenerationJob.run_at, GenerationJob.id).limit(limit)
+
+def _leased_job_update(job_id: int, worker: str):
+    """UPDATE of a running job that only applies while worker still holds its lease"""
+    return update(GenerationJob).where(
+        GenerationJob.id == job_id,
+        GenerationJob.status == JOB_RUNNING,
+        GenerationJob.worker == worker
+    )
+
+def _stale_jobs(cutoff: datetime):
+    return (GenerationJob.status == JOB_RUNNING) & (GenerationJob.heartbeat_at < cutoff)
+
+def encode_cursor(game: Game) -> str:
+    raw = f"{game.updated_at.isoformat()}|{game.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        updated_at, game_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(updated_at), int(game_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+def _page(games: List[Game], limit: int) -> Tuple[List[Game], Optional[str]]:
+    if len(games) <= limit:
+        return games, None
+    games = games[:limit]
+    return games, encode_cursor(games[-1])
+
+def _new_game(game: GameCreate, owner_id: int) -> Game:
+    return Game(
+        title=game.title,
+        description=game.description,
+        prompt=game.prompt,
+        code=game.code,
+        is_public=game.is_public,
+        game_metadata=game.metadata,
+        owner_id=owner_id
+    )
+
+def _apply_game_update(db_game: Game, game_update: GameUpdate) -> Optional[str]:
+    """Apply the update and bump the version.
+
+    Returns the code the game had before if the update changed it, else None:
+    metadata-only updates get a new version but no revision.
+    """
+    previous_code = db_game.code
+    update_data = game_update.dict(exclude_unset=True)
+    if "metadata" in update_data:
+        update_data["game_metadata"] = update_data.pop("metadata")
+    # Same hash, same program: leave code_hash alone so no blob is written
+    code = update_data.get("code")
+    if code is None or CodeBlob.hash_code(code) == db_game.code_hash:
+        update_data.pop("code", None)
+    for field, value in update_data.items():
+        setattr(db_game, field, value)
+
+    # Increment version
+    db_game.version += 1
+    return previous_code if "code" in update_data else None
+
+class VersionConflict(ValueError):
+    """Raised when a conditional update targets a version that is no longer current"""
+
+    def __init__(self, version: int):
+        super().__init__(f"Game is at version {version}")
+        self.version = version
+
+def _first_revision(db_game: Game) -> GameRevision:
+    return new_revision(db_game.id, db_game.version, db_game.code)
+
+def _revision_code(chain: List[GameRevision], version: int) -> Optional[str]:
+    # Versions from before revision history was kept have no chain
+    if not chain or chain[-1].version != version:
+        return None
+    return rebuild(chain)
+
+def _new_asset(asset: AssetCreate, owner_id: int) -> Asset:
+    return Asset(
+        filename=asset.filename,
+        original_filename=asset.original_filename,
+        file_url=asset.file_url,
+        file_type=asset.file_type,
+        file_size=asset.file_size,
+        tags=asset.tags,
+        owner_id=owner_id
+    )
+
 class UserService:
-    def create_user(self, db: Session, user: UserCreate) -> User:
+    async def create_user(self, db: Session, user: UserCreate) -> User:
         # Check if user already exists
-        existing_user = db.query(User).filter(
-            (User.email == user.email) | (User.username == user.username)
-        ).first()
+        existing_user = db.scalars(_existing_user_query(user.email, user.username)).first()
         if existing_user:
             raise ValueError("User with this email or username already exists")
         
         # Create new user
-        hashed_password = get_password_hash(user.password)
+        hashed_password = await hash_password(user.password)
         db_user = User(
             email=user.email,
             username=user.username,
@@ -33,52 +212,87 @@ class UserService:
         db.refresh(db_user)
         return db_user
     
-    def authenticate_user(self, db: Session, email: str, password: str) -> Optional[User]:
-        user = db.query(User).filter(User.email == email).first()
-        if not user or not verify_password(password, user.hashed_password):
+    async def authenticate_user(self, db: Session, email: str, password: str) -> Optional[User]:
+        user = self.get_user_by_email(db, email)
+        if not user:
             return None
+        valid, new_hash = await verify_and_update_password(password, user.hashed_password)
+        if not valid:
+            return None
+        if new_hash:
+            # Cost factor changed since this hash was made
+            user.hashed_password = new_hash
+            db.commit()
         return user
     
     def get_user_by_email(self, db: Session, email: str) -> Optional[User]:
-        return db.query(User).filter(User.email == email).first()
+        return db.scalars(_user_by_email_query(email)).first()
+
+class AsyncUserService:
+    """UserService for AsyncSession"""
+
+    async def create_user(self, db: AsyncSession, user: UserCreate) -> User:
+        existing_user = (await db.scalars(_existing_user_query(user.email, user.username))).first()
+        if existing_user:
+            raise ValueError("User with this email or username already exists")
+
+        hashed_password = await hash_password(user.password)
+        db_user = User(
+            email=user.email,
+            username=user.username,
+            hashed_password=hashed_password
+        )
+        db.add(db_user)
+        await db.commit()
+        await db.refresh(db_user)
+        return db_user
+
+    async def authenticate_user(self, db: AsyncSession, email: str, password: str) -> Optional[User]:
+        user = await self.get_user_by_email(db, email)
+        if not user:
+            return None
+        valid, new_hash = await verify_and_update_password(password, user.hashed_password)
+        if not valid:
+            return None
+        if new_hash:
+            # Cost factor changed since this hash was made
+            user.hashed_password = new_hash
+            await db.commit()
+        return user
+
+    async def get_user_by_email(self, db: AsyncSession, email: str) -> Optional[User]:
+        return (await db.scalars(_user_by_email_query(email))).first()
 
 class GameService:
     def create_game(self, db: Session, game: GameCreate, owner_id: int) -> Game:
-        db_game = Game(
-            title=game.title,
-            description=game.description,
-            prompt=game.prompt,
-            code=game.code,
-            is_public=game.is_public,
-            metadata=game.metadata,
-            owner_id=owner_id
-        )
+        db_game = _new_game(game, owner_id)
         db.add(db_game)
+        db.flush()
+        db.add(_first_revision(db_game))
         db.commit()
         db.refresh(db_game)
         return db_game
     
-    def get_user_games(self, db: Session, user_id: int) -> List[Game]:
-        return db.query(Game).filter(Game.owner_id == user_id).all()
+    def list_user_games(self, db: Session, user_id: int, limit: int = 20, cursor: Optional[str] = None) -> Tuple[List[Game], Optional[str]]:
+        """Return one page of games, newest first, without loading code.
+
+        Pages are keyed on (updated_at, id) so each page costs the same no
+        matter how far into the list it is.
+        """
+        return _page(list(db.scalars(_user_games_query(user_id, limit, cursor))), limit)
     
     def get_game(self, db: Session, game_id: int, user_id: int) -> Optional[Game]:
-        return db.query(Game).filter(
-            Game.id == game_id,
-            Game.owner_id == user_id
-        ).first()
+        return db.scalars(_game_query(game_id, user_id)).first()
     
     def update_game(self, db: Session, game_id: int, game_update: GameUpdate, user_id: int) -> Optional[Game]:
         db_game = self.get_game(db, game_id, user_id)
         if not db_game:
             return None
         
-        update_data = game_update.dict(exclude_unset=True)
-        for field, value in update_data.items():
-            setattr(db_game, field, value)
-        
-        # Increment version
-        db_game.version += 1
-        
+        previous_code = _apply_game_update(db_game, game_update)
+        if previous_code is not None:
+            chain_length = db.scalar(_revision_chain_length_query(game_id))
+            db.add(new_revision(game_id, db_game.version, db_game.code, previous_code, chain_length))
         db.commit()
         db.refresh(db_game)
         return db_game
@@ -88,6 +302,7 @@ class GameService:
         if not db_game:
             return False
         
+        db.execute(_delete_revisions_query(game_id))
         db.delete(db_game)
         db.commit()
         return True
@@ -109,109 +324,541 @@ class GameService:
         db.refresh(share)
         return share
 
+async def _insert_game(db: AsyncSession, game: GameCreate, owner_id: int) -> Game:
+    db_game = _new_game(game, owner_id)
+    db.add(db_game)
+    await db.flush()
+    db.add(_first_revision(db_game))
+    await db.flush()
+    await db.refresh(db_game)
+    return db_game
+
+async def _insert_games(db: AsyncSession, games: List[GameCreate], owner_id: int) -> List[Game]:
+    # Two multi-row INSERTs (games, then their first revisions) instead of two per game
+    db_games = [_new_game(game, owner_id) for game in games]
+    db.add_all(db_games)
+    await db.flush()
+    db.add_all([_first_revision(db_game) for db_game in db_games])
+    await db.flush()
+    return db_games
+
+async def _update_game(
+    db: AsyncSession, game_id: int, game_update: GameUpdate, user_id: int,
+    expected_versions: Optional[Collection[int]] = None
+) -> Optional[Game]:
+    db_game = (await db.scalars(_game_query(game_id, user_id))).first()
+    if not db_game:
+        return None
+    # Checked in the same transaction as the write, so two clients cannot both win
+    if expected_versions is not None and db_game.version not in expected_versions:
+        raise VersionConflict(db_game.version)
+    previous_code = _apply_game_update(db_game, game_update)
+    if previous_code is not None:
+        chain_length = await db.scalar(_revision_chain_length_query(game_id))
+        db.add(new_revision(game_id, db_game.version, db_game.code, previous_code, chain_length))
+    await db.flush()
+    await db.refresh(db_game)
+    return db_game
+
+async def _delete_game(db: AsyncSession, game_id: int, user_id: int) -> bool:
+    db_game = (await db.scalars(_game_query(game_id, user_id))).first()
+    if not db_game:
+        return False
+    await db.execute(_delete_revisions_query(game_id))
+    await db.delete(db_game)
+    await db.flush()
+    return True
+
+class _QueuedWrites:
+    """Runs write ops through a writer (a WriteQueue) when there is one, else on the given session"""
+
+    def __init__(self, writer=None):
+        self.writer = writer
+
+    async def _write(self, db: AsyncSession, op: Callable):
+        if self.writer is not None:
+            return await self.writer.submit(op)
+        result = await op(db)
+        await db.commit()
+        return result
+
+class AsyncGameService(_QueuedWrites):
+    """GameService for AsyncSession.
+
+    With a writer (a WriteQueue), creates, updates and deletes are committed
+    by the writer's session in batches instead of on the request session.
+    """
+
+    async def create_game(self, db: AsyncSession, game: GameCreate, owner_id: int) -> Game:
+        return await self._write(db, lambda session: _insert_game(session, game, owner_id))
+
+    async def create_games(self, db: AsyncSession, games: List[GameCreate], owner_id: int) -> List[Game]:
+        """Insert several games in one transaction; they are all saved or none is"""
+        return await self._write(db, lambda session: _insert_games(session, games, owner_id))
+
+    async def list_user_games(self, db: AsyncSession, user_id: int, limit: int = 20, cursor: Optional[str] = None) -> Tuple[List[Game], Optional[str]]:
+        """Return one page of games, newest first, without loading code"""
+        return _page(list(await db.scalars(_user_games_query(user_id, limit, cursor))), limit)
+
+    async def list_fingerprint(self, db: AsyncSession, user_id: int) -> Tuple[int, Optional[datetime]]:
+        """Game count and newest updated_at, which change whenever the listing does"""
+        count, updated_at = (await db.execute(_user_games_fingerprint_query(user_id))).one()
+        return count, updated_at
+
+    async def get_game(self, db: AsyncSession, game_id: int, user_id: int) -> Optional[Game]:
+        return (await db.scalars(_game_query(game_id, user_id))).first()
+
+    async def get_game_version(self, db: AsyncSession, game_id: int, user_id: int) -> Optional[int]:
+        """Current version without loading the game or its code"""
+        return await db.scalar(_game_version_query(game_id, user_id))
+
+    async def update_game(
+        self, db: AsyncSession, game_id: int, game_update: GameUpdate, user_id: int,
+        expected_versions: Optional[Collection[int]] = None
+    ) -> Optional[Game]:
+        """Update a game; with expected_versions, raise VersionConflict unless it is at one of them"""
+        return await self._write(
+            db, lambda session: _update_game(session, game_id, game_update, user_id, expected_versions)
+        )
+
+    async def delete_game(self, db: AsyncSession, game_id: int, user_id: int) -> bool:
+        return await self._write(db, lambda session: _delete_game(session, game_id, user_id))
+
+    async def list_revisions(self, db: AsyncSession, game_id: int, user_id: int) -> Optional[List[dict]]:
+        """Stored versions of a game, newest first, with their storage cost"""
+        if not await self.get_game(db, game_id, user_id):
+            return None
+        return [dict(row._mapping) for row in await db.execute(_revisions_query(game_id))]
+
+    async def get_revision(self, db: AsyncSession, game_id: int, version: int, user_id: int) -> Optional[dict]:
+        """Rebuild the code of one version from its snapshot and deltas"""
+        if not await self.get_game(db, game_id, user_id):
+            return None
+        chain = list(await db.scalars(_revision_chain_query(game_id, version)))
+        code = _revision_code(chain, version)
+        if code is None:
+            return None
+        return {"game_id": game_id, "version": version, "code": code, "created_at": chain[-1].created_at}
+
+    async def restore_revision(self, db: AsyncSession, game_id: int, version: int, user_id: int) -> Optional[Game]:
+        """Save an earlier version's code as a new version"""
+        revision = await self.get_revision(db, game_id, version, user_id)
+        if not revision:
+            return None
+        return await self.update_game(db, game_id, GameUpdate(code=revision["code"]), user_id)
+
+    async def share_game(self, db: AsyncSession, game_id: int, shared_with_email: str, can_edit: bool, user_id: int) -> Optional[GameShare]:
+        game = await self.get_game(db, game_id, user_id)
+        if not game:
+            return None
+
+        share = GameShare(
+            game_id=game_id,
+            shared_with_email=shared_with_email,
+            can_edit=can_edit
+        )
+        db.add(share)
+        await db.commit()
+        await db.refresh(share)
+        return share
+
+class AsyncJobService(_QueuedWrites):
+    """Durable queue of AI generation jobs in the generation_jobs table.
+
+    Jobs are claimed with a conditional UPDATE (queued -> running), so any
+    number of workers can drain the same queue and a job only runs in one of
+    them at a time. A claimed job is leased to its worker; outcomes are only
+    recorded while the lease is held, so a job requeued after its worker went
+    silent cannot be finished twice.
+    """
+
+    async def enqueue(
+        self, db: AsyncSession, kind: str, owner_id: int, prompt: str,
+        game_id: Optional[int] = None, params: Optional[dict] = None
+    ) -> GenerationJob:
+        async def op(session: AsyncSession) -> GenerationJob:
+            job = GenerationJob(
+                kind=kind,
+                status=JOB_QUEUED,
+                owner_id=owner_id,
+                game_id=game_id,
+                prompt=prompt,
+                params=params or {},
+                attempts=0,
+                max_attempts=AI_JOB_MAX_ATTEMPTS,
+                run_at=datetime.utcnow()
+            )
+            session.add(job)
+            await session.flush()
+            await session.refresh(job)
+            return job
+        return await self._write(db, op)
+
+    async def get_job(self, db: AsyncSession, job_id: int, user_id: int) -> Optional[GenerationJob]:
+        return (await db.scalars(_job_query(job_id, user_id))).first()
+
+    async def claim(self, db: AsyncSession, worker: str, candidates: int = 5) -> Optional[GenerationJob]:
+        """Lease the oldest due job to worker, or return None if there is none"""
+        async def op(session: AsyncSession) -> Optional[GenerationJob]:
+            now = datetime.utcnow()
+            for job_id in list(await session.scalars(_due_jobs_query(now, candidates))):
+                # Another worker may claim the same row first; then rowcount is 0
+                result = await session.execute(
+                    update(GenerationJob)
+                    .where(GenerationJob.id == job_id, GenerationJob.status == JOB_QUEUED)
+                    .values(status=JOB_RUNNING, worker=worker, heartbeat_at=now, attempts=GenerationJob.attempts + 1)
+                )
+                if result.rowcount == 1:
+                    return await session.get(GenerationJob, job_id, populate_existing=True)
+            return None
+        return await self._write(db, op)
+
+    async def heartbeat(self, db: AsyncSession, job_id: int, worker: str) -> bool:
+        """Renew the lease; False if worker no longer holds it"""
+        async def op(session: AsyncSession) -> bool:
+            result = await session.execute(_leased_job_update(job_id, worker).values(heartbeat_at=datetime.utcnow()))
+            return result.rowcount == 1
+        return await self._write(db, op)
+
+    async def complete(self, db: AsyncSession, job: GenerationJob, worker: str, code: str):
+        """Record the result and, if the job asked for it, save it to the game in the same transaction"""
+        params = job.params or {}
+
+        async def op(session: AsyncSession):
+            values = {"status": JOB_SUCCEEDED, "code": code, "error": None, "worker": None, "finished_at": datetime.utcnow()}
+            if params.get("save"):
+                if job.kind == "generate":
+                    game = await _insert_game(
+                        session,
+                        GameCreate(title=params.get("title") or job.prompt[:50], prompt=job.prompt, code=code),
+                        job.owner_id
+                    )
+                else:
+                    game = await _update_game(session, job.game_id, GameUpdate(code=code), job.owner_id)
+                    if game is None:
+                        raise JobError("Game not found")
+                values.update(game_id=game.id, version=game.version)
+            result = await session.execute(_leased_job_update(job.id, worker).values(**values))
+            if result.rowcount != 1:
+                # Rolls back the game write too
+                raise LeaseLost(job.id)
+        await self._write(db, op)
+
+    async def retry(self, db: AsyncSession, job: GenerationJob, worker: str, error: str, delay: float):
+        """Put the job back in the queue, due after delay seconds"""
+        async def op(session: AsyncSession):
+            await session.execute(_leased_job_update(job.id, worker).values(
+                status=JOB_QUEUED, worker=None, heartbeat_at=None, error=error,
+                run_at=datetime.utcnow() + timedelta(seconds=delay)
+            ))
+        await self._write(db, op)
+
+    async def fail(self, db: AsyncSession, job: GenerationJob, worker: str, error: str):
+        async def op(session: AsyncSession):
+            await session.execute(_leased_job_update(job.id, worker).values(
+                status=JOB_FAILED, worker=None, error=error, finished_at=datetime.utcnow()
+            ))
+        await self._write(db, op)
+
+    async def release(self, db: AsyncSession, job: GenerationJob, worker: str):
+        """Requeue an interrupted job without counting the attempt"""
+        async def op(session: AsyncSession):
+            await session.execute(_leased_job_update(job.id, worker).values(
+                status=JOB_QUEUED, worker=None, heartbeat_at=None,
+                attempts=GenerationJob.attempts - 1, run_at=datetime.utcnow()
+            ))
+        await self._write(db, op)
+
+    async def requeue_stale(self, db: AsyncSession, lease: float) -> Tuple[int, int]:
+        """Requeue running jobs whose worker missed its heartbeats; fail those out of attempts"""
+        async def op(session: AsyncSession) -> Tuple[int, int]:
+            now = datetime.utcnow()
+            stale = _stale_jobs(now - timedelta(seconds=lease))
+            failed = await session.execute(
+                update(GenerationJob)
+                .where(stale, GenerationJob.attempts >= GenerationJob.max_attempts)
+                .values(status=JOB_FAILED, worker=None, error="Worker stopped responding", finished_at=now)
+            )
+            requeued = await session.execute(
+                update(GenerationJob).where(stale).values(status=JOB_QUEUED, worker=None, heartbeat_at=None, run_at=now)
+            )
+            return requeued.rowcount, failed.rowcount
+        return await self._write(db, op)
+
+    async def purge(self, db: AsyncSession, retention: float) -> int:
+        """Delete jobs that finished more than retention seconds ago"""
+        async def op(session: AsyncSession) -> int:
+            result = await session.execute(delete(GenerationJob).where(
+                GenerationJob.status.in_((JOB_SUCCEEDED, JOB_FAILED)),
+                GenerationJob.finished_at < datetime.utcnow() - timedelta(seconds=retention)
+            ))
+            return result.rowcount
+        return await self._write(db, op)
+
+    async def counts(self, db: AsyncSession) -> dict:
+        """Jobs per status"""
+        rows = await db.execute(select(GenerationJob.status, func.count(GenerationJob.id)).group_by(GenerationJob.status))
+        return {status: count for status, count in rows}
+
+GENERATE_SYSTEM_PROMPT = """You are an expert game developer who creates Python/Pygame games from natural language descriptions.
+Generate complete, runnable game code that includes:
+- All necessary imports
+- Game initialization
+- Main game loop
+- Player controls
+- Game mechanics
+- Basic graphics and sound
+
+Return ONLY the Python code, no explanations."""
+
+UPDATE_SYSTEM_PROMPT = """You are an expert game developer. Update the provided Python/Pygame game code based on the user's request.
+Return ONLY the updated Python code, no explanations."""
+
+EDIT_SYSTEM_PROMPT = """You are an expert game developer. Update the provided Python/Pygame game code based on the user's request.
+Reply ONLY with one or more edit blocks in this exact format:
+
+<<<<<<< SEARCH
+lines copied exactly from the current code
+=======
+the lines that replace them
+>>>>>>> REPLACE
+
+Each SEARCH section must match the current code exactly, including indentation, and must match only one place.
+Include just enough surrounding lines to make it unique. To add code, search for the lines next to where it goes
+and repeat them in the replacement. Do not rewrite the whole program and do not add explanations."""
+
+# Size of the pieces fallback and cached code are streamed in
+FALLBACK_CHUNK_SIZE = 256
+
+async def _chunked(code: str) -> AsyncIterator[str]:
+    for i in range(0, len(code), FALLBACK_CHUNK_SIZE):
+        yield code[i:i + FALLBACK_CHUNK_SIZE]
+        await asyncio.sleep(0)
+
+class CodeValidator:
+    """Runs codecheck.check_code in a process pool and caches results by code hash.
+
+    Parsing and compiling a generated program is a few milliseconds of CPU,
+    and on the event loop that stalls every other request; in the pool the
+    loop only waits. Workers are spawned on first use, not forked, so they
+    do not inherit the app's threads and connections.
+    """
+
+    def __init__(self, workers: int = AI_VALIDATION_WORKERS, cache_size: int = AI_VALIDATION_CACHE_SIZE):
+        self.workers = workers
+        self.cache = TTLCache(maxsize=cache_size, ttl=AI_CACHE_TTL)
+        self.hits = 0
+        self.misses = 0
+        self.repaired = 0
+        self.rejected = 0
+        self.latencies = deque(maxlen=AI_LATENCY_WINDOW)
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    def warm(self):
+        """Start the workers in the background, so the first generation does not wait for them"""
+        if self.workers > 0:
+            pool = self._executor()
+            for _ in range(self.workers):
+                pool.submit(check_code, "")
+
+    async def check(self, text: str) -> CodeCheck:
+        key = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        result = self.cache.get(key)
+        if result is not None:
+            self.hits += 1
+            return result
+        self.misses += 1
+        start = time.perf_counter()
+        if self.workers <= 0:
+            result = check_code(text)
+        else:
+            try:
+                result = await asyncio.get_running_loop().run_in_executor(self._executor(), check_code, text)
+            except BrokenProcessPool:
+                # A worker died (e.g. killed for memory); start a new pool next time
+                print("❌ Code validation pool broke, checking on the event loop")
+                self._pool = None
+                result = check_code(text)
+        self.latencies.append(time.perf_counter() - start)
+        self.cache.set(key, result)
+        return result
+
+    def close(self):
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "hits": self.hits,
+            "misses": self.misses,
+            "repaired": self.repaired,
+            "rejected": self.rejected,
+            "latency_p50": percentile(self.latencies, 0.5),
+            "latency_p95": percentile(self.latencies, 0.95)
+        }
+
+def _repair_prompt(prompt: str, check: CodeCheck) -> str:
+    problems = "\n".join(f"- {problem}" for problem in check.problems)
+    return (
+        f"{prompt}\n\nYour previous reply was:\n\n{check.code}\n\n"
+        f"It has these problems:\n{problems}\n"
+        "Reply again with the complete corrected program."
+    )
+
 class AIService:
     def __init__(self):
-        self.anthropic_client = None
-        self.openai_client = None
-        self.use_fallback = False
-        
-        # Try to initialize Anthropic
-        anthropic_key = os.getenv("ANTHROPIC_API_KEY")
-        if anthropic_key:
-            try:
-                self.anthropic_client = anthropic.Anthropic(api_key=anthropic_key)
-                print("✅ Anthropic API initialized")
-            except Exception as e:
-                print(f"❌ Failed to initialize Anthropic: {e}")
-        
-        # Try to initialize OpenAI as fallback
-        openai_key = os.getenv("OPENAI_API_KEY")
-        if openai_key:
-            try:
-                self.openai_client = OpenAI(api_key=openai_key)
-                print("✅ OpenAI API initialized as fallback")
-            except Exception as e:
-                print(f"❌ Failed to initialize OpenAI: {e}")
-        
+        self.providers = build_providers()
+        self.use_fallback = not self.providers
+        self.router = ProviderRouter(self.providers)
+        self.model_key = ",".join(provider.model for provider in self.providers)
+        self.cache = GenerationCache()
+        self.inflight = SingleFlight()
+        # Queues provider calls fairly once every slot is taken
+        self.scheduler = FairScheduler()
+        self.validator = CodeValidator()
+
         # If no AI providers available, use fallback mode
-        if not self.anthropic_client and not self.openai_client:
-            self.use_fallback = True
+        if self.use_fallback:
             print("⚠️ No AI API keys found - using fallback mode")
 
-    def generate_game_code(self, prompt: str) -> str:
-        """Generate game code from natural language prompt"""
-        
-        if self.anthropic_client:
-            return self._generate_with_anthropic(prompt)
-        elif self.openai_client:
-            return self._generate_with_openai(prompt)
-        else:
-            return self._generate_fallback(prompt)
+    def _slot(self, priority: str):
+        """A scheduler slot for one provider call; run_as() in the caller's context overrides priority"""
+        return self.scheduler.slot(current_priority(priority), scheduled_user())
 
-    def _generate_with_anthropic(self, prompt: str) -> str:
-        """Generate using Anthropic Claude"""
+    async def _complete(
+        self, system: str, prompt: str, max_tokens: int = 4000, fallback: bool = True, priority: str = PRIORITY_GENERATE
+    ) -> Optional[str]:
+        """Complete through the provider router, returning None if every provider fails.
+
+        With fallback off the ProviderError is raised instead, for callers
+        that retry later rather than settle for the fallback game.
+        """
         try:
-            response = self.anthropic_client.messages.create(
-                model="claude-3-sonnet-20240229",
-                max_tokens=4000,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": """You are an expert game developer who creates Python/Pygame games from natural language descriptions. 
-                        Generate complete, runnable game code that includes:
-                        - All necessary imports
-                        - Game initialization
-                        - Main game loop
-                        - Player controls
-                        - Game mechanics
-                        - Basic graphics and sound
-                        
-                        Return ONLY the Python code, no explanations."""
-                    },
-                    {
-                        "role": "user",
-                        "content": f"Create a 2D game based on this description: {prompt}"
-                    }
-                ]
-            )
-            return response.content[0].text
-        except Exception as e:
-            print(f"Anthropic API error: {e}")
-            if self.openai_client:
-                return self._generate_with_openai(prompt)
-            else:
-                return self._generate_fallback(prompt)
-
-    def _generate_with_openai(self, prompt: str) -> str:
-        """Generate using OpenAI GPT"""
+            async with self._slot(priority):
+                return await self.router.complete(system, prompt, max_tokens)
+        except ProviderError as e:
+            if not fallback:
+                raise
+            print(f"❌ AI providers failed: {e}")
+            return None
+
+    async def _validated(
+        self, code: str, system: str, prompt: str, fallback: bool = True, priority: str = PRIORITY_GENERATE
+    ) -> Optional[str]:
+        """Strip fences from a completion and check it, asking once for a fix if it fails.
+
+        Code that still does not compile is treated like a provider failure:
+        None, or ProviderError with fallback off. Code that compiles but lacks
+        part of the pygame skeleton is returned anyway.
+        """
+        if not AI_VALIDATION:
+            return code
+        check = await self.validator.check(code)
+        if check.ok:
+            return check.code
+        print(f"⚠️ Generated code failed validation: {'; '.join(check.problems)}")
+        if AI_VALIDATION_REPAIR:
+            reply = await self._complete(system, _repair_prompt(prompt, check), fallback=fallback, priority=priority)
+            if reply is not None:
+                repaired = await self.validator.check(reply)
+                if repaired.ok or (repaired.compiles and not check.compiles):
+                    self.validator.repaired += 1
+                    check = repaired
+        if check.compiles:
+            return check.code
+        self.validator.rejected += 1
+        if not fallback:
+            raise ProviderError(f"Generated code does not compile: {check.problems[0]}")
+        return None
+
+    async def streamed_code(self, text: str) -> str:
+        """Strip fences from a finished stream's text and check it before it is saved.
+
+        The client already has the text, so there is no repair round-trip:
+        code that does not compile raises ProviderError. As in _validated,
+        code that compiles but lacks part of the pygame skeleton is kept.
+        """
+        if not AI_VALIDATION:
+            return text
+        check = await self.validator.check(text)
+        if not check.compiles:
+            self.validator.rejected += 1
+            raise ProviderError(f"Generated code does not compile: {check.problems[0]}")
+        return check.code
+
+    async def _stream(
+        self, system: str, prompt: str, fallback: Callable[[], str], key: Optional[str] = None, priority: str = PRIORITY_GENERATE
+    ) -> AsyncIterator[str]:
+        """Stream through the provider router, falling back if nothing was produced.
+
+        Once text has been sent a provider error is raised, since the client
+        already has part of the output.
+        """
+        if self.use_fallback:
+            async for chunk in _chunked(fallback()):
+                yield chunk
+            return
+
+        parts = []
         try:
-            response = self.openai_client.chat.completions.create(
-                model="gpt-4",
-                max_tokens=4000,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": """You are an expert game developer who creates Python/Pygame games from natural language descriptions. 
-                        Generate complete, runnable game code that includes:
-                        - All necessary imports
-                        - Game initialization
-                        - Main game loop
-                        - Player controls
-                        - Game mechanics
-                        - Basic graphics and sound
-                        
-                        Return ONLY the Python code, no explanations."""
-                    },
-                    {
-                        "role": "user",
-                        "content": f"Create a 2D game based on this description: {prompt}"
-                    }
-                ]
-            )
-            return response.choices[0].message.content
-        except Exception as e:
-            print(f"OpenAI API error: {e}")
+            async with self._slot(priority):
+                async for chunk in self.router.stream(system, prompt):
+                    parts.append(chunk)
+                    yield chunk
+        except ProviderError as e:
+            if parts:
+                raise
+            print(f"❌ AI providers failed: {e}")
+            async for chunk in _chunked(fallback()):
+                yield chunk
+            return
+
+        if key is not None:
+            # The client already has the text; only cache it if it passes the checks
+            check = await self.validator.check("".join(parts)) if AI_VALIDATION else None
+            if check is None or check.ok:
+                await self.cache.set(key, check.code if check else "".join(parts), self.model_key)
+
+    def _generation_key(self, prompt: str) -> str:
+        return cache_key(prompt, self.model_key, GENERATE_SYSTEM_PROMPT)
+
+    async def generate_game_code(self, prompt: str, use_cache: bool = True, fallback: bool = True) -> str:
+        """Generate game code from natural language prompt.
+
+        If every provider fails this returns the fallback game, or with
+        fallback=False raises ProviderError.
+        """
+        if self.use_fallback:
+            return self._generate_fallback(prompt)
+
+        key = self._generation_key(prompt)
+        if not use_cache:
+            return await self._generate_and_cache(key, prompt, fallback)
+
+        code = await self.cache.get(key)
+        if code is not None:
+            return code
+        # Identical prompts already in flight share one provider call. Callers
+        # that want errors raised get their own flight, not a fallback game
+        flight = key if fallback else f"{key}:raise"
+        return await self.inflight.do(flight, lambda: self._generate_and_cache(key, prompt, fallback))
+
+    async def _generate_and_cache(self, key: str, prompt: str, fallback: bool = True) -> str:
+        request = f"Create a 2D game based on this description: {prompt}"
+        code = await self._complete(GENERATE_SYSTEM_PROMPT, request, fallback=fallback)
+        if code is not None:
+            code = await self._validated(code, GENERATE_SYSTEM_PROMPT, request, fallback=fallback)
+        if code is None:
             return self._generate_fallback(prompt)
+        await self.cache.set(key, code, self.model_key)
+        return code
 
     def _generate_fallback(self, prompt: str) -> str:
         """Generate a simple fallback game when no AI is available"""
@@ -279,64 +926,83 @@ while running:
 
 pygame.quit()'''
 
-    def update_game_code(self, existing_code: str, update_prompt: str) -> str:
-        """Update existing game code based on new prompt"""
-        
-        if self.anthropic_client:
-            return self._update_with_anthropic(existing_code, update_prompt)
-        elif self.openai_client:
-            return self._update_with_openai(existing_code, update_prompt)
-        else:
+    async def stream_game_code(self, prompt: str, use_cache: bool = True) -> AsyncIterator[str]:
+        """Stream generated game code as it is produced"""
+        key = None
+        if not self.use_fallback:
+            key = self._generation_key(prompt)
+            code = await self.cache.get(key) if use_cache else None
+            if code is not None:
+                async for chunk in _chunked(code):
+                    yield chunk
+                return
+
+        async for chunk in self._stream(
+            GENERATE_SYSTEM_PROMPT,
+            f"Create a 2D game based on this description: {prompt}",
+            lambda: self._generate_fallback(prompt),
+            key
+        ):
+            yield chunk
+
+    async def update_game_code(self, existing_code: str, update_prompt: str, mode: str = "patch", fallback: bool = True) -> str:
+        """Update existing game code based on new prompt.
+
+        In patch mode the model returns search/replace edits, which are much
+        shorter than the program; if they cannot be applied the full rewrite
+        is used instead. Provider failures are handled as in generate_game_code.
+        """
+        if self.use_fallback:
             return self._update_fallback(existing_code, update_prompt)
 
-    def _update_with_anthropic(self, existing_code: str, update_prompt: str) -> str:
-        """Update using Anthropic Claude"""
-        try:
-            response = self.anthropic_client.messages.create(
-                model="claude-3-sonnet-20240229",
-                max_tokens=4000,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": """You are an expert game developer. Update the provided Python/Pygame game code based on the user's request.
-                        Return ONLY the updated Python code, no explanations."""
-                    },
-                    {
-                        "role": "user",
-                        "content": f"Here's the current game code:\n\n{existing_code}\n\nUpdate it based on this request: {update_prompt}"
-                    }
-                ]
-            )
-            return response.content[0].text
-        except Exception as e:
-            print(f"Anthropic API error: {e}")
-            if self.openai_client:
-                return self._update_with_openai(existing_code, update_prompt)
-            else:
+        if mode == "patch":
+            try:
+                code = await self._update_with_patches(existing_code, update_prompt)
+            except ProviderError as e:
+                if not fallback:
+                    raise
+                print(f"❌ AI providers failed: {e}")
                 return self._update_fallback(existing_code, update_prompt)
+            if code is not None:
+                return code
 
-    def _update_with_openai(self, existing_code: str, update_prompt: str) -> str:
-        """Update using OpenAI GPT"""
-        try:
-            response = self.openai_client.chat.completions.create(
-                model="gpt-4",
-                max_tokens=4000,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": """You are an expert game developer. Update the provided Python/Pygame game code based on the user's request.
-                        Return ONLY the updated Python code, no explanations."""
-                    },
-                    {
-                        "role": "user",
-                        "content": f"Here's the current game code:\n\n{existing_code}\n\nUpdate it based on this request: {update_prompt}"
-                    }
-                ]
-            )
-            return response.choices[0].message.content
-        except Exception as e:
-            print(f"OpenAI API error: {e}")
+        request = f"Here's the current game code:\n\n{existing_code}\n\nUpdate it based on this request: {update_prompt}"
+        code = await self._complete(UPDATE_SYSTEM_PROMPT, request, fallback=fallback, priority=PRIORITY_INTERACTIVE)
+        if code is not None:
+            code = await self._validated(code, UPDATE_SYSTEM_PROMPT, request, fallback=fallback, priority=PRIORITY_INTERACTIVE)
+        if code is None:
             return self._update_fallback(existing_code, update_prompt)
+        return code
+
+    async def _update_with_patches(self, existing_code: str, update_prompt: str) -> Optional[str]:
+        """Ask for edit blocks and apply them, feeding apply errors back for a retry"""
+        prompt = f"Here's the current game code:\n\n{existing_code}\n\nUpdate it based on this request: {update_prompt}"
+        for attempt in range(AI_PATCH_ATTEMPTS):
+            async with self._slot(PRIORITY_INTERACTIVE):
+                reply = await self.router.complete(EDIT_SYSTEM_PROMPT, prompt, AI_PATCH_MAX_TOKENS)
+            try:
+                code = apply_edit_blocks(existing_code, parse_edit_blocks(reply))
+                check = await self.validator.check(code)
+                if not check.compiles:
+                    raise PatchError(f"Patched code does not compile: {check.problems[0]}")
+                return code
+            except PatchError as e:
+                print(f"⚠️ Could not apply edit (attempt {attempt + 1}): {e}")
+                prompt = (
+                    f"{prompt}\n\nYour previous reply was:\n\n{reply}\n\n"
+                    f"It could not be applied: {e}\n"
+                    "Reply again with corrected SEARCH/REPLACE blocks against the original code."
+                )
+        return None
+
+    def stream_update_code(self, existing_code: str, update_prompt: str) -> AsyncIterator[str]:
+        """Stream updated game code as it is produced"""
+        return self._stream(
+            UPDATE_SYSTEM_PROMPT,
+            f"Here's the current game code:\n\n{existing_code}\n\nUpdate it based on this request: {update_prompt}",
+            lambda: self._update_fallback(existing_code, update_prompt),
+            priority=PRIORITY_INTERACTIVE
+        )
 
     def _update_fallback(self, existing_code: str, update_prompt: str) -> str:
         """Fallback update - just return the original code with a comment"""
@@ -347,25 +1013,30 @@ pygame.quit()'''
 
 class AssetService:
     def create_asset(self, db: Session, asset: AssetCreate, owner_id: int) -> Asset:
-        db_asset = Asset(
-            filename=asset.filename,
-            original_filename=asset.original_filename,
-            file_url=asset.file_url,
-            file_type=asset.file_type,
-            file_size=asset.file_size,
-            tags=asset.tags,
-            owner_id=owner_id
-        )
+        db_asset = _new_asset(asset, owner_id)
         db.add(db_asset)
         db.commit()
         db.refresh(db_asset)
         return db_asset
     
     def get_user_assets(self, db: Session, user_id: int) -> List[Asset]:
-        return db.query(Asset).filter(Asset.owner_id == user_id).all()
+        return list(db.scalars(_user_assets_query(user_id)))
     
     def get_asset(self, db: Session, asset_id: int, user_id: int) -> Optional[Asset]:
-        return db.query(Asset).filter(
-            Asset.id == asset_id,
-            Asset.owner_id == user_id
-        ).first()
+        return db.scalars(_asset_query(asset_id, user_id)).first()
+
+class AsyncAssetService:
+    """AssetService for AsyncSession"""
+
+    async def create_asset(self, db: AsyncSession, asset: AssetCreate, owner_id: int) -> Asset:
+        db_asset = _new_asset(asset, owner_id)
+        db.add(db_asset)
+        await db.commit()
+        await db.refresh(db_asset)
+        return db_asset
+
+    async def get_user_assets(self, db: AsyncSession, user_id: int) -> List[Asset]:
+        return list(await db.scalars(_user_assets_query(user_id)))
+
+    async def get_asset(self, db: AsyncSession, asset_id: int, user_id: int) -> Optional[Asset]:
+        return (await db.scalars(_asset_query(asset_id, user_id))).first()
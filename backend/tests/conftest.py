@@ -0,0 +1,17 @@
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+# The app modules read their configuration when they are imported, so this
+# runs first: a throwaway SQLite database, and no provider keys or Redis
+# (set empty rather than removed, so a local .env cannot fill them in)
+_scratch = tempfile.mkdtemp(prefix="vibr-tests-")
+atexit.register(shutil.rmtree, _scratch, True)
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_scratch, 'vibr.db')}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+for name in ("ANTHROPIC_API_KEY", "OPENAI_API_KEY", "RATE_LIMIT_REDIS_URL"):
+    os.environ[name] = ""
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
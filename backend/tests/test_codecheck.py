@@ -0,0 +1,112 @@
+import asyncio
+
+import pytest
+
+from cache import GenerationCache
+from codecheck import check_code, strip_fences
+from providers import AIProvider, ProviderError
+from router import ProviderRouter
+from services import AIService, CodeValidator
+
+GAME = """import pygame
+
+pygame.init()
+screen = pygame.display.set_mode((800, 600))
+running = True
+while running:
+    running = False
+pygame.quit()"""
+
+BROKEN = "import pygame\n\ndef update(:\n    pass\n"
+
+class ScriptedProvider(AIProvider):
+    """Replies with each of replies in turn, repeating the last one"""
+    name = label = "scripted"
+
+    def __init__(self, *replies):
+        super().__init__("scripted-model")
+        self.replies = list(replies)
+        self.calls = 0
+
+    async def _stream(self, system, prompt, max_tokens):
+        self.calls += 1
+        yield self.replies[min(self.calls, len(self.replies)) - 1]
+
+def _service(*replies):
+    service = AIService()
+    service.providers = [ScriptedProvider(*replies)]
+    service.router = ProviderRouter(service.providers)
+    service.use_fallback = False
+    service.cache = GenerationCache(persist=False)
+    service.validator = CodeValidator(workers=0)
+    return service
+
+@pytest.mark.parametrize("reply", [
+    f"```python\n{GAME}\n```",
+    f"```\n{GAME}\n```",
+    f"Here is your game:\n\n```py\n{GAME}\n```\n\nRun it with python game.py.",
+    f"```python\n{GAME}",  # cut off before the closing fence
+    GAME,
+])
+def test_strip_fences(reply):
+    assert strip_fences(reply) == GAME
+
+def test_longest_fenced_block_is_the_program():
+    reply = f"```python\n{GAME}\n```\n\nUsage:\n\n```bash\npython game.py\n```"
+    assert strip_fences(reply) == GAME
+
+def test_complete_game_passes():
+    check = check_code(f"```python\n{GAME}\n```")
+    assert check.ok and check.compiles and check.code == GAME
+
+def test_syntax_error_reports_the_line():
+    check = check_code(BROKEN)
+    assert not check.compiles
+    assert check.problems == ["Syntax error on line 3: invalid syntax"]
+
+def test_compile_errors_the_parser_misses_are_caught():
+    check = check_code("import pygame\nreturn 1\n")
+    assert not check.compiles and "'return' outside function" in check.problems[0]
+
+def test_missing_skeleton_is_reported_but_compiles():
+    check = check_code("import pygame as pg\npg.init()\nscreen = pg.display.set_mode((1, 1))\n")
+    assert check.compiles
+    assert check.problems == ["Missing pygame.quit()", "Missing a main loop (while ...)"]
+
+def test_validator_caches_results_by_code_hash():
+    async def scenario():
+        validator = CodeValidator(workers=0)
+        first = await validator.check(GAME)
+        second = await validator.check(GAME)
+        await validator.check(BROKEN)
+        return first, second, validator.stats()
+
+    first, second, stats = asyncio.run(scenario())
+    assert second is first
+    assert (stats["hits"], stats["misses"]) == (1, 2)
+
+def test_failed_code_is_repaired_once():
+    service = _service(BROKEN, f"```python\n{GAME}\n```")
+    code = asyncio.run(service.generate_game_code("a game", use_cache=False))
+    assert code == GAME
+    assert service.providers[0].calls == 2
+    assert service.validator.repaired == 1
+
+def test_failed_repair_falls_back_to_the_fallback_game():
+    service = _service(BROKEN)
+    code = asyncio.run(service.generate_game_code("a game", use_cache=False))
+    assert code == service._generate_fallback("a game")
+    assert service.providers[0].calls == 2
+    assert service.validator.rejected == 1
+
+def test_failed_repair_raises_without_fallback():
+    service = _service(BROKEN)
+    with pytest.raises(ProviderError, match="does not compile"):
+        asyncio.run(service.generate_game_code("a game", use_cache=False, fallback=False))
+
+def test_streamed_code_is_stripped_and_checked():
+    service = _service()
+    assert asyncio.run(service.streamed_code(f"```python\n{GAME}\n```")) == GAME
+    with pytest.raises(ProviderError, match="Syntax error on line 3"):
+        asyncio.run(service.streamed_code(BROKEN))
+    assert service.validator.rejected == 1
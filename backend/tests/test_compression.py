@@ -0,0 +1,74 @@
+import pytest
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse, Response
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+import compression
+from compression import CompressionMiddleware, choose_encoding, decoded_etag, encoded_etag
+
+BODY = "pygame " * 500
+ETAG = '"g1-v2"'
+
+async def game(request: Request):
+    # As the app does: compare the client's tags with the encoding suffix stripped
+    sent = [decoded_etag(tag.strip()) for tag in request.headers.get("if-none-match", "").split(",")]
+    if ETAG in sent:
+        return Response(status_code=304, headers={"ETag": ETAG})
+    return PlainTextResponse(BODY, headers={"ETag": ETAG})
+
+@pytest.fixture
+def client():
+    app = Starlette(routes=[Route("/game", game)])
+    app.add_middleware(CompressionMiddleware)
+    return TestClient(app)
+
+@pytest.mark.parametrize("accept_encoding, encoding", [
+    ("gzip, deflate, br", "br" if compression.brotli else "gzip"),
+    ("gzip, br;q=0", "gzip"),
+    ("identity", None),
+    ("", None),
+])
+def test_choose_encoding(accept_encoding, encoding):
+    assert choose_encoding(accept_encoding) == encoding
+
+def test_etag_suffix_round_trips():
+    assert encoded_etag(ETAG, "gzip") == '"g1-v2-gzip"'
+    assert decoded_etag(encoded_etag(ETAG, "br")) == ETAG
+    assert decoded_etag(ETAG) == ETAG
+
+def test_compressed_response_has_its_own_etag(client):
+    response = client.get("/game", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["etag"] == '"g1-v2-gzip"'
+    assert response.text == BODY  # decoded by the client
+    assert response.headers["vary"] == "Accept-Encoding"
+    plain = client.get("/game", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers and plain.headers["etag"] == ETAG
+    # Shared caches must not hand this copy to clients that accept gzip
+    assert plain.headers["vary"] == "Accept-Encoding"
+
+@pytest.mark.parametrize("if_none_match, etag", [('"g1-v2-gzip"', '"g1-v2-gzip"'), (ETAG, ETAG)])
+def test_not_modified_accepts_either_form(client, if_none_match, etag):
+    response = client.get("/game", headers={"Accept-Encoding": "gzip", "If-None-Match": if_none_match})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert response.headers["vary"] == "Accept-Encoding"
+
+def test_small_bodies_are_not_compressed():
+    app = Starlette(routes=[Route("/", lambda request: PlainTextResponse("ok"))])
+    app.add_middleware(CompressionMiddleware)
+    response = TestClient(app).get("/", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.headers["vary"] == "Accept-Encoding"
+
+def test_streams_are_not_compressed_and_do_not_vary():
+    async def events(request):
+        return PlainTextResponse("data: x\n\n" * 500, media_type="text/event-stream")
+
+    app = Starlette(routes=[Route("/", events)])
+    app.add_middleware(CompressionMiddleware)
+    for accept_encoding in ("gzip", "identity"):
+        response = TestClient(app).get("/", headers={"Accept-Encoding": accept_encoding})
+        assert "content-encoding" not in response.headers and "vary" not in response.headers
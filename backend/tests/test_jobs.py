@@ -0,0 +1,87 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, event, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+import models
+from database import apply_sqlite_pragmas
+from jobs import LeaseLost
+from models import JOB_FAILED, JOB_QUEUED, JOB_RUNNING, GenerationJob
+from services import AsyncJobService
+
+@pytest.fixture
+def sessions(tmp_path):
+    path = tmp_path / "jobs.db"
+    sync_engine = create_engine(f"sqlite:///{path}")
+    models.Base.metadata.create_all(bind=sync_engine)
+    with sync_engine.begin() as conn:
+        conn.execute(models.User.__table__.insert().values(
+            id=1, email="a@example.com", username="a", hashed_password="x"
+        ))
+    sync_engine.dispose()
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    event.listen(engine.sync_engine, "connect", apply_sqlite_pragmas)
+    yield async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    asyncio.run(engine.dispose())
+
+async def _set(db, job_id, **values):
+    await db.execute(update(GenerationJob).where(GenerationJob.id == job_id).values(**values))
+    await db.commit()
+
+def test_claim_leases_the_oldest_due_job(sessions):
+    async def scenario():
+        service = AsyncJobService()
+        async with sessions() as db:
+            first = await service.enqueue(db, "generate", 1, "first")
+            second = await service.enqueue(db, "generate", 1, "second")
+            later = await service.enqueue(db, "generate", 1, "later")
+            # Not due yet, as after a retry
+            await _set(db, later.id, run_at=datetime.utcnow() + timedelta(minutes=5))
+            claimed = [await service.claim(db, "w1") for _ in range(3)]
+        return [first.id, second.id], claimed
+
+    due, (a, b, none) = asyncio.run(scenario())
+    assert [a.id, b.id] == due
+    assert (a.status, a.worker, a.attempts) == (JOB_RUNNING, "w1", 1)
+    assert a.heartbeat_at is not None
+    assert none is None
+
+def test_concurrent_workers_never_claim_the_same_job(sessions):
+    async def claim(worker):
+        async with sessions() as db:
+            return await AsyncJobService().claim(db, worker)
+
+    async def scenario():
+        async with sessions() as db:
+            for i in range(3):
+                await AsyncJobService().enqueue(db, "generate", 1, f"prompt {i}")
+        return await asyncio.gather(*(claim(f"w{i}") for i in range(5)))
+
+    claimed = [job.id for job in asyncio.run(scenario()) if job is not None]
+    assert len(claimed) == 3 and len(set(claimed)) == 3
+
+def test_requeue_stale_requeues_or_fails_silent_jobs(sessions):
+    async def scenario():
+        service = AsyncJobService()
+        async with sessions() as db:
+            for prompt in ("stale", "out of attempts", "fresh"):
+                await service.enqueue(db, "generate", 1, prompt)
+            stale, spent, fresh = [await service.claim(db, f"w{i}") for i in range(3)]
+            long_ago = datetime.utcnow() - timedelta(minutes=10)
+            await _set(db, stale.id, heartbeat_at=long_ago)
+            await _set(db, spent.id, heartbeat_at=long_ago, attempts=spent.max_attempts)
+            counts = await service.requeue_stale(db, lease=60)
+            jobs = [await db.get(GenerationJob, job.id, populate_existing=True) for job in (stale, spent, fresh)]
+            states = [(job.status, job.worker, job.attempts, job.error) for job in jobs]
+            # The worker that lost its lease cannot finish the job any more
+            with pytest.raises(LeaseLost):
+                await service.complete(db, stale, "w0", "code")
+            return counts, states
+
+    counts, (stale, spent, fresh) = asyncio.run(scenario())
+    assert counts == (1, 1)
+    assert stale == (JOB_QUEUED, None, 1, None)
+    assert spent[0] == JOB_FAILED and spent[3] == "Worker stopped responding"
+    assert fresh[:2] == (JOB_RUNNING, "w2")
@@ -0,0 +1,112 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+import limits
+from limits import BUDGET_EXHAUSTED, RATE_LIMITED, AIRateLimiter, MemoryLimitBackend, Refusal
+from usage import UsageMeter
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(limits.time, "monotonic", clock)
+    return clock
+
+def _meter(user_id, input_tokens, output_tokens):
+    meter = UsageMeter(user_id)
+    meter.add(input_tokens, output_tokens)
+    return meter
+
+def test_bucket_allows_the_burst_then_reports_the_wait(clock):
+    async def scenario():
+        backend = MemoryLimitBackend()
+        return [await backend.take("k", 0.5, 3) for _ in range(4)]
+
+    assert asyncio.run(scenario()) == [0, 0, 0, 2.0]
+
+def test_bucket_refills_at_the_rate(clock):
+    async def take():
+        return await backend.take("k", 0.5, 2)
+
+    backend = MemoryLimitBackend()
+    assert [asyncio.run(take()) for _ in range(2)] == [0, 0]
+    clock.now += 1  # half a token back
+    assert asyncio.run(take()) == pytest.approx(1.0)
+    clock.now += 2  # another token
+    assert asyncio.run(take()) == 0
+    clock.now += 3600  # never more than the burst
+    assert [asyncio.run(take()) for _ in range(3)] == [0, 0, pytest.approx(2.0)]
+
+def test_usage_accumulates():
+    async def scenario():
+        backend = MemoryLimitBackend()
+        await backend.add_usage("u", 10, 5)
+        await backend.add_usage("u", 1, 2)
+        return await backend.get_usage("u"), await backend.get_usage("other")
+
+    assert asyncio.run(scenario()) == ((11, 7), (0, 0))
+
+def test_rates_are_per_minute(clock):
+    limiter = AIRateLimiter(user_rate=6, user_burst=1, ip_rate=0, daily_budget=0)
+    assert asyncio.run(limiter.admit("ip", 1)) is None
+    refusal = asyncio.run(limiter.admit("ip", 1))
+    assert refusal.reason == RATE_LIMITED and refusal.wait == pytest.approx(10.0)
+    assert refusal.retry_after == 10
+    # Other users have their own bucket
+    assert asyncio.run(limiter.admit("ip", 2)) is None
+
+def test_ip_limit_applies_across_users(clock):
+    limiter = AIRateLimiter(user_rate=60, user_burst=10, ip_rate=60, ip_burst=2, daily_budget=0)
+    results = [asyncio.run(limiter.admit("1.2.3.4", user_id)) for user_id in (1, 2, 3)]
+    assert results[:2] == [None, None]
+    assert results[2].detail == "Too many AI requests from this address"
+    assert limiter.rate_limited == 1
+
+def test_budget_counts_pending_tokens():
+    limiter = AIRateLimiter(user_rate=0, ip_rate=0, daily_budget=1000)
+    asyncio.run(limiter.charge(_meter(1, 600, 300)))
+    assert asyncio.run(limiter.admit("ip", 1)) is None
+    refusal = asyncio.run(limiter.admit("ip", 1, pending_tokens=100))
+    assert refusal.reason == BUDGET_EXHAUSTED
+    seconds_left = limits._seconds_until_tomorrow(datetime.now(timezone.utc))
+    assert 0 < refusal.wait <= 86400 and abs(refusal.wait - seconds_left) <= 1
+    assert limiter.over_budget == 1
+
+def test_usage_reports_what_is_left():
+    limiter = AIRateLimiter(daily_budget=1000)
+    asyncio.run(limiter.charge(_meter(1, 600, 300)))
+    asyncio.run(limiter.charge(_meter(1, 0, 0)))
+    usage = asyncio.run(limiter.usage(1))
+    assert (usage["input_tokens"], usage["output_tokens"], usage["total_tokens"]) == (600, 300, 900)
+    assert (usage["daily_budget"], usage["remaining"]) == (1000, 100)
+    asyncio.run(limiter.charge(_meter(1, 500, 0)))
+    assert asyncio.run(limiter.usage(1))["remaining"] == 0
+
+def test_usage_without_a_budget():
+    usage = asyncio.run(AIRateLimiter(daily_budget=0).usage(1))
+    assert usage["daily_budget"] is None and usage["remaining"] is None
+
+def test_seconds_until_tomorrow():
+    assert limits._seconds_until_tomorrow(datetime(2024, 3, 1, 23, 59, 30, 500000, tzinfo=timezone.utc)) == 30
+    assert limits._seconds_until_tomorrow(datetime(2024, 3, 1, tzinfo=timezone.utc)) == 86400
+
+def test_backend_failure_lets_requests_through():
+    class BrokenBackend:
+        async def take(self, key, rate, burst):
+            raise ConnectionError("redis down")
+
+    limiter = AIRateLimiter(BrokenBackend())
+    assert asyncio.run(limiter.admit("ip", 1)) is None
+    assert limiter.backend_errors == 1
+
+@pytest.mark.parametrize("wait, retry_after", [(0.2, 1), (1.0, 1), (1.01, 2), (59.5, 60)])
+def test_retry_after_rounds_up_to_whole_seconds(wait, retry_after):
+    assert Refusal(RATE_LIMITED, "", wait).retry_after == retry_after
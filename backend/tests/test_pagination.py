@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine, update
+from sqlalchemy.orm import sessionmaker
+
+import models
+import services
+from schemas import GameCreate
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'games.db'}")
+    models.Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all([
+        models.User(id=1, email="a@example.com", username="a", hashed_password="x"),
+        models.User(id=2, email="b@example.com", username="b", hashed_password="x"),
+    ])
+    session.commit()
+    yield session
+    session.close()
+    engine.dispose()
+
+def _create_games(db, owner_id, count):
+    service = services.GameService()
+    return [
+        service.create_game(db, GameCreate(title=f"Game {i}", prompt="p", code=f"x = {i}\n"), owner_id).id
+        for i in range(count)
+    ]
+
+def test_cursor_round_trips():
+    updated_at = datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=timezone.utc)
+    cursor = services.encode_cursor(models.Game(id=42, updated_at=updated_at))
+    assert "=" not in cursor
+    assert services.decode_cursor(cursor) == (updated_at, 42)
+
+@pytest.mark.parametrize("cursor", ["not a cursor!", "bm9waXBl", ""])
+def test_invalid_cursor_is_a_value_error(cursor):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        services.decode_cursor(cursor)
+
+def test_page_has_a_cursor_only_when_more_rows_follow():
+    games = [models.Game(id=i, updated_at=datetime(2024, 1, 1, tzinfo=timezone.utc)) for i in (3, 2, 1)]
+    assert services._page(games, 3) == (games, None)
+    page, cursor = services._page(games, 2)
+    assert page == games[:2]
+    assert services.decode_cursor(cursor)[1] == 2
+
+def test_walking_pages_returns_every_game_once_newest_first(db):
+    ids = _create_games(db, 1, 7)
+    _create_games(db, 2, 2)
+    # Several games updated at the same instant: the id breaks the tie
+    same_time = datetime.now(timezone.utc) + timedelta(minutes=1)
+    db.execute(update(models.Game).where(models.Game.id.in_(ids[1:5])).values(updated_at=same_time))
+    db.commit()
+
+    service = services.GameService()
+    seen, cursor, pages = [], None, 0
+    while True:
+        games, cursor = service.list_user_games(db, 1, limit=3, cursor=cursor)
+        seen.extend(game.id for game in games)
+        pages += 1
+        if cursor is None:
+            break
+
+    assert pages == 3
+    # The tied games sort above the rest, highest id first; the others by update time
+    assert seen == sorted(ids[1:5], reverse=True) + [ids[6], ids[5], ids[0]]
@@ -0,0 +1,65 @@
+import pytest
+
+from patching import PatchError, apply_edit_blocks, parse_edit_blocks
+
+CODE = """import pygame
+
+speed = 5
+score = 0
+
+def update():
+    global score
+    score += 1
+"""
+
+def test_replaces_the_matching_lines():
+    patched = apply_edit_blocks(CODE, [("speed = 5", "speed = 8")])
+    assert patched == CODE.replace("speed = 5", "speed = 8")
+
+def test_multi_line_search_and_replace():
+    patched = apply_edit_blocks(CODE, [("def update():\n    global score", "def update(dt):\n    global score, speed")])
+    assert "def update(dt):\n    global score, speed\n    score += 1" in patched
+
+def test_blocks_apply_in_order_to_the_result_of_the_previous_one():
+    patched = apply_edit_blocks(CODE, [("speed = 5", "speed = 6"), ("speed = 6", "speed = 7")])
+    assert "speed = 7" in patched and "speed = 5" not in patched
+
+def test_trailing_whitespace_is_ignored_when_there_is_no_exact_match():
+    code = CODE.replace("score = 0\n", "score = 0   \n")
+    assert "score = 10" in apply_edit_blocks(code, [("score = 0", "score = 10")])
+
+def test_empty_replace_deletes_the_lines():
+    assert "speed" not in apply_edit_blocks(CODE, [("speed = 5", "")])
+
+def test_search_must_match_whole_lines():
+    with pytest.raises(PatchError, match="not found"):
+        apply_edit_blocks(CODE, [("speed =", "speed = 8")])
+
+def test_ambiguous_search_is_rejected():
+    code = CODE + "speed = 5\n"
+    with pytest.raises(PatchError, match="matches 2 places"):
+        apply_edit_blocks(code, [("speed = 5", "speed = 8")])
+
+def test_empty_search_is_rejected():
+    with pytest.raises(PatchError, match="Empty SEARCH"):
+        apply_edit_blocks(CODE, [("  ", "x = 1")])
+
+def test_parse_ignores_prose_around_blocks():
+    reply = """Here is the change:
+
+<<<<<<< SEARCH
+speed = 5
+=======
+speed = 8
+>>>>>>> REPLACE
+
+That makes the player faster."""
+    assert parse_edit_blocks(reply) == [("speed = 5", "speed = 8")]
+
+@pytest.mark.parametrize("reply, message", [
+    ("<<<<<<< SEARCH\nspeed = 5\n=======\nspeed = 8\n", "Unterminated"),
+    ("speed = 8", "No SEARCH/REPLACE blocks"),
+])
+def test_parse_rejects_malformed_replies(reply, message):
+    with pytest.raises(PatchError, match=message):
+        parse_edit_blocks(reply)
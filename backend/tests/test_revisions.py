@@ -0,0 +1,103 @@
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+import models
+import revisions
+import services
+from revisions import DELTA, SNAPSHOT, apply_delta, encode_delta, new_revision, rebuild
+from schemas import GameCreate, GameUpdate
+
+BASE = "".join(f"line {i}\n" for i in range(200))
+
+def _versions(count):
+    """Code for versions 1..count, each editing a line or two of the previous one"""
+    code = BASE
+    versions = [code]
+    for v in range(2, count + 1):
+        code = code.replace(f"line {v}\n", f"line {v} edited in v{v}\n")
+        if v % 3 == 0:
+            code += f"appended in v{v}"  # no trailing newline
+        versions.append(code)
+    return versions
+
+def _history(versions):
+    """Revision rows for versions, threading the chain length as GameService does"""
+    rows, chain_length = [], 0
+    for v, code in enumerate(versions, start=1):
+        row = new_revision(1, v, code, versions[v - 2] if v > 1 else None, chain_length)
+        chain_length = 1 if row.kind == SNAPSHOT else chain_length + 1
+        rows.append(row)
+    return rows
+
+@pytest.mark.parametrize("base, target", [
+    (BASE, BASE.replace("line 7\n", "line seven\n")),
+    (BASE, BASE + "tail without newline"),
+    ("a\nb\nc", ""),
+    ("", "fresh\ncode\n"),
+])
+def test_delta_round_trips(base, target):
+    assert apply_delta(base, encode_delta(base, target)) == target
+
+def test_first_version_is_a_snapshot_and_small_edits_are_deltas():
+    rows = _history(_versions(3))
+    assert [row.kind for row in rows] == [SNAPSHOT, DELTA, DELTA]
+    assert rows[1].size == len(_versions(3)[1])
+
+def test_a_rewrite_is_stored_as_a_snapshot():
+    rewritten = "".join(f"completely different {i}\n" for i in range(50))
+    assert new_revision(1, 2, rewritten, BASE, chain_length=1).kind == SNAPSHOT
+
+def test_a_game_without_a_snapshot_gets_one():
+    # Games saved before revision history was kept have no chain to add a delta to
+    edited = BASE.replace("line 7\n", "line seven\n")
+    assert new_revision(1, 5, edited, BASE, chain_length=0).kind == SNAPSHOT
+
+def test_snapshot_every_n_revisions(monkeypatch):
+    monkeypatch.setattr(revisions, "GAME_REVISION_SNAPSHOT_EVERY", 4)
+    rows = _history(_versions(10))
+    assert [v for v, row in enumerate(rows, start=1) if row.kind == SNAPSHOT] == [1, 5, 9]
+
+def test_rebuild_returns_every_version(monkeypatch):
+    monkeypatch.setattr(revisions, "GAME_REVISION_SNAPSHOT_EVERY", 4)
+    versions = _versions(10)
+    rows = _history(versions)
+    for v in range(1, 11):
+        # As services._revision_chain_query loads them: from the closest snapshot up to v
+        start = max(i for i in range(v) if rows[i].kind == SNAPSHOT)
+        assert rebuild(rows[start:v]) == versions[v - 1]
+    # A chain that runs through a later snapshot restarts from it
+    assert rebuild(rows) == versions[-1]
+
+@pytest.mark.parametrize("chain", [[], "deltas only"])
+def test_rebuild_needs_a_leading_snapshot(chain):
+    if chain == "deltas only":
+        chain = _history(_versions(3))[1:]
+    with pytest.raises(ValueError, match="snapshot"):
+        rebuild(chain)
+
+def test_only_code_changes_are_stored(tmp_path, monkeypatch):
+    monkeypatch.setattr(revisions, "GAME_REVISION_SNAPSHOT_EVERY", 3)
+    engine = create_engine(f"sqlite:///{tmp_path / 'revisions.db'}")
+    models.Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    db.add(models.User(id=1, email="a@example.com", username="a", hashed_password="x"))
+    service = services.GameService()
+    versions = _versions(5)
+    game = service.create_game(db, GameCreate(title="g", prompt="p", code=versions[0]), 1)
+    for n, code in enumerate(versions[1:], start=2):
+        service.update_game(db, game.id, GameUpdate(title=f"title {n}"), 1)
+        service.update_game(db, game.id, GameUpdate(code=code, description="same code below"), 1)
+        service.update_game(db, game.id, GameUpdate(code=code), 1)
+
+    rows = list(db.scalars(select(models.GameRevision).order_by(models.GameRevision.version)))
+    # Each code change is a version of its own; title and description changes only bump the version
+    assert game.version == 1 + 3 * 4
+    assert [row.version for row in rows] == [1, 3, 6, 9, 12]
+    # The snapshot cadence counts stored revisions, not versions
+    assert [row.kind for row in rows] == [SNAPSHOT, DELTA, DELTA, SNAPSHOT, DELTA]
+    for row, code in zip(rows, versions):
+        chain = list(db.scalars(services._revision_chain_query(game.id, row.version)))
+        assert rebuild(chain) == code
+    db.close()
+    engine.dispose()
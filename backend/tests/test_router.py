@@ -0,0 +1,125 @@
+import asyncio
+
+import pytest
+
+import router
+from providers import AIProvider, ProviderError
+from router import AllProvidersFailed, CircuitBreaker, ProviderRouter
+
+class FakeProvider(AIProvider):
+    """Streams chunks after delay seconds, then raises error if given"""
+
+    def __init__(self, name, chunks=("code",), delay=0.0, error=None):
+        super().__init__(f"{name}-model")
+        self.name = self.label = name
+        self.chunks = chunks
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+        self.cancelled = False
+
+    async def _stream(self, system, prompt, max_tokens):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+            for chunk in self.chunks:
+                yield chunk
+                await asyncio.sleep(0)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.error is not None:
+            raise ProviderError(self.error)
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+async def _collect(chunks):
+    return [chunk async for chunk in chunks]
+
+def test_breaker_opens_after_consecutive_failures_and_half_opens_after_cooldown(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(router.time, "monotonic", clock)
+    breaker = CircuitBreaker(failure_threshold=3, cooldown=30)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()  # a success resets the count
+    for _ in range(3):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+    clock.now += 30
+    assert breaker.allow() and breaker.state == "half_open"
+    assert not breaker.allow()  # one probe per cooldown
+    breaker.record_failure()  # a failed probe opens it again straight away
+    assert breaker.state == "open"
+
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+
+def test_error_before_the_first_chunk_falls_through_to_the_next_provider():
+    broken = FakeProvider("broken", chunks=(), error="overloaded")
+    backup = FakeProvider("backup", chunks=("import ", "pygame"))
+    route = ProviderRouter([broken, backup])
+    assert asyncio.run(route.complete("system", "prompt")) == "import pygame"
+    assert route.stats["broken"].outcomes[-1] is False and route.breakers["broken"].failures == 1
+    assert route.stats["backup"].outcomes[-1] is True
+
+def test_empty_completion_counts_as_a_failure():
+    route = ProviderRouter([FakeProvider("empty", chunks=()), FakeProvider("backup")])
+    assert asyncio.run(route.complete("system", "prompt")) == "code"
+    assert route.breakers["empty"].failures == 1
+
+def test_no_failover_once_chunks_were_streamed():
+    flaky = FakeProvider("flaky", chunks=("import ", "pyg"), error="connection reset")
+    backup = FakeProvider("backup")
+    received = []
+
+    async def scenario():
+        async for chunk in ProviderRouter([flaky, backup]).stream("system", "prompt"):
+            received.append(chunk)
+
+    with pytest.raises(ProviderError, match="connection reset"):
+        asyncio.run(scenario())
+    assert received == ["import ", "pyg"]
+    assert backup.calls == 0
+
+def test_open_circuit_is_skipped_and_all_failures_are_reported():
+    down = FakeProvider("down")
+    broken = FakeProvider("broken", chunks=(), error="overloaded")
+    route = ProviderRouter([down, broken])
+    route.breakers["down"].state = "open"
+    route.breakers["down"].opened_at = router.time.monotonic()
+    with pytest.raises(AllProvidersFailed, match="down circuit open; overloaded"):
+        asyncio.run(route.complete("system", "prompt"))
+    assert down.calls == 0
+
+def test_hedge_starts_a_second_provider_after_the_delay():
+    slow = FakeProvider("slow", chunks=("slow code",), delay=1.0)
+    fast = FakeProvider("fast", chunks=("fast code",))
+    route = ProviderRouter([slow, fast], hedge_delay=0.02)
+    assert asyncio.run(_collect(route.stream("system", "prompt"))) == ["fast code"]
+    assert route.hedges == 1
+    assert slow.cancelled  # the loser is cancelled once the hedge streams
+
+def test_no_hedge_when_the_first_token_arrives_in_time():
+    first = FakeProvider("first", chunks=("a", "b"))
+    second = FakeProvider("second")
+    route = ProviderRouter([first, second], hedge_delay=0.5)
+    assert asyncio.run(_collect(route.stream("system", "prompt"))) == ["a", "b"]
+    assert route.hedges == 0 and second.calls == 0
+
+def test_degraded_provider_is_tried_last():
+    primary, secondary = FakeProvider("primary"), FakeProvider("secondary")
+    route = ProviderRouter([primary, secondary])
+    for _ in range(router.MIN_LATENCY_SAMPLES):
+        route.stats["primary"].record_failure()
+        route.stats["secondary"].record_success(1.0, 0.1)
+    assert route.ranked() == [secondary, primary]
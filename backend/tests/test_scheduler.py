@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+
+from scheduler import PRIORITY_BATCH, PRIORITY_GENERATE, PRIORITY_INTERACTIVE, FairScheduler
+
+WEIGHTS = {PRIORITY_INTERACTIVE: 3.0, PRIORITY_GENERATE: 2.0, PRIORITY_BATCH: 1.0}
+
+async def _serve(sched, calls):
+    """Queue calls, a list of (priority, user_id), behind a held slot and return the order they ran in"""
+    order = []
+    release = asyncio.Event()
+
+    async def hold():
+        async with sched.slot(PRIORITY_INTERACTIVE, 0):
+            await release.wait()
+
+    async def call(priority, user_id):
+        async with sched.slot(priority, user_id):
+            order.append((priority, user_id))
+            await asyncio.sleep(0)
+
+    holder = asyncio.ensure_future(hold())
+    await asyncio.sleep(0)
+    tasks = []
+    for priority, user_id in calls:
+        tasks.append(asyncio.ensure_future(call(priority, user_id)))
+        await asyncio.sleep(0)
+    release.set()
+    await asyncio.gather(holder, *tasks)
+    return order
+
+def test_calls_go_straight_through_while_slots_are_free():
+    async def scenario():
+        sched = FairScheduler(slots=2, weights=WEIGHTS)
+        async with sched.slot(PRIORITY_BATCH, 1):
+            async with sched.slot(PRIORITY_BATCH, 1):
+                return sched.stats()
+
+    stats = asyncio.run(scenario())
+    assert (stats["active"], stats["queued"]) == (2, 0)
+    assert stats["classes"][PRIORITY_BATCH]["served"] == 2
+
+def test_classes_share_slots_by_weight():
+    calls = [(PRIORITY_BATCH, 1)] * 12 + [(PRIORITY_GENERATE, 2)] * 12 + [(PRIORITY_INTERACTIVE, 3)] * 12
+    order = asyncio.run(_serve(FairScheduler(slots=1, weights=WEIGHTS), calls))
+    first = [priority for priority, _ in order[:12]]
+    # Queued last, interactive still gets half of the slots, and batch is not starved
+    assert (first.count(PRIORITY_INTERACTIVE), first.count(PRIORITY_GENERATE), first.count(PRIORITY_BATCH)) == (6, 4, 2)
+    assert len(order) == 36
+
+def test_users_take_turns_within_a_class():
+    calls = [(PRIORITY_GENERATE, 1)] * 5 + [(PRIORITY_GENERATE, 2), (PRIORITY_GENERATE, 3)]
+    order = asyncio.run(_serve(FairScheduler(slots=1, weights=WEIGHTS), calls))
+    # One user's backlog does not keep the others waiting
+    assert [user_id for _, user_id in order] == [1, 2, 3, 1, 1, 1, 1]
+
+def test_cancelled_waiter_gives_up_its_place():
+    async def scenario():
+        sched = FairScheduler(slots=1, weights=WEIGHTS)
+        served = []
+
+        async def call(user_id):
+            async with sched.slot(PRIORITY_GENERATE, user_id):
+                served.append(user_id)
+
+        async with sched.slot(PRIORITY_GENERATE, 0):
+            cancelled = asyncio.ensure_future(call(1))
+            waiting = asyncio.ensure_future(call(2))
+            await asyncio.sleep(0)
+            assert sched.stats()["queued"] == 2
+            cancelled.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await cancelled
+            assert sched.stats()["queued"] == 1
+        await waiting
+        return served, sched.stats()
+
+    served, stats = asyncio.run(scenario())
+    assert served == [2]
+    assert (stats["active"], stats["queued"]) == (0, 0)
+    assert stats["classes"][PRIORITY_GENERATE]["served"] == 2
@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+from cache import SingleFlight
+
+def test_concurrent_calls_share_one_upstream_call():
+    async def scenario():
+        flight = SingleFlight()
+        calls = 0
+
+        async def fetch():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return "code"
+
+        results = await asyncio.gather(*(flight.do("prompt", fetch) for _ in range(3)))
+        return calls, results, flight.stats()
+
+    calls, results, stats = asyncio.run(scenario())
+    assert calls == 1
+    assert results == ["code"] * 3
+    assert stats == {"in_flight": 0, "leaders": 1, "coalesced": 2}
+
+def test_different_keys_do_not_coalesce():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def fetch(value):
+            await asyncio.sleep(0.01)
+            return value
+
+        results = await asyncio.gather(flight.do("a", lambda: fetch(1)), flight.do("b", lambda: fetch(2)))
+        return results, flight.stats()
+
+    results, stats = asyncio.run(scenario())
+    assert results == [1, 2]
+    assert stats["leaders"] == 2 and stats["coalesced"] == 0
+
+def test_every_waiter_gets_the_exception_and_the_key_is_released():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("provider down")
+
+        results = await asyncio.gather(flight.do("k", fail), flight.do("k", fail), return_exceptions=True)
+
+        async def succeed():
+            return "ok"
+
+        # Finished calls are forgotten, so the next call starts afresh
+        return results, await flight.do("k", succeed), flight.stats()
+
+    results, retried, stats = asyncio.run(scenario())
+    assert [type(r) for r in results] == [RuntimeError, RuntimeError]
+    assert retried == "ok"
+    assert stats == {"in_flight": 0, "leaders": 2, "coalesced": 1}
+
+def test_cancelled_waiter_does_not_cancel_the_shared_call():
+    async def scenario():
+        flight = SingleFlight()
+        release = asyncio.Event()
+
+        async def fetch():
+            await release.wait()
+            return "code"
+
+        first = asyncio.ensure_future(flight.do("k", fetch))
+        second = asyncio.ensure_future(flight.do("k", fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+        release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(scenario()) == "code"
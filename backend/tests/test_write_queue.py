@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine, event, func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+import models
+from database import apply_sqlite_pragmas
+from schemas import GameCreate, GameUpdate
+from services import AsyncGameService, VersionConflict
+from write_queue import WriteQueue
+
+@pytest.fixture
+def path(tmp_path):
+    path = tmp_path / "writes.db"
+    engine = create_engine(f"sqlite:///{path}")
+    models.Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(models.User.__table__.insert().values(
+            id=1, email="a@example.com", username="a", hashed_password="x"
+        ))
+    engine.dispose()
+    return path
+
+async def _run(path, scenario):
+    """Run scenario(queue, sessions) against the database at path with a fresh WriteQueue"""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    event.listen(engine.sync_engine, "connect", apply_sqlite_pragmas)
+    sessions = async_sessionmaker(engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+    queue = WriteQueue(sessions, batch_size=64, window=0.05)
+    try:
+        return await scenario(queue, sessions)
+    finally:
+        await queue.close()
+        await engine.dispose()
+
+def _add_user(user_id):
+    async def op(session):
+        session.add(models.User(id=user_id, email=f"{user_id}@example.com", username=f"u{user_id}", hashed_password="x"))
+        await session.flush()
+        return user_id
+    return op
+
+async def _user_ids(sessions):
+    async with sessions() as db:
+        return sorted(await db.scalars(select(models.User.id)))
+
+def test_concurrent_writes_share_one_commit(path):
+    async def scenario(queue, sessions):
+        results = await asyncio.gather(*(queue.submit(_add_user(i)) for i in range(2, 12)))
+        return results, queue.stats(), await _user_ids(sessions)
+
+    results, stats, ids = asyncio.run(_run(path, scenario))
+    assert results == list(range(2, 12))
+    assert (stats["batches"], stats["writes"], stats["failures"]) == (1, 10, 0)
+    assert ids == list(range(1, 12))
+
+def test_a_failing_op_only_fails_its_own_caller(path):
+    async def fail_after_writing(session):
+        await _add_user(99)(session)
+        raise ValueError("rejected")
+
+    async def scenario(queue, sessions):
+        results = await asyncio.gather(
+            queue.submit(_add_user(2)), queue.submit(fail_after_writing), queue.submit(_add_user(3)),
+            return_exceptions=True
+        )
+        return results, queue.stats(), await _user_ids(sessions)
+
+    (first, failed, last), stats, ids = asyncio.run(_run(path, scenario))
+    assert (first, last) == (2, 3)
+    assert isinstance(failed, ValueError)
+    # The failed op's write is rolled back, the others are committed in the same batch
+    assert ids == [1, 2, 3]
+    assert (stats["batches"], stats["writes"], stats["failures"]) == (1, 2, 1)
+
+def test_conflicting_updates_in_one_batch(path):
+    async def scenario(queue, sessions):
+        service = AsyncGameService(queue)
+        async with sessions() as db:
+            game = await service.create_game(db, GameCreate(title="g", prompt="p", code="x = 1\n"), 1)
+            results = await asyncio.gather(*(
+                service.update_game(db, game.id, GameUpdate(code=f"x = {n}\n"), 1, expected_versions={1})
+                for n in (2, 3)
+            ), return_exceptions=True)
+            version = await service.get_game_version(db, game.id, 1)
+            revisions = await db.scalar(select(func.count()).select_from(models.GameRevision))
+        return results, version, revisions, queue.stats()
+
+    (won, lost), version, revisions, stats = asyncio.run(_run(path, scenario))
+    assert won.version == 2
+    assert isinstance(lost, VersionConflict) and lost.version == 2
+    assert (version, revisions) == (2, 2)
+    assert stats["failures"] == 1
+
+def test_close_commits_queued_writes(path):
+    async def scenario(queue, sessions):
+        pending = [asyncio.ensure_future(queue.submit(_add_user(i))) for i in (2, 3)]
+        await asyncio.sleep(0)
+        await queue.close()
+        return await asyncio.gather(*pending), await _user_ids(sessions)
+
+    results, ids = asyncio.run(_run(path, scenario))
+    assert results == [2, 3] and ids == [1, 2, 3]
@@ -0,0 +1,41 @@
+from contextvars import ContextVar
+from typing import Optional
+
+class UsageMeter:
+    """Provider tokens spent on behalf of one user during a request or job"""
+
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.input_tokens = 0
+        self.output_tokens = 0
+
+    def add(self, input_tokens: int, output_tokens: int):
+        self.input_tokens += input_tokens
+        self.output_tokens += output_tokens
+
+    @property
+    def total(self) -> int:
+        return self.input_tokens + self.output_tokens
+
+# The meter of the request or job being served. Tasks copy the context but
+# share the meter object, so hedged and coalesced calls are counted too
+_current_meter: ContextVar[Optional[UsageMeter]] = ContextVar("usage_meter", default=None)
+
+def start_meter(user_id: int) -> UsageMeter:
+    """Charge provider calls made from here on in this context to user_id"""
+    meter = UsageMeter(user_id)
+    _current_meter.set(meter)
+    return meter
+
+def current_meter() -> Optional[UsageMeter]:
+    return _current_meter.get()
+
+def record_usage(input_tokens: int, output_tokens: int):
+    """Called by providers with the usage a response reports"""
+    meter = _current_meter.get()
+    if meter is not None:
+        meter.add(input_tokens, output_tokens)
+
+def estimate_tokens(text: str) -> int:
+    # About four characters per token for English and Python source
+    return (len(text) + 3) // 4
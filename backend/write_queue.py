@@ -0,0 +1,147 @@
+import asyncio
+import logging
+import os
+from typing import Awaitable, Callable, List, Optional, Tuple, TypeVar
+
+from dotenv import load_dotenv
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from database import ASYNC_DATABASE_URL, AsyncSessionLocal, is_sqlite_file
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Single-writer configuration; "auto" enables the queue for file SQLite databases
+DB_WRITE_QUEUE = os.getenv("DB_WRITE_QUEUE", "auto").lower()
+DB_WRITE_BATCH_SIZE = int(os.getenv("DB_WRITE_BATCH_SIZE", "64"))
+DB_WRITE_BATCH_WINDOW_MS = float(os.getenv("DB_WRITE_BATCH_WINDOW_MS", "2"))
+
+T = TypeVar("T")
+WriteOp = Callable[[AsyncSession], Awaitable[T]]
+
+class WriteQueue:
+    """Funnels writes through one worker that commits them in batches.
+
+    SQLite allows a single writer at a time, so concurrent request commits
+    queue up on the database lock and fail with "database is locked" once
+    the busy timeout runs out. Here every write is an op run against the
+    worker's own session; ops that arrive together share one transaction and
+    one commit (one fsync). Each op runs in its own savepoint, so an op that
+    raises, such as an update hitting a VersionConflict, rolls back only its
+    own writes and fails only its own caller; the rest of the batch commits.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker = AsyncSessionLocal,
+        batch_size: int = DB_WRITE_BATCH_SIZE,
+        window: float = DB_WRITE_BATCH_WINDOW_MS / 1000
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.window = window
+        self.writes = 0
+        self.batches = 0
+        self.failures = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop = None
+
+    async def submit(self, op: WriteOp) -> T:
+        """Queue op(session) and wait until it has been committed"""
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done() or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run(self._queue))
+        future = loop.create_future()
+        self._queue.put_nowait((op, future))
+        return await future
+
+    async def close(self):
+        """Commit whatever is queued, then stop the worker"""
+        worker, self._worker = self._worker, None
+        if worker is None or worker.done() or self._loop is not asyncio.get_running_loop():
+            return
+        self._queue.put_nowait(None)
+        await worker
+
+    async def _run(self, queue: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = loop.time() + self.window
+            while len(batch) < self.batch_size:
+                if not queue.empty():
+                    item = queue.get_nowait()
+                else:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(queue.get(), timeout=remaining)
+                    except asyncio.TimeoutError:
+                        break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            batch = [(op, future) for op, future in batch if not future.done()]
+            if not batch:
+                continue
+            try:
+                await self._commit(batch)
+            except Exception as e:
+                logger.warning("Commit of %d batched writes failed: %s", len(batch), e)
+                for _, future in batch:
+                    self._fail(future, e)
+
+    def _fail(self, future: asyncio.Future, error: Exception):
+        self.failures += 1
+        if not future.done():
+            future.set_exception(error)
+
+    async def _commit(self, batch: List[Tuple[WriteOp, asyncio.Future]]):
+        outcomes = []
+        async with self.session_factory() as session:
+            connection = await session.connection()
+            if connection.dialect.name == "sqlite":
+                # pysqlite only opens a transaction before DML, so the first
+                # SAVEPOINT would open one and releasing it would commit
+                await connection.exec_driver_sql("BEGIN IMMEDIATE")
+            for op, future in batch:
+                try:
+                    async with session.begin_nested():
+                        outcomes.append((future, await op(session), None))
+                except Exception as e:
+                    outcomes.append((future, None, e))
+            await session.commit()
+        self.batches += 1
+        for future, result, error in outcomes:
+            if error is not None:
+                self._fail(future, error)
+                continue
+            self.writes += 1
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            "writes": self.writes,
+            "batches": self.batches,
+            "avg_batch": self.writes / self.batches if self.batches else 0.0,
+            "failures": self.failures,
+            "queued": self._queue.qsize() if self._queue is not None else 0
+        }
+
+def build_write_queue() -> Optional[WriteQueue]:
+    """Return a WriteQueue when DB_WRITE_QUEUE asks for one"""
+    if DB_WRITE_QUEUE in ("1", "true", "yes") or (DB_WRITE_QUEUE == "auto" and is_sqlite_file(ASYNC_DATABASE_URL)):
+        return WriteQueue()
+    return None